@@ -1,6 +1,15 @@
-﻿import psycopg2
+﻿import itertools
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions
 from contextlib import contextmanager
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metricas_consultas import MetricasConsultas, rotulo_chamador
+
+# nomes unicos para os cursores nomeados (server-side) abertos por este processo
+_SEQUENCIA_CURSORES = itertools.count(1)
 
 
 class ConfiguracaoBanco:
@@ -21,19 +30,289 @@ class ConfiguracaoBanco:
         }
 
 
+class PoolEsgotado(Exception):
+    pass
+
+
+class PoolConexoes:
+    """
+    Pool de conexoes limitado e seguro entre threads.
+    - minimo: conexoes ociosas mantidas abertas (nao expiram);
+    - maximo: total de conexoes abertas; acima disso `obter` espera ate `espera_max_s` e levanta PoolEsgotado;
+    - ocioso_max_s: conexoes ociosas alem do minimo sao fechadas apos esse tempo sem uso;
+    - verificar_apos_s: conexoes ociosas ha mais que isso sao testadas com SELECT 1 antes de emprestadas
+      (0 testa sempre); conexoes fechadas ou com falha sao descartadas e substituidas.
+    """
+
+    def __init__(
+        self,
+        conectar: Callable[[], Any],
+        minimo: int = 1,
+        maximo: int = 10,
+        ocioso_max_s: float = 300.0,
+        verificar_apos_s: float = 30.0,
+        espera_max_s: float = 30.0,
+    ):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError("Tamanho do pool invalido: use 0 <= minimo <= maximo e maximo >= 1.")
+        self._conectar = conectar
+        self.minimo = minimo
+        self.maximo = maximo
+        self.ocioso_max_s = ocioso_max_s
+        self.verificar_apos_s = verificar_apos_s
+        self.espera_max_s = espera_max_s
+        self._ociosas: List[Tuple[Any, float]] = []  # (conexao, devolvida_em); a mais recente no fim
+        self._abertas = 0
+        self._condicao = threading.Condition()
+        self._contadores = {
+            "criadas": 0,
+            "emprestimos": 0,
+            "esperas": 0,
+            "tempo_espera_total_s": 0.0,
+            "descartadas": 0,
+            "expiradas": 0,
+            "esgotamentos": 0,
+        }
+
+    def aquecer(self) -> None:
+        """Abre conexoes ate haver `minimo` ociosas (sem passar do maximo)."""
+        while True:
+            with self._condicao:
+                if len(self._ociosas) >= self.minimo or self._abertas >= self.maximo:
+                    return
+                self._abertas += 1
+            try:
+                conexao = self._conectar()
+            except Exception:
+                with self._condicao:
+                    self._abertas -= 1
+                raise
+            with self._condicao:
+                self._contadores["criadas"] += 1
+                self._ociosas.insert(0, (conexao, time.time()))
+                self._condicao.notify()
+
+    def _fechar(self, conexao) -> None:
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+    def _expirar_ociosas(self, agora: float) -> List[Any]:
+        """Retira (com a trava) as ociosas alem do minimo sem uso ha mais de ocioso_max_s; fechar fora da trava."""
+        expiradas = []
+        while len(self._ociosas) > self.minimo and agora - self._ociosas[0][1] > self.ocioso_max_s:
+            expiradas.append(self._ociosas.pop(0)[0])
+        self._abertas -= len(expiradas)
+        self._contadores["expiradas"] += len(expiradas)
+        return expiradas
+
+    def _saudavel(self, conexao, ociosa_desde: float) -> bool:
+        if conexao.closed:
+            return False
+        if time.time() - ociosa_desde < self.verificar_apos_s:
+            return True
+        try:
+            with conexao.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conexao.rollback()
+            return True
+        except Exception:
+            return False
+
+    def obter(self):
+        """Empresta uma conexao (reaproveitada, verificada, ou nova se houver vaga)."""
+        inicio = time.time()
+        prazo = inicio + self.espera_max_s
+        while True:
+            with self._condicao:
+                expiradas = self._expirar_ociosas(time.time())
+                conexao = None
+                criar = False
+                esperou = False
+                while conexao is None and not criar:
+                    if self._ociosas:
+                        conexao, ociosa_desde = self._ociosas.pop()
+                    elif self._abertas < self.maximo:
+                        self._abertas += 1
+                        criar = True
+                    else:
+                        restante = prazo - time.time()
+                        if restante <= 0:
+                            self._contadores["esgotamentos"] += 1
+                            raise PoolEsgotado(
+                                f"Nenhuma conexao livre em {self.espera_max_s:g}s (maximo {self.maximo})."
+                            )
+                        esperou = True
+                        self._condicao.wait(restante)
+                if esperou:
+                    self._contadores["esperas"] += 1
+                    self._contadores["tempo_espera_total_s"] += time.time() - inicio
+            for antiga in expiradas:
+                self._fechar(antiga)
+
+            if criar:
+                try:
+                    conexao = self._conectar()
+                except Exception:
+                    with self._condicao:
+                        self._abertas -= 1
+                        self._condicao.notify()
+                    raise
+                with self._condicao:
+                    self._contadores["criadas"] += 1
+                    self._contadores["emprestimos"] += 1
+                return conexao
+
+            if self._saudavel(conexao, ociosa_desde):
+                with self._condicao:
+                    self._contadores["emprestimos"] += 1
+                return conexao
+            # conexao caida: descarta e tenta de novo (outra ociosa ou uma nova)
+            self._fechar(conexao)
+            with self._condicao:
+                self._abertas -= 1
+                self._contadores["descartadas"] += 1
+
+    def devolver(self, conexao, descartar: bool = False) -> None:
+        """
+        Devolve uma conexao emprestada. Transacao deixada aberta e desfeita (como ao fechar a conexao);
+        conexoes fechadas, em estado desconhecido ou marcadas com `descartar` sao fechadas.
+        """
+        if not descartar and not conexao.closed:
+            try:
+                status = conexao.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    descartar = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conexao.rollback()
+            except Exception:
+                descartar = True
+        else:
+            descartar = True
+
+        with self._condicao:
+            if descartar:
+                self._abertas -= 1
+                self._contadores["descartadas"] += 1
+            else:
+                self._ociosas.append((conexao, time.time()))
+            self._condicao.notify()
+        if descartar:
+            self._fechar(conexao)
+
+    def fechar(self) -> None:
+        """Fecha as conexoes ociosas (as emprestadas sao fechadas ao serem devolvidas com descartar)."""
+        with self._condicao:
+            ociosas = [c for c, _ in self._ociosas]
+            self._ociosas = []
+            self._abertas -= len(ociosas)
+        for conexao in ociosas:
+            self._fechar(conexao)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._condicao:
+            ociosas = len(self._ociosas)
+            return {
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "abertas": self._abertas,
+                "ociosas": ociosas,
+                "em_uso": self._abertas - ociosas,
+                **self._contadores,
+                "tempo_espera_total_s": round(self._contadores["tempo_espera_total_s"], 3),
+            }
+
+
+class CursorMedido(extensions.cursor):
+    """
+    Cursor que mede cada execute/executemany e registra em `metricas` com o `rotulo` de quem abriu o
+    cursor (ambos atribuidos por BancoDados ao criar o cursor). Erros sao registrados e relancados.
+    """
+
+    metricas: Optional[MetricasConsultas] = None
+    rotulo = "desconhecido"
+
+    def _medir(self, executar, sql, params):
+        inicio = time.perf_counter()
+        erro = False
+        try:
+            return executar(sql, params)
+        except Exception:
+            erro = True
+            raise
+        finally:
+            if self.metricas is not None:
+                self.metricas.registrar(self.rotulo, time.perf_counter() - inicio, sql, params, erro)
+
+    def execute(self, sql, params=None):
+        return self._medir(super().execute, sql, params)
+
+    def executemany(self, sql, params_seq):
+        return self._medir(super().executemany, sql, params_seq)
+
+
 class BancoDados:
-    def __init__(self, configuracao: ConfiguracaoBanco):
+    def __init__(
+        self,
+        configuracao: ConfiguracaoBanco,
+        pool_minimo: int = 1,
+        pool_maximo: int = 10,
+        ocioso_max_s: float = 300.0,
+        limiar_lento_ms: Optional[float] = 500.0,
+    ):
         self.configuracao = configuracao
+        self.metricas = MetricasConsultas(limiar_lento_ms)
+        self.pool = PoolConexoes(self.conectar, pool_minimo, pool_maximo, ocioso_max_s)
+        try:
+            self.pool.aquecer()
+        except Exception as e:
+            print("Nao foi possivel abrir as conexoes iniciais do pool:", e)
 
     def conectar(self):
         return psycopg2.connect(**self.configuracao.como_dict())
 
+    def _novo_cursor(self, conexao, rotulo: str, **opcoes) -> CursorMedido:
+        cursor = conexao.cursor(cursor_factory=CursorMedido, **opcoes)
+        cursor.metricas = self.metricas
+        cursor.rotulo = rotulo
+        return cursor
+
+    def obter_cursor(self, rotulo: Optional[str] = None):
+        """
+        Cursor sobre uma conexao emprestada do pool; a conexao volta ao pool ao sair do bloco.
+        Cada consulta e medida em `metricas` com o `rotulo` (padrao: "modulo.funcao" de quem chamou).
+        """
+        return self._cursor(rotulo or rotulo_chamador())
+
     @contextmanager
-    def obter_cursor(self):
-        conexao = self.conectar()
-        cursor = conexao.cursor()
+    def _cursor(self, rotulo: str, **opcoes):
+        conexao = self.pool.obter()
+        descartar = False
         try:
-            yield conexao, cursor
+            cursor = self._novo_cursor(conexao, rotulo, **opcoes)
+            try:
+                yield conexao, cursor
+            finally:
+                cursor.close()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # conexao possivelmente quebrada: nao volta ao pool
+            descartar = True
+            raise
         finally:
-            cursor.close()
-            conexao.close()
+            self.pool.devolver(conexao, descartar)
+
+    def obter_cursor_servidor(self, itersize: int = 2000, rotulo: Optional[str] = None):
+        """
+        Cursor nomeado (server-side) sobre uma conexao do pool: ao iterar, as linhas chegam do servidor
+        em lotes de `itersize`, sem carregar o resultado inteiro na memoria. So para SELECT; a transacao
+        aberta pelo cursor e desfeita quando a conexao volta ao pool.
+        A medicao cobre o execute (abertura do cursor), nao a leitura dos lotes.
+        """
+        return self._cursor_servidor(itersize, rotulo or rotulo_chamador())
+
+    @contextmanager
+    def _cursor_servidor(self, itersize: int, rotulo: str):
+        with self._cursor(rotulo, name=f"fluxo_{next(_SEQUENCIA_CURSORES)}") as (conexao, cursor):
+            cursor.itersize = itersize
+            yield conexao, cursor
@@ -0,0 +1,141 @@
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from banco_dados import BancoDados
+
+# Casas decimais das coordenadas na chave do cache (6 casas ~ 0,1 m): o mesmo endereco
+# geocodificado de novo cai na mesma chave.
+CASAS_DECIMAIS_CHAVE = 6
+
+# Calcula as distancias (km) de cada origem para cada destino: matriz len(origens) x len(destinos).
+CalculoDistancias = Callable[[Sequence[Tuple[float, float]], Sequence[Tuple[float, float]]], np.ndarray]
+
+
+def normalizar_coordenada(coordenada: Tuple[float, float]) -> Tuple[float, float]:
+    lat, lng = coordenada
+    return round(float(lat), CASAS_DECIMAIS_CHAVE), round(float(lng), CASAS_DECIMAIS_CHAVE)
+
+
+class CacheDistancias:
+    """
+    Distancias par a par persistidas na tabela DISTANCIA_CACHE, por `fonte` (ex.: "haversine", "osrm")
+    e par orientado de coordenadas normalizadas (origem -> destino, para aceitar distancias de rua).
+    """
+
+    def __init__(self, banco: BancoDados, fonte: str):
+        self.banco = banco
+        self.fonte = fonte
+
+    def buscar(self, pontos: Sequence[Tuple[float, float]]) -> np.ndarray:
+        """
+        Matriz len(pontos) x len(pontos) com as distancias ja gravadas entre `pontos` (normalizados e
+        sem repeticao); pares ausentes ficam NaN. Uma unica consulta, juntando o cache aos pontos.
+        """
+        n = len(pontos)
+        matriz = np.full((n, n), np.nan)
+        if not n:
+            return matriz
+        posicao = {p: k for k, p in enumerate(pontos)}
+        lats = [p[0] for p in pontos]
+        lngs = [p[1] for p in pontos]
+        try:
+            with self.banco.obter_cursor() as (conn, cursor):
+                cursor.execute(
+                    """
+                    WITH pontos AS (
+                        SELECT * FROM unnest(%s::numeric[], %s::numeric[]) AS p(lat, lng)
+                    )
+                    SELECT d.origem_lat, d.origem_lng, d.destino_lat, d.destino_lng, d.distancia_km
+                    FROM distancia_cache d
+                    JOIN pontos o ON o.lat = d.origem_lat AND o.lng = d.origem_lng
+                    JOIN pontos q ON q.lat = d.destino_lat AND q.lng = d.destino_lng
+                    WHERE d.fonte = %s;
+                    """,
+                    (lats, lngs, self.fonte),
+                )
+                for o_lat, o_lng, d_lat, d_lng, km in cursor.fetchall():
+                    i = posicao.get((float(o_lat), float(o_lng)))
+                    j = posicao.get((float(d_lat), float(d_lng)))
+                    if i is not None and j is not None:
+                        matriz[i, j] = km
+        except Exception as e:
+            print("Erro ao buscar distancias em cache:", e)
+        return matriz
+
+    def gravar(self, pares: List[Tuple[Tuple[float, float], Tuple[float, float], float]]) -> bool:
+        """Grava pares (origem, destino, km) ja normalizados; pares existentes sao mantidos."""
+        if not pares:
+            return True
+        try:
+            with self.banco.obter_cursor() as (conn, cursor):
+                execute_values(
+                    cursor,
+                    """
+                    INSERT INTO distancia_cache
+                        (fonte, origem_lat, origem_lng, destino_lat, destino_lng, distancia_km)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING;
+                    """,
+                    [(self.fonte, o[0], o[1], d[0], d[1], float(km)) for o, d, km in pares],
+                    page_size=5000,
+                )
+                conn.commit()
+            return True
+        except Exception as e:
+            print("Erro ao gravar distancias em cache:", e)
+            return False
+
+    def _calcular_bloco(
+        self,
+        matriz: np.ndarray,
+        pontos: List[Tuple[float, float]],
+        linhas: np.ndarray,
+        colunas: np.ndarray,
+        calcular: CalculoDistancias,
+    ) -> None:
+        """Calcula o bloco linhas x colunas, preenche os pares ausentes em `matriz` e os grava no cache."""
+        calculado = np.asarray(
+            calcular([pontos[i] for i in linhas], [pontos[j] for j in colunas]), dtype=np.float64
+        )
+        bloco = matriz[np.ix_(linhas, colunas)]
+        ausentes = np.isnan(bloco)
+        bloco[ausentes] = calculado[ausentes]
+        matriz[np.ix_(linhas, colunas)] = bloco
+        novos_i, novos_j = np.nonzero(ausentes)
+        self.gravar(
+            [
+                (pontos[linhas[a]], pontos[colunas[b]], calculado[a, b])
+                for a, b in zip(novos_i.tolist(), novos_j.tolist())
+            ]
+        )
+
+    def montar_matriz(self, coordenadas: Sequence[Tuple[float, float]], calcular: CalculoDistancias) -> np.ndarray:
+        """
+        Monta a matriz NxN de `coordenadas` a partir do cache. So as linhas x colunas com pares ausentes
+        sao passadas para `calcular`, e apenas os pares que faltavam sao gravados de volta.
+        Coordenadas repetidas (mesmo endereco) compartilham a mesma linha.
+        """
+        normalizadas = [normalizar_coordenada(c) for c in coordenadas]
+        unicos: Dict[Tuple[float, float], int] = {}
+        for p in normalizadas:
+            unicos.setdefault(p, len(unicos))
+        pontos = list(unicos)
+
+        matriz = self.buscar(pontos)
+        np.fill_diagonal(matriz, 0.0)
+        faltando = np.isnan(matriz)
+        # pontos novos (linha inteira ausente) contra todos; depois o que ainda faltar nas demais linhas,
+        # que costuma ser so as colunas dos pontos novos
+        novos = np.flatnonzero(faltando.sum(axis=1) >= len(pontos) - 1)
+        if len(pontos) > 1 and len(novos):
+            self._calcular_bloco(matriz, pontos, novos, np.arange(len(pontos)), calcular)
+        faltando = np.isnan(matriz)
+        if faltando.any():
+            linhas = np.flatnonzero(faltando.any(axis=1))
+            colunas = np.flatnonzero(faltando.any(axis=0))
+            self._calcular_bloco(matriz, pontos, linhas, colunas, calcular)
+
+        indices = np.fromiter((unicos[p] for p in normalizadas), dtype=np.intp, count=len(normalizadas))
+        return np.ascontiguousarray(matriz[np.ix_(indices, indices)])
@@ -20,12 +20,24 @@ CREATE TABLE ENDERECO_CLIENTE (
 	BAIRRO VARCHAR(100),
 	NUMERO VARCHAR(6),
 	COORDENADAS VARCHAR(150),
+	LATITUDE DOUBLE PRECISION,
+	LONGITUDE DOUBLE PRECISION,
 	ENDERECO VARCHAR(100),
 	COMPLEMENTO VARCHAR(100),
 	PONTO_REFERENCIA VARCHAR(100),
-	FOREIGN KEY (ID_CLIENTE) REFERENCES CLIENTE(ID_CLIENTE)
+	FOREIGN KEY (ID_CLIENTE) REFERENCES CLIENTE(ID_CLIENTE),
+	CONSTRAINT ck_endereco_cliente_lat_lng CHECK (
+		(LATITUDE IS NULL) = (LONGITUDE IS NULL)
+		AND LATITUDE BETWEEN -90 AND 90
+		AND LONGITUDE BETWEEN -180 AND 180
+	)
 );
 
+-- consultas por area do mapa: point(lng, lat) <@ box(...) com ec.latitude IS NOT NULL
+CREATE INDEX IF NOT EXISTS idx_endereco_cliente_posicao ON ENDERECO_CLIENTE
+	USING gist (point(LONGITUDE, LATITUDE))
+	WHERE LATITUDE IS NOT NULL;
+
 -- Tabela PEDIDO
 CREATE TABLE PEDIDO(
 	N_NOTA INT PRIMARY KEY NOT NULL,
@@ -97,3 +109,19 @@ CREATE TABLE IF NOT EXISTS usuario_metricas (
     rotas_aceitas   INTEGER NOT NULL DEFAULT 0,
     atualizado_em   TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Cache persistente de distancias par a par (origem -> destino), por fonte de calculo
+-- (mesma definicao de database/migracoes/0003_distancia_cache.sql, para bancos ja existentes)
+CREATE TABLE IF NOT EXISTS distancia_cache (
+    fonte           VARCHAR(20) NOT NULL,
+    origem_lat      NUMERIC(9,6) NOT NULL,
+    origem_lng      NUMERIC(9,6) NOT NULL,
+    destino_lat     NUMERIC(9,6) NOT NULL,
+    destino_lng     NUMERIC(9,6) NOT NULL,
+    distancia_km    DOUBLE PRECISION NOT NULL,
+    criado_em       TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fonte, origem_lat, origem_lng, destino_lat, destino_lng)
+);
+
+-- Indices das consultas frequentes e demais alteracoes posteriores: database/migracoes.
+-- Passo obrigatorio apos criar o banco: python migracoes_banco.py aplicar
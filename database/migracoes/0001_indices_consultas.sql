@@ -0,0 +1,34 @@
+-- Indices para as consultas mais frequentes (o esquema inicial so tem chaves primarias).
+-- Aplicar com: python migracoes_banco.py aplicar
+
+-- "entregue" (EXISTS em ENTREGA por pedido) em quase todas as listagens
+CREATE INDEX IF NOT EXISTS idx_entrega_pedido_n_nota ON ENTREGA (PEDIDO_N_NOTA);
+
+-- filtro por data de entrega, rotas salvas e relatorio de entregas por dia
+CREATE INDEX IF NOT EXISTS idx_entrega_data_entrega ON ENTREGA (DATA_ENTREGA);
+
+-- ORDER BY p.dt_nota DESC NULLS LAST, p.n_nota DESC das listagens paginadas
+CREATE INDEX IF NOT EXISTS idx_pedido_dt_nota_n_nota ON PEDIDO (DT_NOTA DESC NULLS LAST, N_NOTA DESC);
+
+-- busca de endereco existente no importador (mesmas expressoes COALESCE do WHERE)
+CREATE INDEX IF NOT EXISTS idx_endereco_cliente_busca ON ENDERECO_CLIENTE (
+	ID_CLIENTE, CIDADE, BAIRRO, ENDERECO, COALESCE(NUMERO, ''), COALESCE(COMPLEMENTO, '')
+);
+
+-- filtros LIKE '%x%' da tela de pedidos: indices de trigramas sobre as mesmas expressoes do WHERE
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_cliente_nome_trgm ON CLIENTE USING gin (LOWER(NOME_CLIENTE) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_endereco_cliente_cidade_trgm ON ENDERECO_CLIENTE USING gin (LOWER(CIDADE) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_endereco_cliente_texto_trgm ON ENDERECO_CLIENTE USING gin ((
+	LOWER(
+		COALESCE(ENDERECO,'') || ' ' ||
+		COALESCE(NUMERO,'')   || ' ' ||
+		COALESCE(BAIRRO,'')   || ' ' ||
+		COALESCE(CIDADE,'')
+	)
+) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_pedido_n_nota_texto_trgm ON PEDIDO USING gin ((CAST(N_NOTA AS TEXT)) gin_trgm_ops);
@@ -0,0 +1,39 @@
+-- Coordenadas numericas em ENDERECO_CLIENTE (a string "lat,lng" em COORDENADAS continua gravada).
+-- Consultas e otimizador passam a ler LATITUDE/LONGITUDE; endereco sem elas e "incompleto".
+
+ALTER TABLE ENDERECO_CLIENTE
+	ADD COLUMN IF NOT EXISTS LATITUDE DOUBLE PRECISION,
+	ADD COLUMN IF NOT EXISTS LONGITUDE DOUBLE PRECISION;
+
+-- preenche a partir das strings validas; as invalidas ficam sem coordenada
+-- (CASE garante que so strings no formato sao convertidas)
+WITH convertidas AS (
+	SELECT
+		ID_ENDERECO,
+		CASE WHEN COORDENADAS ~ '^\s*-?[0-9]+(\.[0-9]+)?\s*,\s*-?[0-9]+(\.[0-9]+)?\s*$'
+			THEN CAST(btrim(split_part(COORDENADAS, ',', 1)) AS DOUBLE PRECISION) END AS LAT,
+		CASE WHEN COORDENADAS ~ '^\s*-?[0-9]+(\.[0-9]+)?\s*,\s*-?[0-9]+(\.[0-9]+)?\s*$'
+			THEN CAST(btrim(split_part(COORDENADAS, ',', 2)) AS DOUBLE PRECISION) END AS LNG
+	FROM ENDERECO_CLIENTE
+	WHERE LATITUDE IS NULL
+)
+UPDATE ENDERECO_CLIENTE ec
+SET LATITUDE = c.LAT, LONGITUDE = c.LNG
+FROM convertidas c
+WHERE ec.ID_ENDERECO = c.ID_ENDERECO
+  AND abs(c.LAT) <= 90
+  AND abs(c.LNG) <= 180;
+
+-- bancos criados pelo script de criacao atual ja tem colunas, restricao e indice
+ALTER TABLE ENDERECO_CLIENTE
+	DROP CONSTRAINT IF EXISTS ck_endereco_cliente_lat_lng,
+	ADD CONSTRAINT ck_endereco_cliente_lat_lng CHECK (
+		(LATITUDE IS NULL) = (LONGITUDE IS NULL)
+		AND LATITUDE BETWEEN -90 AND 90
+		AND LONGITUDE BETWEEN -180 AND 180
+	);
+
+-- consultas por area do mapa: point(lng, lat) <@ box(...) com ec.latitude IS NOT NULL
+CREATE INDEX IF NOT EXISTS idx_endereco_cliente_posicao ON ENDERECO_CLIENTE
+	USING gist (point(LONGITUDE, LATITUDE))
+	WHERE LATITUDE IS NOT NULL;
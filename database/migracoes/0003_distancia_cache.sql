@@ -0,0 +1,14 @@
+-- Cache persistente de distancias par a par (origem -> destino), por fonte de calculo (CacheDistancias).
+-- Bancos criados antes desta tabela entrar no script de criacao so a recebem por esta migracao.
+-- A chave primaria e o indice das buscas: fonte + par de coordenadas normalizadas.
+
+CREATE TABLE IF NOT EXISTS distancia_cache (
+    fonte           VARCHAR(20) NOT NULL,
+    origem_lat      NUMERIC(9,6) NOT NULL,
+    origem_lng      NUMERIC(9,6) NOT NULL,
+    destino_lat     NUMERIC(9,6) NOT NULL,
+    destino_lng     NUMERIC(9,6) NOT NULL,
+    distancia_km    DOUBLE PRECISION NOT NULL,
+    criado_em       TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fonte, origem_lat, origem_lng, destino_lat, destino_lng)
+);
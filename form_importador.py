@@ -51,6 +51,22 @@ class ServicoImportacao:
         except Exception:
             return None
 
+    def _parse_coordenadas(self, valor):
+        """
+        "lat,lng" -> (lat, lng) em graus, para as colunas LATITUDE/LONGITUDE.
+        Retorna (None, None) se vazio, fora do formato ou fora da faixa valida.
+        """
+        try:
+            if pd.isna(valor) or valor is None:
+                return None, None
+            lat_str, lng_str = str(valor).split(",")
+            lat, lng = float(lat_str.strip()), float(lng_str.strip())
+        except Exception:
+            return None, None
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+            return None, None
+        return lat, lng
+
     def _parse_date_safe(self, valor):
         """
         Tenta parsear a data em vários formatos comuns. Retorna None se falhar.
@@ -201,6 +217,7 @@ class ServicoImportacao:
                         numero = str(row.get(col_tranumend)).strip() if col_tranumend and pd.notna(row.get(col_tranumend)) else None
                         complemento = row.get(col_tracomplemento) if col_tracomplemento and pd.notna(row.get(col_tracomplemento)) else None
                         coordenadas = row.get(col_coord) if pd.notna(row.get(col_coord)) else None
+                        latitude, longitude = self._parse_coordenadas(coordenadas)
 
                         # busca por igualdade usando COALESCE para tratar None/NULL/'' consistentemente
                         cursor.execute(
@@ -226,22 +243,25 @@ class ServicoImportacao:
                                 cursor.execute(
                                     """
                                     UPDATE endereco_cliente
-                                    SET coordenadas = %s
+                                    SET coordenadas = %s, latitude = %s, longitude = %s
                                     WHERE id_endereco = %s;
                                     """,
-                                    (coordenadas, id_endereco),
+                                    (coordenadas, latitude, longitude, id_endereco),
                                 )
                         else:
                             cursor.execute(
                                 """
                                 INSERT INTO endereco_cliente (
                                     id_cliente, cidade, bairro, endereco,
-                                    numero, complemento, coordenadas
+                                    numero, complemento, coordenadas, latitude, longitude
                                 )
-                                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                                 RETURNING id_endereco;
                                 """,
-                                (id_cliente, cidade, bairro, endereco, numero, complemento, coordenadas),
+                                (
+                                    id_cliente, cidade, bairro, endereco, numero, complemento,
+                                    coordenadas, latitude, longitude,
+                                ),
                             )
                             res = cursor.fetchone()
                             id_endereco = res[0] if res else None
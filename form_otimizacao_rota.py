@@ -1,7 +1,40 @@
+import heapq
 import math
+import multiprocessing
+import os
 import random
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from indice_espacial import IndiceEspacial
+
+# Matriz de distancias aceita pelo otimizador: array NumPy, MatrizCondensada (simetrica, compacta)
+# ou lista de listas.
+MatrizDistancias = Union[np.ndarray, "MatrizCondensada", List[List[float]]]
+
+# Callback de progresso das otimizacoes: recebe um dict com o andamento (ver cada funcao).
+AoProgresso = Callable[[Dict[str, object]], None]
+
+# Motor de otimizacao: funcao com a assinatura basica de `encontrar_melhor_rota_genetico`
+# (matriz_distancias, entregas, veiculos, deposito, **parametros) e o mesmo formato de retorno.
+MotorOtimizacao = Callable[..., Dict[str, object]]
+
+# Instancia, Cromossomo, CriterioParada e as funcoes sem "_" de construcao, busca local e fitness sao
+# compartilhadas com os demais motores (motor_alns); nomes com "_" sao internos deste modulo.
+
+# Pools de processos (ilhas e clusters) com "spawn": processos novos em vez de fork, que copiaria para
+# os filhos as travas e threads do servidor Flask e do pool de jobs em estado indefinido. Cada processo
+# importa de novo o modulo principal: scripts que usam ilhas ou clusters precisam de `if __name__ == "__main__"`.
+_CONTEXTO_PROCESSOS = multiprocessing.get_context("spawn")
+
+# Monta a matriz de um conjunto de coordenadas e informa a fonte usada (ex.: `montar_matriz_distancias`
+# com o cache persistente).
+MontarMatriz = Callable[[List[Tuple[float, float]]], Tuple[MatrizDistancias, Optional[str]]]
 
 
 # -----------------------------
@@ -23,16 +56,225 @@ def haversine(p1: Tuple[float, float], p2: Tuple[float, float], raio_km: float =
     return raio_km * c
 
 
+def gerar_distancias_numpy(
+    origens: Sequence[Tuple[float, float]],
+    destinos: Sequence[Tuple[float, float]],
+    raio_km: float = 6371.0,
+) -> np.ndarray:
+    """
+    Distancias (km) de cada origem para cada destino, matriz len(origens) x len(destinos),
+    em uma unica passada vetorizada; a formula e a mesma de `haversine`.
+    """
+    a_pts = np.asarray(origens, dtype=np.float64).reshape(-1, 2)
+    b_pts = np.asarray(destinos, dtype=np.float64).reshape(-1, 2)
+    lat_a, lon_a = np.radians(a_pts[:, 0]), np.radians(a_pts[:, 1])
+    lat_b, lon_b = np.radians(b_pts[:, 0]), np.radians(b_pts[:, 1])
+
+    a = np.sin((lat_a[:, None] - lat_b[None, :]) / 2) ** 2
+    a += np.outer(np.cos(lat_a), np.cos(lat_b)) * np.sin((lon_a[:, None] - lon_b[None, :]) / 2) ** 2
+    np.clip(a, 0.0, 1.0, out=a)  # evita sqrt de negativo por erro de arredondamento
+    return 2 * raio_km * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def gerar_matriz_distancias_numpy(
+    coordenadas: Sequence[Tuple[float, float]], raio_km: float = 6371.0
+) -> np.ndarray:
+    """
+    Gera a matriz NxN de distancias (km) em uma unica passada vetorizada.
+    Retorna um array float64 contiguo; a formula e a mesma de `haversine`.
+    """
+    matriz = gerar_distancias_numpy(coordenadas, coordenadas, raio_km)
+    np.fill_diagonal(matriz, 0.0)
+    return np.ascontiguousarray(matriz)
+
+
 def gerar_matriz_distancias(coordenadas: List[Tuple[float, float]]) -> List[List[float]]:
-    """Gera matriz NxN de distancias a partir de uma lista de coordenadas (lat, lon)."""
-    n = len(coordenadas)
-    matriz = [[0.0 for _ in range(n)] for _ in range(n)]
-
-    for i in range(n):
-        for j in range(i + 1, n):
-            dist = haversine(coordenadas[i], coordenadas[j])
-            matriz[i][j] = dist
-            matriz[j][i] = dist  # garante simetria
+    """
+    Gera matriz NxN de distancias a partir de uma lista de coordenadas (lat, lon).
+    Mantida por compatibilidade: usa o calculo vetorizado e converte para lista de listas.
+    """
+    return gerar_matriz_distancias_numpy(coordenadas).tolist()
+
+
+class MatrizCondensada:
+    """
+    Matriz de distancias simetrica guardada so pelo triangulo superior (sem a diagonal) em float32:
+    n(n-1)/2 valores de 4 bytes, contra n*n de 8 bytes do ndarray (ou ~32 bytes por float em lista de listas).
+    Acesso O(1) por `distancia(i, j)` ou `matriz[i][j]` (a linha e uma visao sobre o buffer, sem copia).
+    Para muitos pares use `valores` (vetorizado) ou `submatriz`.
+    """
+
+    __slots__ = ("n", "dados", "_inicios")
+
+    def __init__(self, n: int, dados: np.ndarray):
+        dados = np.ascontiguousarray(dados, dtype=np.float32)
+        if dados.shape != (n * (n - 1) // 2,):
+            raise ValueError(f"MatrizCondensada de {n} pontos precisa de {n * (n - 1) // 2} valores.")
+        self.n = n
+        self.dados = dados
+        self._inicios = None
+
+    def __reduce__(self):
+        return MatrizCondensada, (self.n, self.dados)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.n, self.n
+
+    def distancia(self, i: int, j: int) -> float:
+        if i == j:
+            return 0.0
+        if i > j:
+            i, j = j, i
+        return float(self.dados[i * self.n - i * (i + 1) // 2 + j - i - 1])
+
+    def valores(self, linhas, colunas) -> np.ndarray:
+        """Distancias elemento a elemento entre `linhas` e `colunas` (arrays de indices com broadcasting)."""
+        i = np.asarray(linhas, dtype=np.int64)
+        j = np.asarray(colunas, dtype=np.int64)
+        i, j = np.broadcast_arrays(i, j)
+        menor, maior = np.minimum(i, j), np.maximum(i, j)
+        posicao = menor * self.n - menor * (menor + 1) // 2 + maior - menor - 1
+        diagonal = menor == maior
+        if not len(self.dados):
+            return np.zeros(posicao.shape)
+        posicao[diagonal] = 0
+        resultado = self.dados[posicao].astype(np.float64)
+        resultado[diagonal] = 0.0
+        return resultado
+
+    def linha(self, i: int) -> np.ndarray:
+        return self.valores(i, np.arange(self.n))
+
+    def linhas_condensadas(self) -> List["_LinhaCondensada"]:
+        """Todas as linhas como `_LinhaCondensada` sobre o mesmo buffer (memoria O(n) alem da matriz)."""
+        if self._inicios is None:
+            n = self.n
+            # inicios[k] + j = posicao de (k, j) no buffer, para j > k
+            self._inicios = [k * (2 * n - k - 3) // 2 - 1 for k in range(n)]
+        dados = memoryview(self.dados)
+        return [_LinhaCondensada(dados, self._inicios, i) for i in range(self.n)]
+
+    def __getitem__(self, chave):
+        if isinstance(chave, tuple):
+            return self.distancia(*chave)
+        if self._inicios is None:
+            self.linhas_condensadas()
+        return _LinhaCondensada(memoryview(self.dados), self._inicios, int(chave))
+
+    def submatriz(self, indices: Sequence[int]) -> np.ndarray:
+        """Matriz densa (float64) so entre os `indices` informados."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return self.valores(indices[:, None], indices[None, :])
+
+    def densa(self) -> np.ndarray:
+        return self.submatriz(np.arange(self.n))
+
+    def __array__(self, dtype=None, copy=None):
+        densa = self.densa()
+        return densa if dtype is None else densa.astype(dtype)
+
+
+def gerar_matriz_condensada(
+    coordenadas: Sequence[Tuple[float, float]], raio_km: float = 6371.0, linhas_por_bloco: int = 256
+) -> MatrizCondensada:
+    """
+    Mesma matriz de `gerar_matriz_distancias_numpy` no formato condensado, calculada em blocos de linhas
+    (sem alocar a matriz NxN densa).
+    """
+    pontos = np.asarray(coordenadas, dtype=np.float64).reshape(-1, 2)
+    n = pontos.shape[0]
+    dados = np.empty(n * (n - 1) // 2, dtype=np.float32)
+    for inicio in range(0, n, linhas_por_bloco):
+        fim = min(inicio + linhas_por_bloco, n)
+        bloco = gerar_distancias_numpy(pontos[inicio:fim], pontos[inicio:], raio_km)
+        for i in range(inicio, fim):
+            pos = i * n - i * (i + 1) // 2
+            dados[pos : pos + n - i - 1] = bloco[i - inicio, i - inicio + 1 :]
+    return MatrizCondensada(n, dados)
+
+
+def _submatriz(matriz: MatrizDistancias, indices: Sequence[int]) -> np.ndarray:
+    """Matriz densa float64 entre os `indices`, para qualquer formato de MatrizDistancias."""
+    if isinstance(matriz, MatrizCondensada):
+        return matriz.submatriz(indices)
+    return np.asarray(matriz, dtype=np.float64)[np.ix_(indices, indices)]
+
+
+def _valores_pares(matriz: MatrizDistancias, linhas, colunas) -> np.ndarray:
+    """Distancias elemento a elemento linhas[k] -> colunas[k], para qualquer formato de MatrizDistancias."""
+    if isinstance(matriz, MatrizCondensada):
+        return matriz.valores(linhas, colunas)
+    if not isinstance(matriz, np.ndarray):
+        return np.array([matriz[i][j] for i, j in zip(np.ravel(linhas), np.ravel(colunas))], dtype=np.float64)
+    return matriz[linhas, colunas].astype(np.float64, copy=False)
+
+
+def matriz_simetrica(matriz: MatrizDistancias) -> MatrizDistancias:
+    """
+    A busca local avalia movimentos assumindo d(i, j) == d(j, i). Matrizes por estrada (assimetricas)
+    sao trocadas pela media das duas direcoes; matrizes simetricas sao retornadas sem copia.
+    """
+    if isinstance(matriz, np.ndarray) and matriz.size and not np.allclose(matriz, matriz.T, rtol=0.0, atol=1e-9):
+        return (matriz + matriz.T) / 2
+    return matriz
+
+
+class _LinhaCondensada:
+    """Linha i de uma MatrizCondensada para leitura escalar O(1) `linha[j]`, sem copiar valores."""
+
+    __slots__ = ("dados", "inicio", "i")
+
+    def __init__(self, dados: Union[memoryview, np.ndarray], inicio: List[int], i: int):
+        self.dados = dados if isinstance(dados, memoryview) else memoryview(dados)
+        self.inicio = inicio  # inicio[k] + j = posicao de (k, j) no buffer, para j > k
+        self.i = i
+
+    def __reduce__(self):
+        # envia o array por tras da memoryview: as linhas da mesma matriz compartilham o array e a
+        # lista de inicios, que o pickle copia uma unica vez (ex.: instancia enviada as ilhas)
+        return _LinhaCondensada, (self.dados.obj, self.inicio, self.i)
+
+    def __getitem__(self, j: int) -> float:
+        i = self.i
+        if j > i:
+            return self.dados[self.inicio[i] + j]
+        if j < i:
+            return self.dados[self.inicio[j] + i]
+        return 0.0
+
+    def __len__(self) -> int:
+        return len(self.inicio)
+
+    def __array__(self, dtype=None, copy=None):
+        n = len(self.inicio)
+        linha = np.zeros(n, dtype=np.float64)
+        dados = np.frombuffer(self.dados, dtype=np.float32)
+        linha[self.i + 1 :] = dados[self.inicio[self.i] + self.i + 1 : self.inicio[self.i] + n]
+        if self.i:
+            linha[: self.i] = dados[np.asarray(self.inicio[: self.i]) + self.i]
+        return linha if dtype is None else linha.astype(dtype)
+
+
+def linhas_matriz(matriz: MatrizDistancias, linhas_densas: bool = False) -> List[Sequence[float]]:
+    """
+    Retorna a matriz como lista de linhas `array` (float64) para os lacos escalares do otimizador:
+    `linhas[i][j]` devolve um float Python como numa lista de listas, com 8 bytes por valor em vez
+    de ~32, e leitura mais rapida por localidade de memoria.
+    MatrizCondensada vira linhas `_LinhaCondensada` sobre o proprio buffer (memoria O(n) alem da
+    matriz). Com `linhas_densas`, e expandida em linhas float32: n*n*4 bytes a mais (o dobro da
+    matriz condensada) em troca de leitura cerca de duas vezes mais rapida.
+    """
+    if isinstance(matriz, MatrizCondensada):
+        if linhas_densas:
+            return [array("f", matriz.linha(i).astype(np.float32).tobytes()) for i in range(matriz.n)]
+        return matriz.linhas_condensadas()
+    if isinstance(matriz, np.ndarray):
+        linhas = np.ascontiguousarray(matriz, dtype=np.float64)
+        return [array("d", linha.tobytes()) for linha in linhas]
     return matriz
 
 
@@ -54,6 +296,15 @@ class Entrega:
     indice_matriz: int  # posicao do ponto na matriz de distancias
 
 
+def _tipos_compativeis(tipo_veiculo: int, tipo_carga: int) -> bool:
+    """Mesma regra de `_entrega_compativel`, aplicada direto aos tipos de carga."""
+    if tipo_carga == 2 and tipo_veiculo != 2:
+        return False
+    if tipo_veiculo == 2 and tipo_carga != 2:
+        return False
+    return tipo_veiculo == tipo_carga
+
+
 def _entrega_compativel(veiculo: Veiculo, entrega: Entrega) -> bool:
     """
     Valida compatibilidade de tipo de carga.
@@ -61,17 +312,31 @@ def _entrega_compativel(veiculo: Veiculo, entrega: Entrega) -> bool:
     - Carga tipo 2 somente pode ir em veiculo tipo 2.
     - Para os demais tipos, exige igualdade.
     """
-    if entrega.tipo_carga == 2 and veiculo.tipo_carga != 2:
-        return False
-    if veiculo.tipo_carga == 2 and entrega.tipo_carga != 2:
-        return False
-    return veiculo.tipo_carga == entrega.tipo_carga
+    return _tipos_compativeis(veiculo.tipo_carga, entrega.tipo_carga)
+
+
+def montar_tabela_compatibilidade(
+    veiculos: Sequence[Veiculo], tipos_carga: Iterable[int]
+) -> Dict[int, List[int]]:
+    """
+    Pre-calcula, para cada tipo de carga, os indices (em `veiculos`) dos veiculos compativeis.
+    Deve ser montada uma vez por otimizacao e reaproveitada em todas as etapas.
+    """
+    return {
+        tipo: [v for v, veic in enumerate(veiculos) if _tipos_compativeis(int(veic.tipo_carga), tipo)]
+        for tipo in {int(t) for t in tipos_carga}
+    }
 
 
-def _distancia_rota(indices: List[int], matriz: List[List[float]], deposito: int) -> float:
+def _distancia_rota(indices: List[int], matriz: MatrizDistancias, deposito: int) -> float:
     """Calcula distancia deposito -> pontos -> deposito para uma rota."""
     if not indices:
         return 0.0
+    if isinstance(matriz, (np.ndarray, MatrizCondensada)):
+        caminho = np.empty(len(indices) + 2, dtype=np.intp)
+        caminho[0] = caminho[-1] = deposito
+        caminho[1:-1] = indices
+        return float(_valores_pares(matriz, caminho[:-1], caminho[1:]).sum())
     distancia = matriz[deposito][indices[0]]
     for i in range(len(indices) - 1):
         distancia += matriz[indices[i]][indices[i + 1]]
@@ -79,233 +344,1169 @@ def _distancia_rota(indices: List[int], matriz: List[List[float]], deposito: int
     return distancia
 
 
-def _peso_rota(ids_entregas: List[str], entregas_map: Dict[str, Entrega]) -> float:
-    return sum(entregas_map[eid].peso for eid in ids_entregas)
+# -----------------------------
+# Representacao interna (cromossomo inteiro)
+# -----------------------------
+# Dentro do algoritmo genetico, entregas e veiculos sao identificados pela posicao
+# nas listas recebidas (0..n-1 e 0..m-1). O cromossomo (Cromossomo) guarda, por veiculo,
+# a ordem de visita das entregas: rotas[v] = [entrega, entrega, ...].
+# A conversao para ids (placa / nota) acontece apenas uma vez, no resultado final.
+@dataclass
+class Instancia:
+    """Dados da otimizacao pre-calculados em listas planas indexadas por inteiro."""
+    entregas: List[Entrega]
+    veiculos: List[Veiculo]
+    matriz: List[Sequence[float]]  # linhas de `linhas_matriz`
+    deposito: int
+    pesos: List[float]  # peso de cada entrega
+    tipos: List[int]  # tipo de carga de cada entrega
+    pontos: List[int]  # indice na matriz de distancias de cada entrega
+    limites: List[float]  # limite de peso de cada veiculo
+    tipos_veiculo: List[int]  # tipo de carga de cada veiculo
+    compativeis: List[List[int]]  # veiculos compativeis com cada entrega (listas compartilhadas por tipo)
+    mascaras: List[int]  # mesmos veiculos como bitmask: bit v ligado = veiculo v compativel
+    vizinhos: List[List[int]] = field(default_factory=list)  # k entregas mais proximas de cada entrega
+
+
+def montar_instancia(
+    matriz: List[Sequence[float]],
+    entregas: List[Entrega],
+    veiculos: List[Veiculo],
+    deposito: int,
+    compatibilidade: Optional[Dict[int, List[int]]] = None,
+    vizinhos: Optional[List[List[int]]] = None,
+) -> Instancia:
+    tipos = [int(e.tipo_carga) for e in entregas]
+    if compatibilidade is None or not set(tipos) <= compatibilidade.keys():
+        compatibilidade = montar_tabela_compatibilidade(veiculos, tipos)
+    mascara_por_tipo = {
+        tipo: sum(1 << v for v in indices) for tipo, indices in compatibilidade.items()
+    }
+    return Instancia(
+        entregas=entregas,
+        veiculos=veiculos,
+        matriz=matriz,
+        deposito=deposito,
+        pesos=[float(e.peso) for e in entregas],
+        tipos=tipos,
+        pontos=[int(e.indice_matriz) for e in entregas],
+        limites=[float(v.limite_peso) for v in veiculos],
+        tipos_veiculo=[int(v.tipo_carga) for v in veiculos],
+        compativeis=[compatibilidade[t] for t in tipos],
+        mascaras=[mascara_por_tipo[t] for t in tipos],
+        vizinhos=vizinhos or [],
+    )
+
+
+def vizinhos_mais_proximos(matriz: MatrizDistancias, pontos: List[int], k: int) -> List[List[int]]:
+    """
+    Lista, para cada entrega, as `k` entregas mais proximas (indices de entrega, da mais perto para a mais longe).
+    Usa a submatriz das entregas de uma vez com argpartition.
+    """
+    n = len(pontos)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    indices = np.asarray(pontos, dtype=np.intp)
+    sub = _submatriz(matriz, indices)
+    np.fill_diagonal(sub, np.inf)
+    candidatos = np.argpartition(sub, k - 1, axis=1)[:, :k]
+    ordem = np.take_along_axis(sub, candidatos, axis=1).argsort(axis=1)
+    return np.take_along_axis(candidatos, ordem, axis=1).tolist()
+
+
+def vizinhos_por_indice(indice: IndiceEspacial, pontos: List[int], k: int) -> List[List[int]]:
+    """
+    Mesmas listas de `vizinhos_mais_proximos`, consultadas no indice espacial (montado sobre todos os
+    pontos da matriz, deposito incluso) sem formar a submatriz das entregas.
+    """
+    entregas_no_ponto: Dict[int, List[int]] = {}
+    for e, ponto in enumerate(pontos):
+        entregas_no_ponto.setdefault(ponto, []).append(e)
+    vizinhos = []
+    for e, ponto in enumerate(pontos):
+        # outras entregas no mesmo endereco primeiro; uma consulta a mais cobre o deposito
+        lista = [o for o in entregas_no_ponto[ponto] if o != e]
+        for p in indice.vizinhos(ponto, k + 1):
+            lista.extend(entregas_no_ponto.get(p, ()))
+        vizinhos.append(lista[:k])
+    return vizinhos
+
+
+class Cromossomo:
+    """
+    Rotas por veiculo, o indice inverso entrega -> (veiculo, posicao) e a carga total de cada veiculo.
+    Toda alteracao de rota deve passar pelos metodos abaixo para manter indice e cargas em dia.
+    """
+
+    __slots__ = ("rotas", "veiculo_de", "posicao_de", "cargas", "_pesos")
+
+    def __init__(self, rotas: List[List[int]], inst: Instancia, cargas: Optional[List[float]] = None):
+        self.rotas = rotas
+        self._pesos = inst.pesos
+        self.veiculo_de = [-1] * len(inst.entregas)
+        self.posicao_de = [-1] * len(inst.entregas)
+        for v in range(len(rotas)):
+            self.reindexar(v)
+        if cargas is None:
+            cargas = [sum(self._pesos[e] for e in rota) for rota in rotas]
+        self.cargas = cargas
+
+    def reindexar(self, v: int, inicio: int = 0) -> None:
+        """Atualiza o indice inverso das posicoes `inicio..fim` da rota do veiculo `v`."""
+        rota = self.rotas[v]
+        veiculo_de, posicao_de = self.veiculo_de, self.posicao_de
+        for pos in range(inicio, len(rota)):
+            e = rota[pos]
+            veiculo_de[e] = v
+            posicao_de[e] = pos
+
+    def trocar(self, v: int, i: int, j: int) -> None:
+        rota = self.rotas[v]
+        rota[i], rota[j] = rota[j], rota[i]
+        self.posicao_de[rota[i]] = i
+        self.posicao_de[rota[j]] = j
+
+    def mover(self, e: int, destino: int) -> None:
+        """Retira a entrega `e` da rota atual e a coloca no fim da rota de `destino`."""
+        origem, pos = self.veiculo_de[e], self.posicao_de[e]
+        del self.rotas[origem][pos]
+        self.reindexar(origem, pos)
+        rota_destino = self.rotas[destino]
+        rota_destino.append(e)
+        self.veiculo_de[e] = destino
+        self.posicao_de[e] = len(rota_destino) - 1
+        peso = self._pesos[e]
+        self.cargas[origem] -= peso
+        self.cargas[destino] += peso
+
+
+def decodificar(solucao: Cromossomo, inst: Instancia) -> Dict[str, List[str]]:
+    """Converte o cromossomo inteiro para o formato {placa: [ids das entregas]}."""
+    return {
+        veiculo.id: [inst.entregas[e].id for e in rota]
+        for veiculo, rota in zip(inst.veiculos, solucao.rotas)
+    }
 
 
-def _avaliar_rota_ids(
-    rota_ids: List[str],
-    matriz: List[List[float]],
-    entregas_map: Dict[str, Entrega],
-    deposito: int,
-) -> float:
-    """Calcula custo da rota (deposito -> pontos -> deposito) usando ids de entrega."""
-    if not rota_ids:
+def avaliar_rota(rota: List[int], inst: Instancia) -> float:
+    """Calcula custo da rota (deposito -> pontos -> deposito) a partir dos indices das entregas."""
+    if not rota:
         return 0.0
-    indices = [entregas_map[eid].indice_matriz for eid in rota_ids]
-    return _distancia_rota(indices, matriz, deposito)
+    pontos = inst.pontos
+    return _distancia_rota([pontos[e] for e in rota], inst.matriz, inst.deposito)
 
 
-def _criar_solucao_inicial(entregas: List[Entrega], veiculos: List[Veiculo]) -> Dict[str, List[str]]:
-    solucao = {v.id: [] for v in veiculos}
-    pesos = {v.id: 0.0 for v in veiculos}
-    embaralhadas = entregas[:]
+def criar_solucao_inicial(inst: Instancia) -> Cromossomo:
+    n_veiculos = len(inst.veiculos)
+    solucao: List[List[int]] = [[] for _ in range(n_veiculos)]
+    pesos = [0.0] * n_veiculos
+    embaralhadas = list(range(len(inst.entregas)))
     random.shuffle(embaralhadas)
 
-    for entrega in embaralhadas:
-        candidatos = [
-            v for v in veiculos
-            if _entrega_compativel(v, entrega) and pesos[v.id] + entrega.peso <= v.limite_peso
-        ]
+    for e in embaralhadas:
+        peso = inst.pesos[e]
+        candidatos = [v for v in inst.compativeis[e] if pesos[v] + peso <= inst.limites[v]]
         if not candidatos:
-            raise ValueError(f"Nenhum veiculo suporta a entrega {entrega.id} (peso ou tipo de carga).")
-        veiculo_escolhido = random.choice(candidatos)
-        solucao[veiculo_escolhido.id].append(entrega.id)
-        pesos[veiculo_escolhido.id] += entrega.peso
+            raise ValueError(f"Nenhum veiculo suporta a entrega {inst.entregas[e].id} (peso ou tipo de carga).")
+        escolhido = random.choice(candidatos)
+        solucao[escolhido].append(e)
+        pesos[escolhido] += peso
 
-    for rota in solucao.values():
+    for rota in solucao:
         random.shuffle(rota)
+    return Cromossomo(solucao, inst, pesos)
+
+
+# vizinhos de cada entrega considerados como pares de economia no Clarke-Wright
+VIZINHOS_ECONOMIA = 20
+
+
+def _capacidade_maxima_por_entrega(inst: Instancia) -> List[float]:
+    """Maior limite de peso entre os veiculos compativeis com cada entrega."""
+    por_tipo: Dict[int, float] = {}
+    for e, tipo in enumerate(inst.tipos):
+        if tipo not in por_tipo:
+            por_tipo[tipo] = max((inst.limites[v] for v in inst.compativeis[e]), default=0.0)
+    return [por_tipo[t] for t in inst.tipos]
+
+
+def _rotas_por_economia(
+    inst: Instancia,
+    matriz: MatrizDistancias,
+    candidatos: List[List[int]],
+    ruido: float = 0.0,
+    rng: Optional[np.random.Generator] = None,
+) -> List[List[int]]:
+    """
+    Clarke-Wright: parte de uma rota por entrega e junta pontas de rotas em ordem decrescente de
+    economia s(i, j) = d(dep, i) + d(dep, j) - d(i, j), so entre entregas do mesmo tipo de carga e
+    sem passar da maior capacidade entre os veiculos compativeis.
+    Os pares avaliados sao os de `candidatos` (vizinhos mais proximos de cada entrega), sem formar a
+    submatriz n x n. Com `ruido` > 0 as economias sao multiplicadas por fatores aleatorios em
+    [1 - ruido, 1 + ruido]. Retorna as rotas ainda sem veiculo (ver `_atribuir_rotas`).
+    """
+    n = len(inst.entregas)
+    indices = np.asarray(inst.pontos, dtype=np.intp)
+    ate_deposito = _valores_pares(matriz, np.full(n, inst.deposito), indices)
+    tipos = np.asarray(inst.tipos)
+    linhas = np.repeat(np.arange(n), [len(v) for v in candidatos])
+    colunas = np.fromiter((j for v in candidatos for j in v), dtype=linhas.dtype, count=len(linhas))
+    pares = np.unique(np.stack([np.minimum(linhas, colunas), np.maximum(linhas, colunas)]), axis=1)
+    pares = pares[:, tipos[pares[0]] == tipos[pares[1]]]
+    linhas, colunas = pares[0], pares[1]
+    entre = _valores_pares(matriz, indices[linhas], indices[colunas])
+    valores = ate_deposito[linhas] + ate_deposito[colunas] - entre
+    positivos = valores > 0
+    linhas, colunas, valores = linhas[positivos], colunas[positivos], valores[positivos]
+    if ruido > 0 and len(valores):
+        rng = rng or np.random.default_rng()
+        valores = valores * rng.uniform(1.0 - ruido, 1.0 + ruido, size=len(valores))
+    ordem = np.argsort(-valores, kind="stable")
+
+    capacidade = _capacidade_maxima_por_entrega(inst)
+    rotas: Dict[int, List[int]] = {e: [e] for e in range(n)}
+    cargas = {e: inst.pesos[e] for e in range(n)}
+    rota_de = list(range(n))
+    for i, j in zip(linhas[ordem].tolist(), colunas[ordem].tolist()):
+        ri, rj = rota_de[i], rota_de[j]
+        if ri == rj or cargas[ri] + cargas[rj] > capacidade[i] + TOLERANCIA_PESO:
+            continue
+        a, b = rotas[ri], rotas[rj]
+        # so liga pontas: i no fim de a e j no inicio de b (invertendo as rotas quando preciso)
+        if a[-1] != i:
+            if a[0] != i:
+                continue
+            a.reverse()
+        if b[0] != j:
+            if b[-1] != j:
+                continue
+            b.reverse()
+        a.extend(b)
+        cargas[ri] += cargas.pop(rj)
+        del rotas[rj]
+        for e in b:
+            rota_de[e] = ri
+    return list(rotas.values())
+
+
+def _rotas_por_varredura(
+    inst: Instancia, coordenadas: Sequence[Tuple[float, float]], angulo_inicial: float = 0.0
+) -> List[List[int]]:
+    """
+    Varredura (sweep): ordena as entregas pelo angulo em torno do deposito, a partir de
+    `angulo_inicial`, e fecha uma rota sempre que a proxima entrega passaria da maior capacidade
+    compativel. Cada tipo de carga e varrido separadamente.
+    """
+    lat0, lng0 = coordenadas[inst.deposito]
+    escala_lng = math.cos(math.radians(lat0))
+    volta = 2 * math.pi
+    por_tipo: Dict[int, List[Tuple[float, int]]] = {}
+    for e, ponto in enumerate(inst.pontos):
+        lat, lng = coordenadas[ponto]
+        angulo = math.atan2(lat - lat0, (lng - lng0) * escala_lng)
+        por_tipo.setdefault(inst.tipos[e], []).append(((angulo - angulo_inicial) % volta, e))
+
+    capacidade = _capacidade_maxima_por_entrega(inst)
+    rotas: List[List[int]] = []
+    for ordenadas in por_tipo.values():
+        ordenadas.sort()
+        rota: List[int] = []
+        carga = 0.0
+        for _, e in ordenadas:
+            peso = inst.pesos[e]
+            if rota and carga + peso > capacidade[e] + TOLERANCIA_PESO:
+                rotas.append(rota)
+                rota, carga = [], 0.0
+            rota.append(e)
+            carga += peso
+        if rota:
+            rotas.append(rota)
+    return rotas
+
+
+def _atribuir_rotas(rotas: List[List[int]], inst: Instancia) -> List[List[int]]:
+    """
+    Distribui rotas construidas (sem veiculo) pela frota: as mais pesadas primeiro, cada uma inteira no
+    veiculo compativel com mais folga que a comporte (rotas no mesmo veiculo sao concatenadas).
+    Rotas que nao cabem inteiras em nenhum veiculo sao repartidas entrega a entrega.
+    Levanta ValueError se alguma entrega nao couber em nenhum veiculo.
+    """
+    solucao: List[List[int]] = [[] for _ in inst.veiculos]
+    pesos = [0.0] * len(inst.veiculos)
+    cargas_rotas = [sum(inst.pesos[e] for e in rota) for rota in rotas]
+    for k in sorted(range(len(rotas)), key=cargas_rotas.__getitem__, reverse=True):
+        rota, carga = rotas[k], cargas_rotas[k]
+        compat = inst.compativeis[rota[0]]
+        cabe = [v for v in compat if pesos[v] + carga <= inst.limites[v] + TOLERANCIA_PESO]
+        if cabe:
+            v = max(cabe, key=lambda v: inst.limites[v] - pesos[v])
+            solucao[v].extend(rota)
+            pesos[v] += carga
+            continue
+        for e in rota:
+            peso = inst.pesos[e]
+            cabe = [v for v in compat if pesos[v] + peso <= inst.limites[v] + TOLERANCIA_PESO]
+            if not cabe:
+                raise ValueError(f"Nenhum veiculo suporta a entrega {inst.entregas[e].id} (peso ou tipo de carga).")
+            v = max(cabe, key=lambda v: inst.limites[v] - pesos[v])
+            solucao[v].append(e)
+            pesos[v] += peso
     return solucao
 
 
-def _veiculo_da_entrega(entrega_id: str, solucao: Dict[str, List[str]]) -> str:
-    for vid, rotas in solucao.items():
-        if entrega_id in rotas:
-            return vid
-    return ""
+def sementes_construtivas(
+    inst: Instancia,
+    matriz: MatrizDistancias,
+    quantidade: int,
+    candidatos: List[List[int]],
+    coordenadas: Optional[Sequence[Tuple[float, float]]] = None,
+    ruido: float = 0.15,
+) -> List[List[List[int]]]:
+    """
+    Gera ate `quantidade` solucoes (rotas por veiculo) pelas heuristicas construtivas: a primeira e o
+    Clarke-Wright deterministico e as demais variantes com economias perturbadas; com `coordenadas`,
+    metade das variantes vem da varredura com angulo inicial sorteado.
+    Variantes inviaveis para a frota sao descartadas (a populacao completa com solucoes aleatorias).
+    """
+    rng = np.random.default_rng(random.getrandbits(32))
+    sementes = []
+    for k in range(quantidade):
+        try:
+            if coordenadas is not None and k % 2 == 1:
+                rotas = _rotas_por_varredura(inst, coordenadas, random.uniform(0.0, 2 * math.pi))
+            else:
+                rotas = _rotas_por_economia(inst, matriz, candidatos, ruido if k else 0.0, rng)
+            sementes.append(_atribuir_rotas(rotas, inst))
+        except ValueError:
+            continue
+    return sementes
 
 
-def _ordenacao_referencia(solucao: Dict[str, List[str]]) -> Dict[str, Dict[str, int]]:
-    # mapa veiculo -> posicao da entrega (serve para preservar parte da ordem no crossover)
-    ref = {}
-    for vid, rota in solucao.items():
-        ref[vid] = {entrega_id: idx for idx, entrega_id in enumerate(rota)}
-    return ref
+# fracao das entregas retiradas e reinseridas em cada variante do plano anterior (reotimizacao)
+_FRACAO_PERTURBACAO_PLANO = 0.1
 
 
-def _crossover(
-    pai: Dict[str, List[str]],
-    mae: Dict[str, List[str]],
-    entregas: List[Entrega],
-    veiculos: List[Veiculo],
-) -> Dict[str, List[str]]:
-    filho = {v.id: [] for v in veiculos}
-    pesos = {v.id: 0.0 for v in veiculos}
+def melhor_posicao_insercao(rota: List[int], e: int, inst: Instancia) -> Tuple[float, int]:
+    """(acrescimo de distancia, posicao) da insercao mais barata da entrega `e` na `rota`."""
+    matriz, pontos, deposito = inst.matriz, inst.pontos, inst.deposito
+    ponto = pontos[e]
+    linha = matriz[ponto]
+    anterior = deposito
+    menor = (float("inf"), 0)
+    for pos in range(len(rota) + 1):
+        seguinte = pontos[rota[pos]] if pos < len(rota) else deposito
+        acrescimo = matriz[anterior][ponto] + linha[seguinte] - matriz[anterior][seguinte]
+        if acrescimo < menor[0]:
+            menor = (acrescimo, pos)
+        anterior = seguinte
+    return menor
 
-    ref_pai = _ordenacao_referencia(pai)
-    ref_mae = _ordenacao_referencia(mae)
-    veiculos_map = {v.id: v for v in veiculos}
 
-    for entrega in entregas:
+def inserir_mais_barato(rotas: List[List[int]], cargas: List[float], e: int, inst: Instancia) -> int:
+    """
+    Insere a entrega `e` na posicao de menor acrescimo de distancia entre os veiculos compativeis com
+    carga disponivel (ou, se nenhum comportar, entre todos os compativeis; a penalidade fica no fitness).
+    Altera `rotas` e `cargas` no lugar e retorna o veiculo escolhido.
+    Levanta ValueError se nenhum veiculo for compativel.
+    """
+    peso = inst.pesos[e]
+    melhor: Optional[Tuple[float, int, int]] = None
+    reserva: Optional[Tuple[float, int, int]] = None
+    for v in inst.compativeis[e]:
+        acrescimo, pos = melhor_posicao_insercao(rotas[v], e, inst)
+        menor = (acrescimo, v, pos)
+        if cargas[v] + peso <= inst.limites[v] + TOLERANCIA_PESO:
+            if melhor is None or menor[0] < melhor[0]:
+                melhor = menor
+        elif reserva is None or menor[0] < reserva[0]:
+            reserva = menor
+    escolha = melhor or reserva
+    if escolha is None:
+        raise ValueError(f"Nenhum veiculo suporta a entrega {inst.entregas[e].id} (peso ou tipo de carga).")
+    _, v, pos = escolha
+    rotas[v].insert(pos, e)
+    cargas[v] += peso
+    return v
+
+
+def rotas_do_plano_anterior(
+    inst: Instancia, plano: Dict[str, Sequence[str]]
+) -> Tuple[List[List[int]], Dict[str, int]]:
+    """
+    Converte um plano anterior {veiculo_id: [ids das entregas]} para rotas desta instancia: mantem a ordem
+    das entregas que continuam no mesmo veiculo (se compativel e com carga disponivel), descarta as que
+    sairam e insere as novas (e as que nao couberam) pela insercao mais barata.
+    Retorna as rotas e o resumo {"mantidas", "inseridas", "removidas"}.
+    """
+    veiculo_por_id = {v.id: k for k, v in enumerate(inst.veiculos)}
+    entrega_por_id = {e.id: k for k, e in enumerate(inst.entregas)}
+    rotas: List[List[int]] = [[] for _ in inst.veiculos]
+    cargas = [0.0] * len(inst.veiculos)
+    alocada = [False] * len(inst.entregas)
+    removidas = 0
+    for veiculo_id, ids in plano.items():
+        v = veiculo_por_id.get(str(veiculo_id))
+        for entrega_id in ids:
+            e = entrega_por_id.get(str(entrega_id))
+            if e is None:
+                removidas += 1
+                continue
+            if alocada[e] or v is None or not (inst.mascaras[e] >> v) & 1:
+                continue
+            if cargas[v] + inst.pesos[e] > inst.limites[v] + TOLERANCIA_PESO:
+                continue
+            rotas[v].append(e)
+            cargas[v] += inst.pesos[e]
+            alocada[e] = True
+
+    mantidas = sum(alocada)
+    # novas entregas, as mais pesadas primeiro (sao as mais dificeis de encaixar)
+    for e in sorted((e for e in range(len(alocada)) if not alocada[e]), key=inst.pesos.__getitem__, reverse=True):
+        inserir_mais_barato(rotas, cargas, e, inst)
+    return rotas, {"mantidas": mantidas, "inseridas": len(alocada) - mantidas, "removidas": removidas}
+
+
+def _sementes_do_plano(inst: Instancia, rotas: List[List[int]], quantidade: int) -> List[List[List[int]]]:
+    """
+    O plano anterior ja ajustado e `quantidade - 1` variantes em que uma fracao das entregas (uma entrega
+    sorteada e suas vizinhas, se houver listas de vizinhos) e retirada e reinserida pela insercao mais barata.
+    Com listas de vizinhos, o plano passa antes uma vez pela busca local entre rotas, que acomoda as
+    entregas inseridas melhor que a insercao isolada.
+    """
+    n = len(inst.entregas)
+    if inst.vizinhos:
+        rotas = _busca_local_entre_rotas(Cromossomo([r[:] for r in rotas], inst), inst).rotas
+    retirar = max(1, round(n * _FRACAO_PERTURBACAO_PLANO))
+    sementes = [rotas]
+    for _ in range(quantidade - 1):
+        centro = random.randrange(n)
+        if inst.vizinhos:
+            grupo = [centro] + inst.vizinhos[centro][: retirar - 1]
+        else:
+            grupo = [centro] + random.sample(range(n), min(retirar - 1, n))
+        retiradas = set(grupo)
+        variante = [[e for e in rota if e not in retiradas] for rota in rotas]
+        cargas = [sum(inst.pesos[e] for e in rota) for rota in variante]
+        ordem = list(retiradas)
+        random.shuffle(ordem)
+        for e in ordem:
+            inserir_mais_barato(variante, cargas, e, inst)
+        sementes.append(variante)
+    return sementes
+
+
+def _crossover(pai: Cromossomo, mae: Cromossomo, inst: Instancia) -> Cromossomo:
+    """
+    Cada entrega herda o veiculo do pai ou da mae (via indice inverso, O(1) por entrega).
+    A ordem de cada rota do filho segue as posicoes que as entregas tinham nos pais.
+    """
+    n_entregas = len(inst.entregas)
+    n_veiculos = len(inst.veiculos)
+    filho: List[List[int]] = [[] for _ in range(n_veiculos)]
+    pesos = [0.0] * n_veiculos
+
+    for e in range(n_entregas):
+        peso = inst.pesos[e]
         origem = pai if random.random() < 0.5 else mae
-        candidato = _veiculo_da_entrega(entrega.id, origem)
-        escolhido = None
-
-        if candidato:
-            veic = veiculos_map[candidato]
-            if (
-                _entrega_compativel(veic, entrega)
-                and pesos[candidato] + entrega.peso <= veic.limite_peso
-            ):
+        candidato = origem.veiculo_de[e]
+        escolhido = -1
+
+        if candidato >= 0:
+            if (inst.mascaras[e] >> candidato) & 1 and pesos[candidato] + peso <= inst.limites[candidato]:
                 escolhido = candidato
 
-        if not escolhido:
-            compat = [
-                v.id for v in veiculos
-                if _entrega_compativel(v, entrega) and pesos[v.id] + entrega.peso <= v.limite_peso
-            ]
+        if escolhido < 0:
+            compat = [v for v in inst.compativeis[e] if pesos[v] + peso <= inst.limites[v]]
             if compat:
                 escolhido = random.choice(compat)
             else:
                 # fallback: coloca no veiculo do pai/mae mesmo que gere penalidade
-                escolhido = candidato or veiculos[0].id
-
-        filho[escolhido].append(entrega.id)
-        pesos[escolhido] += entrega.peso
+                escolhido = candidato if candidato >= 0 else 0
 
-    for vid, rota in filho.items():
-        ref = {}
-        ref.update(ref_pai.get(vid, {}))
-        ref.update({k: v + 1000 for k, v in ref_mae.get(vid, {}).items()})
-        rota.sort(key=lambda eid: ref.get(eid, 9999))
-    return filho
+        filho[escolhido].append(e)
+        pesos[escolhido] += peso
 
+    # ordem de referencia: posicao na mae (depois das do pai), posicao no pai, demais por ultimo
+    veic_pai, pos_pai = pai.veiculo_de, pai.posicao_de
+    veic_mae, pos_mae = mae.veiculo_de, mae.posicao_de
+    for v, rota in enumerate(filho):
+        rota.sort(
+            key=lambda e: n_entregas + pos_mae[e] if veic_mae[e] == v
+            else pos_pai[e] if veic_pai[e] == v
+            else 2 * n_entregas
+        )
+    return Cromossomo(filho, inst, pesos)
 
-def _mutacao(
-    solucao: Dict[str, List[str]],
-    entregas_map: Dict[str, Entrega],
-    veiculos_map: Dict[str, Veiculo],
-    taxa_mutacao: float,
-) -> Dict[str, List[str]]:
-    novo = {vid: rotas[:] for vid, rotas in solucao.items()}
-
-    def pesos_atualizados():
-        return {vid: _peso_rota(rotas, entregas_map) for vid, rotas in novo.items()}
 
+def _mutacao(solucao: Cromossomo, inst: Instancia, taxa_mutacao: float) -> Cromossomo:
+    """
+    Troca duas entregas de posicao e/ou realoca uma entrega para outro veiculo.
+    Altera `solucao` no lugar (o filho recem-criado pelo crossover) e a retorna.
+    """
+    rotas = solucao.rotas
     if random.random() < taxa_mutacao:
-        vid = random.choice(list(novo.keys()))
-        rota = novo[vid]
-        if len(rota) > 1:
-            i, j = random.sample(range(len(rota)), 2)
-            rota[i], rota[j] = rota[j], rota[i]
+        v = random.randrange(len(rotas))
+        if len(rotas[v]) > 1:
+            i, j = random.sample(range(len(rotas[v])), 2)
+            solucao.trocar(v, i, j)
 
     if random.random() < taxa_mutacao:
-        pesos = pesos_atualizados()
-        origens = [v for v, r in novo.items() if r]
-        if origens:
-            origem_vid = random.choice(origens)
-            origem_rota = novo[origem_vid]
-            entrega_id = random.choice(origem_rota)
-            entrega = entregas_map[entrega_id]
-            destinos = [
-                vid for vid, veic in veiculos_map.items()
-                if vid != origem_vid
-                and _entrega_compativel(veic, entrega)
-                and pesos[vid] + entrega.peso <= veic.limite_peso
-            ]
-            if destinos:
-                destino_vid = random.choice(destinos)
-                origem_rota.remove(entrega_id)
-                novo[destino_vid].append(entrega_id)
-    return novo
+        cargas = solucao.cargas
+        e = random.randrange(len(inst.entregas))
+        origem = solucao.veiculo_de[e]
+        peso = inst.pesos[e]
+        destinos = [
+            v for v in inst.compativeis[e]
+            if v != origem and cargas[v] + peso <= inst.limites[v]
+        ]
+        if destinos:
+            solucao.mover(e, random.choice(destinos))
+    return solucao
 
 
-def _movimento_2opt_ids(rota_ids: List[str], i: int, j: int) -> List[str]:
-    """Aplica movimento 2-opt invertendo trecho (i+1..j) da rota."""
-    return rota_ids[: i + 1] + list(reversed(rota_ids[i + 1 : j + 1])) + rota_ids[j + 1 :]
+MODOS_BUSCA_LOCAL = ("melhor", "primeira")
 
+# folga para o erro de arredondamento das cargas atualizadas incrementalmente
+TOLERANCIA_PESO = 1e-6
 
-def _busca_local_2opt(
-    rota_ids: List[str],
-    matriz: List[List[float]],
-    entregas_map: Dict[str, Entrega],
-    deposito: int,
-) -> Tuple[List[str], float]:
+
+# a partir deste tamanho de rota o 2-opt so testa movimentos sugeridos pelas listas de vizinhos
+_ROTA_LONGA_2OPT = 40
+
+
+def _inverter_trecho(caminho: List[int], rota: List[int], i: int, j: int) -> None:
+    """
+    Aplica o movimento 2-opt (i, j) aceito: troca as arestas (caminho[i], caminho[i+1]) e
+    (caminho[j], caminho[j+1]) invertendo as paradas i..j-1 da rota (i+1..j do caminho).
+    """
+    caminho[i + 1 : j + 1] = caminho[i + 1 : j + 1][::-1]
+    rota[i:j] = rota[i:j][::-1]
+
+
+def busca_local_2opt(rota: List[int], inst: Instancia, modo: str = "melhor") -> Tuple[List[int], float]:
     """
-    Melhor vizinho com 2-opt dentro de uma rota (mantem veiculo/capacidade).
+    2-opt dentro de uma rota (mantem veiculo/capacidade).
+    Cada movimento e avaliado pelas quatro arestas afetadas (O(1), matriz simetrica)
+    e o trecho so e invertido quando o movimento e aceito.
+    modo="melhor" aplica o melhor movimento de cada passada; modo="primeira" aplica o primeiro que melhora.
     Retorna rota refinada e custo.
     """
-    melhor_rota = rota_ids[:]
-    melhor_custo = _avaliar_rota_ids(melhor_rota, matriz, entregas_map, deposito)
-    n = len(melhor_rota)
+    rota = rota[:]
+    n = len(rota)
     if n < 3:
-        return melhor_rota, melhor_custo
+        return rota, avaliar_rota(rota, inst)
+    if inst.vizinhos and n > _ROTA_LONGA_2OPT:
+        return _busca_local_2opt_vizinhos(rota, inst, modo)
+
+    matriz = inst.matriz
+    deposito = inst.deposito
+    # caminho[k] e o indice na matriz da parada k, com o deposito nas duas pontas
+    caminho = [deposito] + [inst.pontos[e] for e in rota] + [deposito]
+    primeira = modo == "primeira"
 
     while True:
-        melhor_iter = None
-        custo_iter = melhor_custo
-        for i in range(0, n - 2):
-            for j in range(i + 2, n):
-                candidata = _movimento_2opt_ids(melhor_rota, i, j)
-                custo = _avaliar_rota_ids(candidata, matriz, entregas_map, deposito)
-                if custo < custo_iter:
-                    melhor_iter = candidata
-                    custo_iter = custo
-        if melhor_iter is None:
+        melhor_delta = -1e-9
+        melhor_mov = None
+        for i in range(0, n - 1):
+            a, b = caminho[i], caminho[i + 1]
+            linha_a, linha_b = matriz[a], matriz[b]
+            d_ab = linha_a[b]
+            for j in range(i + 2, n + 1):
+                c, d = caminho[j], caminho[j + 1]
+                # troca arestas (a,b) e (c,d) por (a,c) e (b,d)
+                delta = linha_a[c] + linha_b[d] - d_ab - matriz[c][d]
+                if delta < melhor_delta:
+                    melhor_delta = delta
+                    melhor_mov = (i, j)
+                    if primeira:
+                        break
+            if primeira and melhor_mov is not None:
+                break
+        if melhor_mov is None:
             break
-        melhor_rota = melhor_iter
-        melhor_custo = custo_iter
-    return melhor_rota, melhor_custo
+        i, j = melhor_mov
+        _inverter_trecho(caminho, rota, i, j)
 
+    return rota, _distancia_rota(caminho[1:-1], matriz, deposito)
 
-def _aplicar_busca_local_por_rota(
-    solucao: Dict[str, List[str]],
-    matriz: List[List[float]],
-    entregas_map: Dict[str, Entrega],
-    deposito: int,
-) -> Dict[str, List[str]]:
+
+def _busca_local_2opt_vizinhos(rota: List[int], inst: Instancia, modo: str = "melhor") -> Tuple[List[int], float]:
+    """
+    2-opt para rotas longas, O(n * k) por passada: so testa movimentos em que uma das arestas novas,
+    (a,c) ou (b,d), liga uma entrega a um de seus vizinhos em `inst.vizinhos` da mesma rota.
+    Mesma avaliacao por delta e mesmos modos de `busca_local_2opt`.
+    """
+    n = len(rota)
+    matriz = inst.matriz
+    deposito = inst.deposito
+    vizinhos = inst.vizinhos
+    caminho = [deposito] + [inst.pontos[e] for e in rota] + [deposito]
+    # posicao no caminho (1..n) de cada entrega da rota
+    posicao = {e: k + 1 for k, e in enumerate(rota)}
+    primeira = modo == "primeira"
+
+    while True:
+        melhor_delta = -1e-9
+        melhor_mov = None
+        for e, p in posicao.items():
+            for o in vizinhos[e]:
+                q = posicao.get(o)
+                if q is None:
+                    continue
+                p1, q1 = (p, q) if p < q else (q, p)
+                if q1 - p1 < 2:
+                    continue
+                # aresta nova (a,c) com a, c = caminho[p1], caminho[q1]; ou (b,d) com b, d = caminho[p1], caminho[q1]
+                for i, j in ((p1, q1), (p1 - 1, q1 - 1)):
+                    if j - i < 2 or (i == 0 and j == n):
+                        continue
+                    a, b, c, d = caminho[i], caminho[i + 1], caminho[j], caminho[j + 1]
+                    delta = matriz[a][c] + matriz[b][d] - matriz[a][b] - matriz[c][d]
+                    if delta < melhor_delta:
+                        melhor_delta = delta
+                        melhor_mov = (i, j)
+                if primeira and melhor_mov is not None:
+                    break
+            if primeira and melhor_mov is not None:
+                break
+        if melhor_mov is None:
+            break
+        i, j = melhor_mov
+        _inverter_trecho(caminho, rota, i, j)
+        for k in range(i, j):
+            posicao[rota[k]] = k + 1
+
+    return rota, _distancia_rota(caminho[1:-1], matriz, deposito)
+
+
+def _aplicar_busca_local_por_rota(solucao: Cromossomo, inst: Instancia, modo: str = "melhor") -> Cromossomo:
     """
     Refina a ordem interna das rotas com 2-opt (nao altera atribuicao de veiculo).
+    Altera `solucao` no lugar e a retorna.
     """
-    ajustada = {vid: rotas[:] for vid, rotas in solucao.items()}
-    for vid, rota_ids in ajustada.items():
-        if len(rota_ids) < 3:
+    for v, rota in enumerate(solucao.rotas):
+        if len(rota) < 3:
             continue
-        melhor, _ = _busca_local_2opt(rota_ids, matriz, entregas_map, deposito)
-        ajustada[vid] = melhor
-    return ajustada
+        solucao.rotas[v], _ = busca_local_2opt(rota, inst, modo)
+        solucao.reindexar(v)
+    return solucao
 
 
-def _fitness(
-    solucao: Dict[str, List[str]],
-    matriz: List[List[float]],
-    entregas_map: Dict[str, Entrega],
-    veiculos_map: Dict[str, Veiculo],
-    deposito: int,
+def _busca_local_entre_rotas(solucao: Cromossomo, inst: Instancia) -> Cromossomo:
+    """
+    Busca local entre rotas de veiculos diferentes (primeira melhoria) com os movimentos:
+    - Or-opt: move um trecho de 1 a 3 entregas (1 = relocate) para antes/depois de um vizinho;
+    - swap: troca uma entrega com um vizinho de outra rota;
+    - 2-opt*: troca os finais de duas rotas, ligando a entrega ao vizinho.
+    Cada entrega so e combinada com seus vizinhos em `inst.vizinhos` (O(k) por entrega) e so volta
+    a ser examinada quando sua rota muda (fila de entregas ativas).
+    Respeita capacidade e tipo de carga. Altera `solucao` no lugar e a retorna.
+    """
+    matriz, deposito = inst.matriz, inst.deposito
+    pontos, pesos, limites, mascaras = inst.pontos, inst.pesos, inst.limites, inst.mascaras
+    tipos_veiculo, vizinhos = inst.tipos_veiculo, inst.vizinhos
+    rotas, veiculo_de, posicao_de, cargas = solucao.rotas, solucao.veiculo_de, solucao.posicao_de, solucao.cargas
+    if not vizinhos or len(rotas) < 2:
+        return solucao
+    limites_folga = [limite + TOLERANCIA_PESO for limite in limites]
+
+    def prefixo_cargas(rota: List[int]) -> List[float]:
+        prefixo = [0.0]
+        for e in rota:
+            prefixo.append(prefixo[-1] + pesos[e])
+        return prefixo
+
+    # prefixos[v][i] = carga das i primeiras entregas da rota v (para o 2-opt* em O(1))
+    prefixos = [prefixo_cargas(rota) for rota in rotas]
+
+    def atualizar(*veics: int) -> None:
+        for v in veics:
+            solucao.reindexar(v)
+            prefixos[v] = prefixo_cargas(rotas[v])
+            cargas[v] = prefixos[v][-1]
+
+    def melhorar(u: int) -> Tuple[int, int]:
+        """Aplica o primeiro movimento que melhora envolvendo `u`; retorna os veiculos alterados."""
+        a_v = veiculo_de[u]
+        i = posicao_de[u]
+        rota_a = rotas[a_v]
+        tam_a = len(rota_a)
+        pref_a = prefixos[a_v]
+        pt_u = pontos[u]
+        p_u = pontos[rota_a[i - 1]] if i > 0 else deposito
+        n_u = pontos[rota_a[i + 1]] if i + 1 < tam_a else deposito
+        linha_u, linha_pu = matriz[pt_u], matriz[p_u]
+
+        # trechos a partir de u para o Or-opt: (tamanho, mascara comum, peso, ponto final, ganho da remocao)
+        trechos = []
+        mascara = -1
+        for tam in (1, 2, 3):
+            if i + tam > tam_a:
+                break
+            fim = pontos[rota_a[i + tam - 1]]
+            depois = pontos[rota_a[i + tam]] if i + tam < tam_a else deposito
+            mascara &= mascaras[rota_a[i + tam - 1]]
+            ganho = linha_pu[pt_u] + matriz[fim][depois] - linha_pu[depois]
+            trechos.append((tam, mascara, pref_a[i + tam] - pref_a[i], fim, ganho))
+
+        for viz in vizinhos[u]:
+            b_v = veiculo_de[viz]
+            if b_v == a_v:
+                continue
+            j = posicao_de[viz]
+            rota_b = rotas[b_v]
+            pt_v = pontos[viz]
+            p_v = pontos[rota_b[j - 1]] if j > 0 else deposito
+            n_v = pontos[rota_b[j + 1]] if j + 1 < len(rota_b) else deposito
+            linha_v = matriz[pt_v]
+            livre_b = limites_folga[b_v] - cargas[b_v]
+
+            # Or-opt / relocate: trecho rota_a[i:i+tam] vai para depois ou antes de `viz`
+            for tam, mascara, peso_trecho, fim, ganho in trechos:
+                if not (mascara >> b_v) & 1 or peso_trecho > livre_b:
+                    break
+                linha_fim = matriz[fim]
+                if linha_v[pt_u] + linha_fim[n_v] - linha_v[n_v] - ganho < -1e-9:
+                    pos = j + 1
+                elif matriz[p_v][pt_u] + linha_fim[pt_v] - matriz[p_v][pt_v] - ganho < -1e-9:
+                    pos = j
+                else:
+                    continue
+                rota_b[pos:pos] = rota_a[i : i + tam]
+                del rota_a[i : i + tam]
+                atualizar(a_v, b_v)
+                return a_v, b_v
+
+            # swap: u ocupa o lugar de `viz` e vice-versa
+            if (mascaras[u] >> b_v) & 1 and (mascaras[viz] >> a_v) & 1:
+                dif = pesos[viz] - pesos[u]
+                if cargas[a_v] + dif <= limites_folga[a_v] and cargas[b_v] - dif <= limites_folga[b_v]:
+                    delta = (
+                        linha_pu[pt_v] + linha_v[n_u] - linha_pu[pt_u] - linha_u[n_u]
+                        + matriz[p_v][pt_u] + linha_u[n_v] - matriz[p_v][pt_v] - linha_v[n_v]
+                    )
+                    if delta < -1e-9:
+                        rota_a[i], rota_b[j] = viz, u
+                        atualizar(a_v, b_v)
+                        return a_v, b_v
+
+            # 2-opt*: A' = A[:i+1] + B[j:], B' = B[:j] + A[i+1:] (cria a aresta u -> viz)
+            if tipos_veiculo[a_v] == tipos_veiculo[b_v]:
+                pref_b = prefixos[b_v]
+                carga_a = pref_a[i + 1] + cargas[b_v] - pref_b[j]
+                carga_b = pref_b[j] + cargas[a_v] - pref_a[i + 1]
+                if carga_a <= limites_folga[a_v] and carga_b <= limites_folga[b_v]:
+                    delta = linha_u[pt_v] + matriz[p_v][n_u] - linha_u[n_u] - matriz[p_v][pt_v]
+                    if delta < -1e-9:
+                        cauda_a = rota_a[i + 1 :]
+                        del rota_a[i + 1 :]
+                        rota_a.extend(rota_b[j:])
+                        del rota_b[j:]
+                        rota_b.extend(cauda_a)
+                        atualizar(a_v, b_v)
+                        return a_v, b_v
+        return -1, -1
+
+    fila = list(range(len(inst.entregas)))
+    random.shuffle(fila)
+    ativa = [True] * len(fila)
+    while fila:
+        u = fila.pop()
+        ativa[u] = False
+        a_v, b_v = melhorar(u)
+        if a_v < 0:
+            continue
+        # reativa as entregas das duas rotas alteradas
+        for e in rotas[a_v] + rotas[b_v]:
+            if not ativa[e]:
+                ativa[e] = True
+                fila.append(e)
+    return solucao
+
+
+def calcular_fitness(
+    solucao: Cromossomo,
+    inst: Instancia,
     penalidade_peso: float = 10_000.0,
     penalidade_tipo: float = 1_000_000.0,
 ) -> float:
     custo = 0.0
-    for vid, rota_ids in solucao.items():
-        veic = veiculos_map[vid]
-        rota_indices = [entregas_map[eid].indice_matriz for eid in rota_ids]
-        custo += _distancia_rota(rota_indices, matriz, deposito)
-
-        peso = _peso_rota(rota_ids, entregas_map)
-        if peso > veic.limite_peso:
-            custo += (peso - veic.limite_peso) * penalidade_peso
-
-        for entrega_id in rota_ids:
-            entrega = entregas_map[entrega_id]
-            if entrega.tipo_carga == 2 and veic.tipo_carga != 2:
+    tipos = inst.tipos
+    for v, rota in enumerate(solucao.rotas):
+        if not rota:
+            continue
+        custo += avaliar_rota(rota, inst)
+
+        limite = inst.limites[v]
+        peso = solucao.cargas[v]
+        if peso > limite + TOLERANCIA_PESO:
+            custo += (peso - limite) * penalidade_peso
+
+        tipo_veiculo = inst.tipos_veiculo[v]
+        for e in rota:
+            if tipos[e] == 2 and tipo_veiculo != 2:
                 custo += penalidade_tipo
-            if veic.tipo_carga == 2 and entrega.tipo_carga != 2:
+            if tipo_veiculo == 2 and tipos[e] != 2:
                 custo += penalidade_tipo
     return custo
 
 
+def _selecao_torneio(custos: List[float], tamanho_torneio: int) -> int:
+    """Retorna a posicao do vencedor de um torneio consultando a tabela de fitness da geracao."""
+    candidatos = random.sample(range(len(custos)), tamanho_torneio)
+    return min(candidatos, key=custos.__getitem__)
+
+
+@dataclass(frozen=True)
+class _ParametrosGA:
+    taxa_mutacao: float
+    tamanho_torneio: int
+    usar_busca_local: bool
+    modo_busca_local: str
+    elitismo: int = 0  # quantos melhores individuos passam intactos para a proxima geracao
+    usar_busca_entre_rotas: bool = False
+
+
+def _refinar(solucao: Cromossomo, inst: Instancia, params: _ParametrosGA) -> Cromossomo:
+    """Etapas opcionais de melhoria aplicadas a cada novo individuo."""
+    if params.usar_busca_entre_rotas:
+        solucao = _busca_local_entre_rotas(solucao, inst)
+    if params.usar_busca_local:
+        solucao = _aplicar_busca_local_por_rota(solucao, inst, params.modo_busca_local)
+    return solucao
+
+
+def _populacao_inicial(
+    inst: Instancia,
+    tamanho_populacao: int,
+    params: _ParametrosGA,
+    sementes: Sequence[List[List[int]]] = (),
+) -> Tuple[List[Cromossomo], List[float]]:
+    """As `sementes` (rotas por veiculo das heuristicas construtivas) entram primeiro; o resto e aleatorio."""
+    populacao = []
+    for rotas in sementes[:tamanho_populacao]:
+        populacao.append(_refinar(Cromossomo([r[:] for r in rotas], inst), inst, params))
+    for _ in range(tamanho_populacao - len(populacao)):
+        populacao.append(_refinar(criar_solucao_inicial(inst), inst, params))
+    # tabela de fitness da geracao: custos[k] e o fitness de populacao[k], calculado uma unica vez
+    # e compartilhado por torneio e rastreio da melhor solucao
+    return populacao, [calcular_fitness(sol, inst) for sol in populacao]
+
+
+def _melhor_da_populacao(populacao: List[Cromossomo], custos: List[float]) -> Tuple[Optional[Cromossomo], float]:
+    melhor_solucao = None
+    melhor_custo = float("inf")
+    for sol, custo in zip(populacao, custos):
+        if custo < melhor_custo:
+            melhor_custo = custo
+            melhor_solucao = sol
+    return melhor_solucao, melhor_custo
+
+
+CRITERIOS_PARADA = ("geracoes", "sem_melhoria", "melhoria_minima", "tempo_limite")
+
+
+@dataclass
+class CriterioParada:
+    """
+    Regras opcionais de parada antecipada (None desativa a regra):
+    - paciencia: geracoes seguidas sem melhorar o melhor custo ("sem_melhoria");
+    - melhoria_minima: melhoria relativa abaixo da qual a geracao nao conta como progresso;
+      se nenhuma melhoria relevante ocorrer em `paciencia` geracoes (10 se omitida), para ("melhoria_minima");
+    - prazo: instante (time.time()) limite para a execucao ("tempo_limite").
+    """
+    paciencia: Optional[int] = None
+    melhoria_minima: Optional[float] = None
+    prazo: Optional[float] = None
+    _ultimo_custo: float = field(default=float("inf"), init=False)
+    _custo_referencia: float = field(default=float("inf"), init=False)
+    _sem_melhoria: int = field(default=0, init=False)
+    _sem_melhoria_relevante: int = field(default=0, init=False)
+
+    def esgotou_tempo(self) -> bool:
+        return self.prazo is not None and time.time() >= self.prazo
+
+    def atualizar(self, melhor_custo: float, geracoes: int = 1) -> Optional[str]:
+        """Registra o melhor custo apos `geracoes` geracoes; retorna a regra que encerra a execucao, se houver."""
+        if melhor_custo < self._ultimo_custo:
+            self._ultimo_custo = melhor_custo
+            self._sem_melhoria = 0
+        else:
+            self._sem_melhoria += geracoes
+
+        if self.melhoria_minima is not None:
+            referencia = self._custo_referencia
+            if math.isinf(referencia) or referencia - melhor_custo >= self.melhoria_minima * abs(referencia):
+                self._custo_referencia = melhor_custo
+                self._sem_melhoria_relevante = 0
+            else:
+                self._sem_melhoria_relevante += geracoes
+
+        if self.esgotou_tempo():
+            return "tempo_limite"
+        if self.paciencia is not None and self._sem_melhoria >= self.paciencia:
+            return "sem_melhoria"
+        if self.melhoria_minima is not None and self._sem_melhoria_relevante >= (self.paciencia or 10):
+            return "melhoria_minima"
+        return None
+
+
+@dataclass
+class _ResultadoEvolucao:
+    populacao: List[Cromossomo]
+    custos: List[float]
+    melhor: Optional[Cromossomo]
+    melhor_custo: float
+    geracoes: int  # geracoes completas executadas
+    criterio_parada: str
+
+
+def _evoluir(
+    populacao: List[Cromossomo],
+    custos: List[float],
+    inst: Instancia,
+    geracoes: int,
+    params: _ParametrosGA,
+    parada: Optional[CriterioParada] = None,
+    ao_progresso: Optional[Callable[[int, float], None]] = None,
+) -> _ResultadoEvolucao:
+    """
+    Executa ate `geracoes` geracoes sobre a populacao, parando antes se `parada` mandar.
+    `ao_progresso(geracoes_executadas, melhor_custo)` e chamado ao fim de cada geracao.
+    Retorna a populacao final, sua tabela de fitness e a melhor solucao vista no caminho.
+    """
+    tamanho_populacao = len(populacao)
+    n_elite = max(0, min(params.elitismo, tamanho_populacao - 1))
+    melhor_solucao, melhor_custo = _melhor_da_populacao(populacao, custos)
+    parada = parada or CriterioParada()
+    criterio = parada.atualizar(melhor_custo, 0)
+    executadas = 0
+
+    while criterio is None and executadas < geracoes:
+        # elite: os melhores seguem sem alteracao e com o fitness ja conhecido (nao sao reavaliados)
+        elite = heapq.nsmallest(n_elite, range(tamanho_populacao), key=custos.__getitem__)
+        nova_populacao = [populacao[k] for k in elite]
+        novos_custos = [custos[k] for k in elite]
+        while len(nova_populacao) < tamanho_populacao:
+            if parada.esgotou_tempo():
+                criterio = "tempo_limite"
+                break
+            pai = populacao[_selecao_torneio(custos, params.tamanho_torneio)]
+            mae = populacao[_selecao_torneio(custos, params.tamanho_torneio)]
+
+            filho = _crossover(pai, mae, inst)
+            filho = _refinar(_mutacao(filho, inst, params.taxa_mutacao), inst, params)
+            custo_filho = calcular_fitness(filho, inst)
+
+            nova_populacao.append(filho)
+            novos_custos.append(custo_filho)
+            if custo_filho < melhor_custo:
+                melhor_custo = custo_filho
+                melhor_solucao = filho
+
+        if criterio is not None:
+            # geracao interrompida pelo prazo: mantem a populacao anterior (a melhor ja foi registrada)
+            break
+        populacao = nova_populacao
+        custos = novos_custos
+        executadas += 1
+        criterio = parada.atualizar(melhor_custo)
+        if ao_progresso is not None:
+            ao_progresso(executadas, melhor_custo)
+
+    return _ResultadoEvolucao(
+        populacao, custos, melhor_solucao, melhor_custo, executadas, criterio or "geracoes"
+    )
+
+
+# -----------------------------
+# Modelo de ilhas (processos paralelos)
+# -----------------------------
+# Cada ilha evolui uma subpopulacao em um processo do pool por `intervalo_migracao`
+# geracoes (uma epoca). Entre epocas, o processo principal faz a migracao em anel:
+# os melhores individuos da ilha k-1 substituem os piores da ilha k.
+# Entre processos trafegam apenas as rotas (listas de int) e os custos; a instancia
+# e enviada uma unica vez para cada processo pelo inicializador do pool.
+EstadoIlha = Tuple[List[List[List[int]]], List[float]]
+
+_INSTANCIA_ILHA: Optional[Instancia] = None
+
+
+def _inicializar_processo_ilha(inst: Instancia) -> None:
+    global _INSTANCIA_ILHA
+    _INSTANCIA_ILHA = inst
+
+
+def _executar_epoca(
+    inst: Instancia,
+    estado: Optional[EstadoIlha],
+    tamanho_populacao: int,
+    geracoes: int,
+    semente: int,
+    params: _ParametrosGA,
+    prazo: Optional[float] = None,
+    sementes: Sequence[List[List[int]]] = (),
+) -> Tuple[EstadoIlha, Optional[List[List[int]]], float, int, float]:
+    """
+    Evolui uma ilha por uma epoca (ou ate o `prazo`). Sem `estado`, cria a populacao inicial da ilha
+    (a partir das `sementes` construtivas, se houver).
+    Retorna o novo estado, a melhor solucao da epoca, seu custo, as geracoes executadas e o melhor custo
+    da populacao no inicio da epoca.
+    """
+    random.seed(semente)
+    if estado is None:
+        populacao, custos = _populacao_inicial(inst, tamanho_populacao, params, sementes)
+    else:
+        rotas_populacao, custos = estado
+        populacao = [Cromossomo(rotas, inst) for rotas in rotas_populacao]
+
+    custo_inicial = min(custos, default=float("inf"))
+    res = _evoluir(populacao, custos, inst, geracoes, params, CriterioParada(prazo=prazo))
+    return (
+        ([sol.rotas for sol in res.populacao], res.custos),
+        res.melhor.rotas if res.melhor else None,
+        res.melhor_custo,
+        res.geracoes,
+        custo_inicial,
+    )
+
+
+def _executar_epoca_ilha(
+    estado: Optional[EstadoIlha],
+    tamanho_populacao: int,
+    geracoes: int,
+    semente: int,
+    params: _ParametrosGA,
+    prazo: Optional[float] = None,
+    sementes: Sequence[List[List[int]]] = (),
+) -> Tuple[EstadoIlha, Optional[List[List[int]]], float, int, float]:
+    """Ponto de entrada nos processos do pool (usa a instancia recebida no inicializador)."""
+    return _executar_epoca(_INSTANCIA_ILHA, estado, tamanho_populacao, geracoes, semente, params, prazo, sementes)
+
+
+def _migrar_em_anel(estados: List[EstadoIlha], migrantes: int) -> None:
+    """Copia os `migrantes` melhores de cada ilha sobre os piores da ilha seguinte (no lugar)."""
+    n_ilhas = len(estados)
+    melhores_por_ilha = []
+    for rotas_populacao, custos in estados:
+        ordem = sorted(range(len(custos)), key=custos.__getitem__)[:migrantes]
+        melhores_por_ilha.append([([r[:] for r in rotas_populacao[k]], custos[k]) for k in ordem])
+
+    for k, (rotas_populacao, custos) in enumerate(estados):
+        chegando = melhores_por_ilha[(k - 1) % n_ilhas]
+        piores = sorted(range(len(custos)), key=custos.__getitem__, reverse=True)[: len(chegando)]
+        for pos, (rotas, custo) in zip(piores, chegando):
+            rotas_populacao[pos] = rotas
+            custos[pos] = custo
+
+
+def _evoluir_ilhas(
+    inst: Instancia,
+    ilhas: int,
+    tamanho_populacao: int,
+    geracoes: int,
+    intervalo_migracao: int,
+    migrantes: int,
+    params: _ParametrosGA,
+    parada: CriterioParada,
+    sementes: Sequence[List[List[int]]] = (),
+    ao_progresso: Optional[Callable[[int, float], None]] = None,
+) -> Tuple[Optional[List[List[int]]], float, int, str]:
+    """
+    Divide a populacao total entre `ilhas` subpopulacoes evoluidas em paralelo.
+    As `sementes` construtivas sao repartidas entre as ilhas na primeira epoca.
+    As regras de parada sao avaliadas ao fim de cada epoca (o prazo tambem dentro das ilhas), quando
+    tambem e chamado `ao_progresso(geracoes_executadas, melhor_custo)`.
+    Retorna as rotas da melhor solucao encontrada, seu custo, as geracoes executadas e o criterio de parada.
+    """
+    tamanho_ilha = max(math.ceil(tamanho_populacao / ilhas), params.tamanho_torneio, 8)
+    migrantes = max(0, min(migrantes, tamanho_ilha - 1))
+    estados: List[Optional[EstadoIlha]] = [None] * ilhas
+    melhor_rotas = None
+    melhor_custo = float("inf")
+    executadas = 0
+    criterio = None
+
+    def rodar_epocas(executar):
+        nonlocal melhor_rotas, melhor_custo, executadas, criterio
+        primeira_epoca = True
+        while primeira_epoca or (criterio is None and executadas < geracoes):
+            geracoes_epoca = min(intervalo_migracao, geracoes - executadas)
+            resultados = executar(
+                [
+                    (
+                        estados[k],
+                        tamanho_ilha,
+                        geracoes_epoca,
+                        random.randrange(2**32),
+                        params,
+                        parada.prazo,
+                        sementes[k::ilhas] if primeira_epoca else (),
+                    )
+                    for k in range(ilhas)
+                ]
+            )
+            if primeira_epoca:
+                # como em _evoluir: o custo da populacao inicial e a referencia das regras de parada,
+                # para que as geracoes da primeira epoca sem melhoria tambem contem
+                parada.atualizar(min(r[4] for r in resultados), 0)
+            for k, (estado, rotas, custo, _, _) in enumerate(resultados):
+                estados[k] = estado
+                if rotas is not None and custo < melhor_custo:
+                    melhor_rotas, melhor_custo = rotas, custo
+            executadas_epoca = max(r[3] for r in resultados)
+            executadas += executadas_epoca
+            criterio = parada.atualizar(melhor_custo, executadas_epoca)
+            primeira_epoca = False
+            if ao_progresso is not None:
+                ao_progresso(executadas, melhor_custo)
+            if criterio is None and executadas < geracoes and migrantes:
+                _migrar_em_anel(estados, migrantes)
+
+    try:
+        pool = ProcessPoolExecutor(
+            max_workers=min(ilhas, os.cpu_count() or 1),
+            mp_context=_CONTEXTO_PROCESSOS,
+            initializer=_inicializar_processo_ilha,
+            initargs=(inst,),
+        )
+    except (OSError, NotImplementedError) as e:
+        # ambiente sem suporte a processos: as ilhas rodam em sequencia no processo atual
+        print("Pool de processos indisponivel, executando ilhas em sequencia:", e)
+        rodar_epocas(lambda tarefas: [_executar_epoca(inst, *t) for t in tarefas])
+    else:
+        with pool:
+            rodar_epocas(
+                lambda tarefas: [f.result() for f in [pool.submit(_executar_epoca_ilha, *t) for t in tarefas]]
+            )
+
+    return melhor_rotas, melhor_custo, executadas, criterio or "geracoes"
+
+
+def orientar_rotas(
+    rotas: List[List[int]], inst: Instancia, matriz_distancias: MatrizDistancias, matriz_busca: MatrizDistancias
+) -> float:
+    """
+    Distancia total das rotas na matriz real. Se a busca usou a media de uma matriz assimetrica
+    (`matriz_busca` diferente de `matriz_distancias`), cada rota e invertida no lugar quando o sentido
+    contrario e mais curto.
+    """
+    distancia_total = 0.0
+    for rota in rotas:
+        caminho = [inst.pontos[e] for e in rota]
+        distancia = _distancia_rota(caminho, matriz_distancias, inst.deposito)
+        if matriz_busca is not matriz_distancias:
+            distancia_inversa = _distancia_rota(caminho[::-1], matriz_distancias, inst.deposito)
+            if distancia_inversa < distancia:
+                rota.reverse()
+                distancia = distancia_inversa
+        distancia_total += distancia
+    return distancia_total
+
+
 def encontrar_melhor_rota_genetico(
-    matriz_distancias: List[List[float]],
+    matriz_distancias: MatrizDistancias,
     entregas: List[Entrega],
     veiculos: List[Veiculo],
     deposito: int = 0,
@@ -314,68 +1515,569 @@ def encontrar_melhor_rota_genetico(
     taxa_mutacao: float = 0.12,
     tamanho_torneio: int = 3,
     usar_busca_local: bool = True,
+    modo_busca_local: str = "melhor",
+    compatibilidade: Optional[Dict[int, List[int]]] = None,
+    ilhas: int = 1,
+    intervalo_migracao: int = 5,
+    migrantes: int = 2,
+    paciencia: Optional[int] = None,
+    melhoria_minima: Optional[float] = None,
+    tempo_limite_s: Optional[float] = None,
+    elitismo: int = 2,
+    usar_busca_entre_rotas: bool = False,
+    vizinhos_k: int = 10,
+    proporcao_construtiva: float = 0.25,
+    coordenadas: Optional[Sequence[Tuple[float, float]]] = None,
+    indice_espacial: Optional[IndiceEspacial] = None,
+    ao_progresso: Optional[AoProgresso] = None,
+    plano_anterior: Optional[Dict[str, Sequence[str]]] = None,
+    linhas_densas: bool = False,
 ) -> Dict[str, object]:
     """
     Minimiza a distancia percorrida usando algoritmo genetico.
     Respeita limite de carga do veiculo e a regra de carga tipo 2 (agrotoxico).
+    `matriz_distancias` pode ser o ndarray de `gerar_matriz_distancias_numpy` (ou de um provedor de
+    distancias por estrada, possivelmente assimetrico) ou lista de listas. Matrizes assimetricas sao
+    otimizadas pela media das duas direcoes e cada rota final segue o sentido mais curto.
+    `modo_busca_local` escolhe o 2-opt "melhor" (melhor movimento) ou "primeira" (primeira melhoria, mais rapido).
+    `compatibilidade` e a tabela de `montar_tabela_compatibilidade`; se omitida, e montada aqui.
+    Com `ilhas` > 1, a populacao (`tamanho_populacao` e o total) e dividida em ilhas evoluidas em
+    processos paralelos que trocam seus `migrantes` melhores individuos a cada `intervalo_migracao` geracoes.
+    Parada antecipada (opcional): `paciencia` geracoes sem melhoria, `melhoria_minima` relativa
+    (ver `CriterioParada`) e `tempo_limite_s` segundos de execucao.
+    `elitismo` e a quantidade de melhores individuos copiados sem alteracao para a geracao seguinte.
+    `usar_busca_entre_rotas` liga a busca local entre veiculos (relocate, swap, 2-opt*, Or-opt),
+    limitada aos `vizinhos_k` vizinhos mais proximos de cada entrega.
+    `proporcao_construtiva` e a fracao da populacao inicial semeada por Clarke-Wright (e varredura em
+    torno do deposito, se `coordenadas` (lat, lng) por indice da matriz forem informadas) com variantes aleatorias.
+    Com `indice_espacial` (ou `coordenadas`, a partir das quais ele e montado), cada entrega recebe a lista
+    dos `vizinhos_k` vizinhos mais proximos, usada pelo 2-opt de rotas longas, pela busca entre rotas e
+    pelo Clarke-Wright; sem ele, as listas vem da matriz e so sao montadas para a busca entre rotas.
+    `ao_progresso`, se informado, recebe {"geracao", "geracoes", "melhor_custo"} a cada geracao
+    (a cada epoca, com ilhas); e chamado na mesma thread da otimizacao.
+    `plano_anterior` ({veiculo_id: [ids das entregas]}, ex.: o `rotas_por_veiculo` de uma execucao
+    anterior) liga a reotimizacao: entregas removidas saem, as novas entram por insercao mais barata e
+    a fracao `proporcao_construtiva` da populacao e semeada com o plano e variantes dele (no lugar das
+    heuristicas construtivas); o resultado ganha "plano_anterior": {"mantidas", "inseridas", "removidas"}.
+    `linhas_densas` troca memoria por velocidade com MatrizCondensada (ver `linhas_matriz`).
 
     Retorna:
         {
             "rotas_por_veiculo": {veiculo_id: [lista de entregas na ordem]},
             "distancia_total_km": distancia sem penalidades,
-            "custo_fitness": valor usado para ranquear (com penalidades)
+            "custo_fitness": valor usado para ranquear (com penalidades),
+            "criterio_parada": regra que encerrou a execucao (um de CRITERIOS_PARADA),
+            "geracoes_executadas": quantidade de geracoes completas
         }
     """
+    if modo_busca_local not in MODOS_BUSCA_LOCAL:
+        raise ValueError(f"modo_busca_local invalido: {modo_busca_local}. Use um de {MODOS_BUSCA_LOCAL}.")
+    if ilhas < 1:
+        raise ValueError("ilhas deve ser maior ou igual a 1.")
+    if intervalo_migracao < 1:
+        raise ValueError("intervalo_migracao deve ser maior ou igual a 1.")
+    if paciencia is not None and paciencia < 1:
+        raise ValueError("paciencia deve ser maior ou igual a 1.")
+    if melhoria_minima is not None and melhoria_minima < 0:
+        raise ValueError("melhoria_minima nao pode ser negativa.")
+    if tempo_limite_s is not None and tempo_limite_s <= 0:
+        raise ValueError("tempo_limite_s deve ser maior que zero.")
+    if elitismo < 0:
+        raise ValueError("elitismo nao pode ser negativo.")
+    if not 0 <= proporcao_construtiva <= 1:
+        raise ValueError("proporcao_construtiva deve estar entre 0 e 1.")
+
     if not entregas:
         rotas_vazias = {v.id: [] for v in veiculos}
-        return {"rotas_por_veiculo": rotas_vazias, "distancia_total_km": 0.0, "custo_fitness": 0.0}
-
-    entregas_map = {e.id: e for e in entregas}
-    veiculos_map = {v.id: v for v in veiculos}
+        return {
+            "rotas_por_veiculo": rotas_vazias,
+            "distancia_total_km": 0.0,
+            "custo_fitness": 0.0,
+            "criterio_parada": "geracoes",
+            "geracoes_executadas": 0,
+        }
 
-    populacao = []
-    for _ in range(tamanho_populacao):
-        inicial = _criar_solucao_inicial(entregas, veiculos)
-        if usar_busca_local:
-            inicial = _aplicar_busca_local_por_rota(inicial, matriz_distancias, entregas_map, deposito)
-        populacao.append(inicial)
+    parada = CriterioParada(
+        paciencia=paciencia,
+        melhoria_minima=melhoria_minima,
+        prazo=time.time() + tempo_limite_s if tempo_limite_s is not None else None,
+    )
+
+    matriz_busca = matriz_simetrica(matriz_distancias)
+    pontos = [int(e.indice_matriz) for e in entregas]
+    if indice_espacial is None and coordenadas is not None:
+        indice_espacial = IndiceEspacial(coordenadas)
+    # uma unica consulta de vizinhos serve a construcao (mais candidatos) e as buscas locais
+    k_consulta = max(vizinhos_k, VIZINHOS_ECONOMIA)
+    vizinhos = None
+    candidatos: List[List[int]] = []
+    if indice_espacial is not None:
+        candidatos = vizinhos_por_indice(indice_espacial, pontos, k_consulta)
+        vizinhos = [v[:vizinhos_k] for v in candidatos]
+    elif usar_busca_entre_rotas or (proporcao_construtiva > 0 and not plano_anterior):
+        candidatos = vizinhos_mais_proximos(matriz_busca, pontos, k_consulta)
+        if usar_busca_entre_rotas:
+            vizinhos = [v[:vizinhos_k] for v in candidatos]
+    inst = montar_instancia(
+        linhas_matriz(matriz_busca, linhas_densas), entregas, veiculos, deposito, compatibilidade, vizinhos
+    )
+    params = _ParametrosGA(
+        taxa_mutacao=taxa_mutacao,
+        tamanho_torneio=tamanho_torneio,
+        usar_busca_local=usar_busca_local,
+        modo_busca_local=modo_busca_local,
+        elitismo=elitismo,
+        usar_busca_entre_rotas=usar_busca_entre_rotas,
+    )
+    resumo_plano = None
+    if plano_anterior:
+        rotas_plano, resumo_plano = rotas_do_plano_anterior(inst, plano_anterior)
+        sementes = _sementes_do_plano(inst, rotas_plano, max(1, round(tamanho_populacao * proporcao_construtiva)))
+    else:
+        sementes = sementes_construtivas(
+            inst, matriz_busca, round(tamanho_populacao * proporcao_construtiva), candidatos, coordenadas
+        )
+
+    reportar = None
+    if ao_progresso is not None:
+        def reportar(executadas: int, custo: float) -> None:
+            ao_progresso({"geracao": executadas, "geracoes": geracoes, "melhor_custo": float(custo)})
+
+    if ilhas > 1:
+        melhor_rotas, melhor_custo, executadas, criterio = _evoluir_ilhas(
+            inst, ilhas, tamanho_populacao, geracoes, intervalo_migracao, migrantes, params, parada, sementes,
+            reportar,
+        )
+        melhor_solucao = Cromossomo(melhor_rotas, inst) if melhor_rotas is not None else None
+    else:
+        populacao, custos = _populacao_inicial(inst, tamanho_populacao, params, sementes)
+        res = _evoluir(populacao, custos, inst, geracoes, params, parada, reportar)
+        melhor_solucao, melhor_custo = res.melhor, res.melhor_custo
+        executadas, criterio = res.geracoes, res.criterio_parada
+
+    if melhor_solucao is None:
+        return {
+            "rotas_por_veiculo": {},
+            "distancia_total_km": 0.0,
+            "custo_fitness": melhor_custo,
+            "criterio_parada": criterio,
+            "geracoes_executadas": executadas,
+        }
 
-    melhor_solucao = None
-    melhor_custo = float("inf")
+    # orienta as rotas antes de decodificar (pode inverter rotas no lugar)
+    distancia_total = orientar_rotas(melhor_solucao.rotas, inst, matriz_distancias, matriz_busca)
+    resultado = {
+        "rotas_por_veiculo": decodificar(melhor_solucao, inst),
+        "distancia_total_km": distancia_total,
+        "custo_fitness": melhor_custo,
+        "criterio_parada": criterio,
+        "geracoes_executadas": executadas,
+    }
+    if resumo_plano is not None:
+        resultado["plano_anterior"] = resumo_plano
+    return resultado
 
-    for _ in range(geracoes):
-        custos = [
-            (sol, _fitness(sol, matriz_distancias, entregas_map, veiculos_map, deposito))
-            for sol in populacao
-        ]
 
-        for sol, custo in custos:
-            if custo < melhor_custo:
-                melhor_custo = custo
-                melhor_solucao = sol
+# -----------------------------
+# Decomposicao (cluster-first, route-second)
+# -----------------------------
+# Para milhares de entregas, cada tipo de carga e dividido em clusters geograficos de ate
+# `tamanho_cluster` entregas e os veiculos do tipo sao repartidos entre eles (cada veiculo
+# faz uma unica rota, entao pertence a um unico cluster). Cada cluster e otimizado pelo
+# algoritmo genetico sobre a propria matriz (pequena) e os resultados sao unidos no fim.
+MODOS_DECOMPOSICAO = ("setores", "kmeans")
+
+
+def _projetar_km(coordenadas: Sequence[Tuple[float, float]], origem: Tuple[float, float]) -> np.ndarray:
+    """Projecao equiretangular (km) em torno de `origem`; suficiente para agrupar e ordenar por angulo."""
+    pontos = np.asarray(coordenadas, dtype=np.float64).reshape(-1, 2)
+    km_por_grau = math.radians(1.0) * 6371.0
+    x = (pontos[:, 1] - origem[1]) * km_por_grau * math.cos(math.radians(origem[0]))
+    y = (pontos[:, 0] - origem[0]) * km_por_grau
+    return np.column_stack([x, y])
+
+
+def _agrupar_por_setores(xy: np.ndarray, pesos: np.ndarray, n_clusters: int) -> List[int]:
+    """Fatias angulares em torno do deposito (origem) com demanda parecida, a partir do maior vazio angular."""
+    angulos = np.arctan2(xy[:, 1], xy[:, 0])
+    ordem = np.argsort(angulos, kind="stable")
+    ordenados = angulos[ordem]
+    vazios = np.diff(np.append(ordenados, ordenados[0] + 2 * math.pi))
+    inicio = (int(np.argmax(vazios)) + 1) % len(ordem)
+    ordem = np.roll(ordem, -inicio)
+    if pesos.sum() <= 0:
+        pesos = np.ones(len(pesos))
+    acumulado = np.cumsum(pesos[ordem]) - pesos[ordem] / 2
+    fatia = np.minimum((acumulado / pesos.sum() * n_clusters).astype(int), n_clusters - 1)
+    rotulos = [0] * len(ordem)
+    for e, k in zip(ordem.tolist(), fatia.tolist()):
+        rotulos[e] = k
+    return rotulos
+
+
+def _agrupar_por_kmeans(xy: np.ndarray, n_clusters: int, iteracoes: int = 20) -> List[int]:
+    """k-means (Lloyd) com inicializacao k-means++ usando o gerador do modulo `random`."""
+    rng = np.random.default_rng(random.getrandbits(32))
+    centros = [xy[rng.integers(len(xy))]]
+    for _ in range(1, n_clusters):
+        d2 = ((xy[:, None, :] - np.asarray(centros)[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        total = d2.sum()
+        escolhido = rng.choice(len(xy), p=d2 / total) if total > 0 else rng.integers(len(xy))
+        centros.append(xy[escolhido])
+    centros = np.asarray(centros)
+    rotulos = np.zeros(len(xy), dtype=int)
+    for iteracao in range(iteracoes):
+        novos = ((xy[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        if iteracao and np.array_equal(novos, rotulos):
+            break
+        rotulos = novos
+        for k in range(n_clusters):
+            membros = xy[rotulos == k]
+            if len(membros):
+                centros[k] = membros.mean(axis=0)
+    return rotulos.tolist()
 
-        nova_populacao = []
-        while len(nova_populacao) < tamanho_populacao:
-            candidatos = random.sample(populacao, tamanho_torneio)
-            pai = min(candidatos, key=lambda s: _fitness(s, matriz_distancias, entregas_map, veiculos_map, deposito))
-            candidatos = random.sample(populacao, tamanho_torneio)
-            mae = min(candidatos, key=lambda s: _fitness(s, matriz_distancias, entregas_map, veiculos_map, deposito))
-
-            filho = _crossover(pai, mae, entregas, veiculos)
-            filho = _mutacao(filho, entregas_map, veiculos_map, taxa_mutacao)
-            if usar_busca_local:
-                filho = _aplicar_busca_local_por_rota(filho, matriz_distancias, entregas_map, deposito)
-            nova_populacao.append(filho)
 
-        populacao = nova_populacao
+def _repartir_veiculos(
+    membros: List[List[int]], pesos: List[float], veiculos: List[int], limites: List[float]
+) -> List[List[int]]:
+    """
+    Reparte os veiculos entre os clusters em proporcao a demanda (precisa haver ao menos um veiculo por
+    cluster): cada cluster recebe um veiculo e os demais, do maior para o menor, vao para o cluster com
+    a maior razao demanda / capacidade ja recebida.
+    """
+    demandas = [sum(pesos[e] for e in m) for m in membros]
+    frota: List[List[int]] = [[] for _ in membros]
+    capacidades = [0.0] * len(membros)
+    ordem_veiculos = sorted(veiculos, key=limites.__getitem__, reverse=True)
+    por_demanda = sorted(range(len(membros)), key=demandas.__getitem__, reverse=True)
+    for k, v in zip(por_demanda, ordem_veiculos):
+        frota[k].append(v)
+        capacidades[k] += limites[v]
+    for v in ordem_veiculos[len(membros):]:
+        k = max(range(len(membros)), key=lambda k: demandas[k] / max(capacidades[k], TOLERANCIA_PESO))
+        frota[k].append(v)
+        capacidades[k] += limites[v]
+    return frota
+
+
+def _rebalancear_carga(
+    membros: List[List[int]], frota: List[List[int]], xy: np.ndarray, pesos: List[float], limites: List[float]
+) -> None:
+    """
+    Leva a carga de cada cluster para a mesma taxa de ocupacao da frota inteira (demanda total /
+    capacidade total, no maximo 1), para que todo cluster fique com a folga da frota: entregas de
+    clusters acima da meta, das mais distantes do centroide para as mais proximas, vao para o cluster
+    mais proximo (pelo centroide) ainda abaixo da propria meta e com capacidade para elas.
+    Altera `membros` no lugar.
+    """
+    capacidades = [sum(limites[v] for v in f) for f in frota]
+    cargas = [sum(pesos[e] for e in m) for m in membros]
+    ocupacao = min(1.0, sum(cargas) / max(sum(capacidades), TOLERANCIA_PESO))
+    metas = [c * ocupacao for c in capacidades]
+    centros = [xy[m].mean(axis=0) if m else np.zeros(2) for m in membros]
+    for k in range(len(membros)):
+        if cargas[k] <= metas[k] + TOLERANCIA_PESO:
+            continue
+        membros[k].sort(key=lambda e: float(((xy[e] - centros[k]) ** 2).sum()), reverse=True)
+        for e in list(membros[k]):
+            if cargas[k] <= metas[k] + TOLERANCIA_PESO:
+                break
+            destinos = [
+                j for j in range(len(membros))
+                if j != k and cargas[j] < metas[j] and cargas[j] + pesos[e] <= capacidades[j] + TOLERANCIA_PESO
+            ]
+            if not destinos:
+                continue
+            j = min(destinos, key=lambda j: float(((xy[e] - centros[j]) ** 2).sum()))
+            membros[k].remove(e)
+            membros[j].append(e)
+            cargas[k] -= pesos[e]
+            cargas[j] += pesos[e]
 
-    distancia_total = 0.0
-    for vid, rota_ids in (melhor_solucao or {}).items():
-        rota_indices = [entregas_map[eid].indice_matriz for eid in rota_ids]
-        distancia_total += _distancia_rota(rota_indices, matriz_distancias, deposito)
 
+def _montar_clusters(
+    entregas: List[Entrega],
+    veiculos: List[Veiculo],
+    coordenadas: Sequence[Tuple[float, float]],
+    deposito: int,
+    modo: str,
+    tamanho_cluster: int,
+) -> List[Tuple[List[int], List[int]]]:
+    """
+    Divide as entregas (por tipo de carga) em clusters e reparte os veiculos compativeis entre eles.
+    Retorna pares (indices das entregas, indices dos veiculos).
+    """
+    tipos = [int(e.tipo_carga) for e in entregas]
+    compatibilidade = montar_tabela_compatibilidade(veiculos, tipos)
+    pesos = [float(e.peso) for e in entregas]
+    limites = [float(v.limite_peso) for v in veiculos]
+    xy = _projetar_km([coordenadas[e.indice_matriz] for e in entregas], coordenadas[deposito])
+
+    clusters = []
+    for tipo in sorted(compatibilidade):
+        do_tipo = [e for e, t in enumerate(tipos) if t == tipo]
+        frota_tipo = compatibilidade[tipo]
+        if not frota_tipo:
+            raise ValueError(f"Nenhum veiculo suporta a entrega {entregas[do_tipo[0]].id} (peso ou tipo de carga).")
+        n_clusters = min(len(frota_tipo), max(1, math.ceil(len(do_tipo) / tamanho_cluster)))
+        xy_tipo = xy[do_tipo]
+        if n_clusters == 1:
+            rotulos = [0] * len(do_tipo)
+        elif modo == "kmeans":
+            rotulos = _agrupar_por_kmeans(xy_tipo, n_clusters)
+        else:
+            rotulos = _agrupar_por_setores(xy_tipo, np.asarray([pesos[e] for e in do_tipo]), n_clusters)
+
+        membros: List[List[int]] = [[] for _ in range(n_clusters)]
+        for e, k in zip(do_tipo, rotulos):
+            membros[k].append(e)
+        membros = [m for m in membros if m]
+        frota = _repartir_veiculos(membros, pesos, frota_tipo, limites)
+        _rebalancear_carga(membros, frota, xy, pesos, limites)
+        clusters.extend((m, f) for m, f in zip(membros, frota) if m)
+    return clusters
+
+
+def _fundir_clusters(
+    clusters: List[Tuple[List[int], List[int]]],
+    resultados: List[Optional[Dict[str, object]]],
+    falhas: List[int],
+    entregas: List[Entrega],
+    coordenadas: Sequence[Tuple[float, float]],
+    deposito: int,
+) -> Tuple[List[Tuple[List[int], List[int]]], List[Optional[Dict[str, object]]], List[int]]:
+    """
+    Funde cada cluster de `falhas` (com entregas e veiculos) ao cluster mais proximo pelo centroide.
+    Retorna os novos clusters, os resultados que continuam valendo (None nos fundidos) e os indices a
+    otimizar de novo.
+    """
+    grupos = [(list(m), list(f)) for m, f in clusters]
+    validos = list(resultados)
+    xy = _projetar_km([coordenadas[e.indice_matriz] for e in entregas], coordenadas[deposito])
+    vivos = list(range(len(grupos)))
+    refazer = set()
+    for k in falhas:
+        # ja recebeu outro cluster nesta rodada: sera otimizado de novo com mais veiculos
+        if k not in vivos or k in refazer or len(vivos) == 1:
+            continue
+        centro = xy[grupos[k][0]].mean(axis=0)
+        j = min(
+            (j for j in vivos if j != k),
+            key=lambda j: float(((xy[grupos[j][0]].mean(axis=0) - centro) ** 2).sum()),
+        )
+        grupos[j][0].extend(grupos[k][0])
+        grupos[j][1].extend(grupos[k][1])
+        validos[j] = None
+        vivos.remove(k)
+        refazer.add(j)
+    novos = [grupos[k] for k in vivos]
+    return novos, [validos[k] for k in vivos], [i for i, k in enumerate(vivos) if k in refazer]
+
+
+def _executar_clusters(
+    tarefas: List[tuple], workers: int, concluir: Callable[[Dict[str, object]], None]
+) -> List[object]:
+    """
+    Roda `_otimizar_cluster` para cada tarefa (no pool de processos se `workers` > 1) e chama `concluir`
+    a cada resultado. Retorna, na ordem das tarefas, o resultado ou o ValueError levantado pelo cluster.
+    """
+    def saida(executar):
+        try:
+            res = executar()
+        except ValueError as e:
+            return e
+        concluir(res)
+        return res
+
+    workers = min(workers, len(tarefas))
+    if workers > 1:
+        try:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=_CONTEXTO_PROCESSOS)
+        except (OSError, NotImplementedError) as e:
+            print("Pool de processos indisponivel, otimizando clusters em sequencia:", e)
+        else:
+            with pool:
+                futuros = [pool.submit(_otimizar_cluster, *t) for t in tarefas]
+                saidas = {}
+                for futuro in as_completed(futuros):
+                    saidas[futuro] = saida(futuro.result)
+                return [saidas[f] for f in futuros]
+    return [saida(lambda t=t: _otimizar_cluster(*t)) for t in tarefas]
+
+
+def _otimizar_cluster(
+    coordenadas: List[Tuple[float, float]],
+    matriz: Optional[np.ndarray],
+    entregas: List[Entrega],
+    veiculos: List[Veiculo],
+    semente: int,
+    parametros: Dict[str, object],
+    provedor_distancias: Optional[object] = None,
+    motor: Optional[MotorOtimizacao] = None,
+    fonte_matriz: Optional[str] = None,
+) -> Dict[str, object]:
+    """
+    Otimiza um cluster (deposito no indice 0); executado nos processos do pool.
+    O resultado ganha "fonte_distancias": a fonte da matriz montada aqui ("haversine" se o provedor
+    falhou) ou `fonte_matriz` se a matriz veio pronta.
+    """
+    random.seed(semente)
+    fonte = fonte_matriz
+    if matriz is None and provedor_distancias is not None:
+        try:
+            matriz = provedor_distancias.matriz(coordenadas)
+            fonte = getattr(provedor_distancias, "fonte", None)
+        except Exception as e:
+            print("Provedor de distancias indisponivel no cluster, usando haversine:", e)
+    if matriz is None:
+        matriz = gerar_matriz_distancias_numpy(coordenadas)
+        fonte = "haversine"
+    motor = motor or encontrar_melhor_rota_genetico
+    resultado = motor(matriz, entregas, veiculos, deposito=0, coordenadas=coordenadas, **parametros)
+    resultado["fonte_distancias"] = fonte
+    return resultado
+
+
+def encontrar_melhor_rota_por_clusters(
+    coordenadas: Sequence[Tuple[float, float]],
+    entregas: List[Entrega],
+    veiculos: List[Veiculo],
+    deposito: int = 0,
+    modo: str = "setores",
+    tamanho_cluster: int = 150,
+    matriz_distancias: Optional[MatrizDistancias] = None,
+    processos: Optional[int] = None,
+    provedor_distancias: Optional[object] = None,
+    ao_progresso: Optional[AoProgresso] = None,
+    motor: Optional[MotorOtimizacao] = None,
+    montar_matriz: Optional[MontarMatriz] = None,
+    **parametros_ga,
+) -> Dict[str, object]:
+    """
+    Decomposicao cluster-first, route-second para conjuntos grandes de entregas.
+    As entregas de cada tipo de carga sao agrupadas em setores em torno do deposito (`modo="setores"`)
+    ou por k-means (`modo="kmeans"`), com ate `tamanho_cluster` entregas e demanda dentro da
+    capacidade dos veiculos repartidos para o cluster. Cada cluster e otimizado por
+    `encontrar_melhor_rota_genetico` (com `parametros_ga`) em `processos` paralelos, sobre uma matriz
+    montada so com seus pontos (ou recortada de `matriz_distancias`, se informada); o custo cresce
+    de forma quase linear com o numero de entregas. `provedor_distancias` (ex.: `ProvedorOSRM`, com
+    metodo `matriz(coordenadas)`) monta as matrizes dos clusters; sem ele, ou se falhar, usa Haversine.
+    `montar_matriz`, se informado, monta no processo principal a matriz de cada cluster e a fonte usada
+    (ex.: `montar_matriz_distancias` com o cache persistente, cuja conexao nao vai para o pool).
+    `tempo_limite_s`, se informado, vale para a execucao inteira e e dividido entre as rodadas do pool.
+    Um cluster sem solucao viavel (ValueError) e fundido ao cluster vizinho e otimizado de novo; se ainda
+    assim falhar, as entregas sao otimizadas todas juntas, como sem decomposicao.
+    `ao_progresso`, se informado, recebe {"clusters_concluidos", "clusters", "melhor_custo"} (soma dos
+    custos dos clusters ja concluidos) a cada cluster otimizado.
+    `motor` troca o algoritmo aplicado a cada cluster (ver `motores_otimizacao`); `parametros_ga` sao
+    entao os parametros desse motor. Deve ser uma funcao de modulo, para ser enviada aos processos.
+
+    Retorna o mesmo formato de `encontrar_melhor_rota_genetico`, somando distancias e custos dos
+    clusters, com `geracoes_executadas` do cluster que mais rodou, o `criterio_parada` mais frequente e
+    "clusters": [{"entregas", "veiculos", "distancia_km", "criterio_parada", "geracoes_executadas",
+    "fonte_distancias"}] e
+    "fonte_distancias": a fonte das matrizes usadas pelos clusters; se alguns clusters cairam para
+    Haversine, as fontes unidas por "+" (ex.: "haversine+osrm:driving"); None com `matriz_distancias`.
+    """
+    if modo not in MODOS_DECOMPOSICAO:
+        raise ValueError(f"modo de decomposicao invalido: {modo}. Use um de {MODOS_DECOMPOSICAO}.")
+    if tamanho_cluster < 1:
+        raise ValueError("tamanho_cluster deve ser maior ou igual a 1.")
+    # o paralelismo fica entre clusters; ilhas dentro de um processo do pool nao sao suportadas
+    if "ilhas" in parametros_ga:
+        parametros_ga["ilhas"] = 1
+    parametros_ga.pop("compatibilidade", None)
+
+    clusters = _montar_clusters(entregas, veiculos, coordenadas, deposito, modo, tamanho_cluster) if entregas else []
+    workers = max(1, min(processos or os.cpu_count() or 1, len(clusters) or 1))
+    if parametros_ga.get("tempo_limite_s") is not None and clusters:
+        parametros_ga["tempo_limite_s"] = parametros_ga["tempo_limite_s"] / math.ceil(len(clusters) / workers)
+
+    def tarefa(membros: List[int], frota: List[int]) -> tuple:
+        indices = [deposito] + [entregas[e].indice_matriz for e in membros]
+        sub_entregas = [
+            Entrega(id=entregas[e].id, peso=entregas[e].peso, tipo_carga=entregas[e].tipo_carga, indice_matriz=k + 1)
+            for k, e in enumerate(membros)
+        ]
+        sub_coordenadas = [coordenadas[i] for i in indices]
+        sub_matriz, fonte = None, None
+        if matriz_distancias is not None:
+            sub_matriz = _submatriz(matriz_distancias, indices)
+        elif montar_matriz is not None:
+            sub_matriz, fonte = montar_matriz(sub_coordenadas)
+        return (
+            sub_coordenadas,
+            sub_matriz,
+            sub_entregas,
+            [veiculos[v] for v in frota],
+            random.randrange(2**32),
+            parametros_ga,
+            provedor_distancias,
+            motor,
+            fonte,
+        )
+
+    custo_concluido = 0.0
+    concluidos = 0
+
+    def concluir(res: Dict[str, object]) -> None:
+        nonlocal custo_concluido, concluidos
+        custo_concluido += float(res["custo_fitness"])
+        concluidos += 1
+        if ao_progresso is not None:
+            ao_progresso({"clusters_concluidos": concluidos, "clusters": len(clusters), "melhor_custo": custo_concluido})
+
+    # clusters inviaveis (ValueError) sao fundidos com o vizinho mais proximo e otimizados de novo; se a
+    # fusao tambem falhar, todas as entregas sao otimizadas juntas (sem decomposicao)
+    resultados: List[Optional[Dict[str, object]]] = [None] * len(clusters)
+    pendentes = list(range(len(clusters)))
+    fundiu = False
+    while pendentes:
+        saidas = _executar_clusters([tarefa(*clusters[k]) for k in pendentes], workers, concluir)
+        falhas = [(k, s) for k, s in zip(pendentes, saidas) if isinstance(s, ValueError)]
+        for k, saida in zip(pendentes, saidas):
+            if not isinstance(saida, ValueError):
+                resultados[k] = saida
+        if not falhas:
+            break
+        if len(clusters) == 1:
+            raise falhas[0][1]
+        if not fundiu:
+            fundiu = True
+            print(f"{len(falhas)} cluster(s) inviavel(is), fundindo com o vizinho mais proximo:", falhas[0][1])
+            clusters, resultados, pendentes = _fundir_clusters(
+                clusters, resultados, [k for k, _ in falhas], entregas, coordenadas, deposito
+            )
+        else:
+            print("Decomposicao inviavel, otimizando todas as entregas juntas:", falhas[0][1])
+            clusters = [(list(range(len(entregas))), list(range(len(veiculos))))]
+            resultados, pendentes = [None], [0]
+        concluidos = sum(r is not None for r in resultados)
+        custo_concluido = sum(float(r["custo_fitness"]) for r in resultados if r is not None)
+
+    rotas_por_veiculo: Dict[str, List[str]] = {v.id: [] for v in veiculos}
+    resumo = []
+    for (membros, frota), res in zip(clusters, resultados):
+        rotas_por_veiculo.update(res["rotas_por_veiculo"])
+        resumo.append(
+            {
+                "entregas": len(membros),
+                "veiculos": [veiculos[v].id for v in frota],
+                "distancia_km": res["distancia_total_km"],
+                "criterio_parada": res["criterio_parada"],
+                "geracoes_executadas": res["geracoes_executadas"],
+                "fonte_distancias": res.get("fonte_distancias"),
+            }
+        )
+    criterios = [r["criterio_parada"] for r in resultados]
+    fontes = sorted({r["fonte_distancias"] for r in resultados if r.get("fonte_distancias")})
     return {
-        "rotas_por_veiculo": melhor_solucao or {},
-        "distancia_total_km": distancia_total,
-        "custo_fitness": melhor_custo,
+        "rotas_por_veiculo": rotas_por_veiculo,
+        "distancia_total_km": float(sum(r["distancia_total_km"] for r in resultados)),
+        "custo_fitness": float(sum(r["custo_fitness"] for r in resultados)),
+        "criterio_parada": max(set(criterios), key=criterios.count) if criterios else "geracoes",
+        "geracoes_executadas": max((r["geracoes_executadas"] for r in resultados), default=0),
+        "clusters": resumo,
+        "fonte_distancias": "+".join(fontes) if fontes else None,
     }
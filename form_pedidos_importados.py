@@ -1,28 +1,86 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from collections import namedtuple
 import math
 import datetime
 
 from form_otimizacao_rota import (
     Entrega,
     Veiculo,
-    encontrar_melhor_rota_genetico,
-    gerar_matriz_distancias,
+    encontrar_melhor_rota_por_clusters,
+    montar_tabela_compatibilidade,
 )
+from indice_espacial import IndiceEspacial
+from metricas_consultas import rotulo_chamador
+from motores_otimizacao import MOTOR_PADRAO, obter_motor
+from provedor_distancias import montar_matriz_distancias
 
 DEPOSITO_COORD_PADRAO = (-27.367681114267935, -53.40115242306388)
+# formatos de linha de _iterar_select
+FORMATOS_LINHA = ("dict", "tupla", "namedtuple")
+# maximo de pedidos listados para otimizacao
+LIMITE_PEDIDOS_OTIMIZACAO = 5000
+# acima desta quantidade de entregas, parametros["decomposicao"] = "auto" (padrao) otimiza por setores
+LIMIAR_DECOMPOSICAO_AUTOMATICA = 500
+# reotimizacao a partir de um plano anterior: geracoes (iteracoes, no ALNS) sem melhoria ate parar,
+# por motor, se "paciencia" nao for informada
+PACIENCIA_REOTIMIZACAO = {"genetico": 15, "alns": 300}
+
+# consultas da tela de pedidos; {where_sql} vem de _build_filtros_sql (migracoes_banco verifica os
+# indices com estas mesmas consultas)
+SELECT_LISTAGEM_PEDIDOS = """
+    SELECT
+        p.n_nota,
+        p.dt_nota,
+        p.id_cliente,
+        c.nome_cliente,
+        ec.cidade,
+        ec.bairro,
+        ec.endereco,
+        ec.numero,
+        ec.coordenadas,
+        ec.latitude,
+        ec.longitude,
+        EXISTS (SELECT 1 FROM ENTREGA e WHERE e.pedido_n_nota = p.n_nota) AS entregues
+    FROM PEDIDO p
+    LEFT JOIN CLIENTE c ON c.id_cliente = p.id_cliente
+    LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
+    {where_sql}
+    ORDER BY p.dt_nota DESC NULLS LAST, p.n_nota DESC
+    LIMIT %s OFFSET %s
+"""
+SELECT_CONTAGEM_PEDIDOS = """
+    SELECT COUNT(*) AS total
+    FROM PEDIDO p
+    LEFT JOIN CLIENTE c ON c.id_cliente = p.id_cliente
+    LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
+    {where_sql}
+"""
+
+
+def _param_opcional(params: Dict[str, Any], chave: str, tipo):
+    """Converte um parametro opcional do algoritmo; ausente, nulo ou vazio vira None."""
+    valor = params.get(chave)
+    if valor is None or valor == "":
+        return None
+    return tipo(valor)
 
 
 class ServicoPedidosImportados:
-    def __init__(self, banco_dados=None, por_pagina: int = 99999):
+    def __init__(self, banco_dados=None, por_pagina: int = 99999, provedor_distancias=None):
         self.banco = banco_dados
         self.por_pagina = por_pagina
+        # provedor de distancias por estrada (ex.: ProvedorOSRM); None = linha reta (haversine)
+        self.provedor_distancias = provedor_distancias
 
     # -----------------------------------------------------
     # EXECUTOR DE SELECT 100% COMPATÍVEL COM SEU BancoDados
     # -----------------------------------------------------
-    def _execute_select(self, query: str, params: Optional[Tuple] = None) -> List[Dict[str, Any]]:
+    def _execute_select(
+        self, query: str, params: Optional[Tuple] = None, rotulo: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """`rotulo` identifica a consulta nas metricas do banco (padrao: "modulo.funcao" de quem chamou)."""
         try:
-            with self.banco.obter_cursor() as (conn, cursor):
+            with self.banco.obter_cursor(rotulo or rotulo_chamador()) as (conn, cursor):
                 cursor.execute(query, params or ())
                 cols = [desc[0] for desc in cursor.description]
                 rows = cursor.fetchall()
@@ -33,6 +91,45 @@ class ServicoPedidosImportados:
             print("Params:", params)
             return []
 
+    def _iterar_select(
+        self,
+        query: str,
+        params: Optional[Tuple] = None,
+        itersize: int = 2000,
+        formato: str = "dict",
+        rotulo: Optional[str] = None,
+    ) -> Iterator[Any]:
+        """
+        Versao em fluxo de _execute_select para resultados grandes: usa um cursor nomeado (server-side) e
+        entrega as linhas conforme chegam, em lotes de `itersize`, com memoria constante.
+        `formato`: "dict" (como _execute_select), "tupla" (linha crua, sem criar dict) ou "namedtuple"
+        (acesso por atributo). A conexao fica presa ate o gerador terminar ou ser fechado.
+        Em caso de erro, registra e relanca a excecao: uma falha no meio do fluxo nao pode parecer o fim
+        normal do resultado. `rotulo` como em _execute_select (padrao: quem consome o gerador).
+        """
+        if formato not in FORMATOS_LINHA:
+            raise ValueError(f"formato invalido: {formato}. Use um de {FORMATOS_LINHA}.")
+        try:
+            with self.banco.obter_cursor_servidor(itersize, rotulo or rotulo_chamador()) as (conn, cursor):
+                cursor.execute(query, params or ())
+                converter = None
+                for row in cursor:
+                    if converter is None:
+                        cols = [desc[0] for desc in cursor.description]
+                        if formato == "dict":
+                            converter = lambda r: dict(zip(cols, r))
+                        elif formato == "namedtuple":
+                            Linha = namedtuple("Linha", cols, rename=True)
+                            converter = Linha._make
+                        else:
+                            converter = tuple
+                    yield converter(row)
+        except Exception as e:
+            print("Erro no SELECT em fluxo:", e)
+            print("Query:", query)
+            print("Params:", params)
+            raise
+
     # -----------------------------------------------------
     # Lista de clientes para filtro
     # -----------------------------------------------------
@@ -52,7 +149,7 @@ class ServicoPedidosImportados:
             SELECT COUNT(*) AS total
             FROM PEDIDO p
             LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
-            WHERE ec.coordenadas IS NOT NULL AND ec.coordenadas <> '';
+            WHERE ec.latitude IS NOT NULL;
         """
         rows = self._execute_select(query)
         return rows[0]["total"] if rows else 0
@@ -62,7 +159,7 @@ class ServicoPedidosImportados:
             SELECT COUNT(*) AS total
             FROM PEDIDO p
             LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
-            WHERE ec.coordenadas IS NULL OR ec.coordenadas = '';
+            WHERE ec.latitude IS NULL;
         """
         rows = self._execute_select(query)
         return rows[0]["total"] if rows else 0
@@ -106,10 +203,10 @@ class ServicoPedidosImportados:
             params.append(filtros["data_fim"])
 
         if filtros.get("coords_not_null"):
-            where_parts.append("ec.coordenadas IS NOT NULL AND ec.coordenadas <> ''")
+            where_parts.append("ec.latitude IS NOT NULL")
 
         if filtros.get("coords_null"):
-            where_parts.append("ec.coordenadas IS NULL OR ec.coordenadas = ''")
+            where_parts.append("ec.latitude IS NULL")
 
         if filtros.get("entregues"):
             where_parts.append(
@@ -163,8 +260,8 @@ class ServicoPedidosImportados:
             f"{row.get('cidade') or ''}"
         ).strip(" ,")
 
-        coordenadas = row.get("coordenadas")
-        tem_coords = coordenadas is not None and str(coordenadas).strip() != ""
+        lat, lng = row.get("latitude"), row.get("longitude")
+        tem_coords = lat is not None and lng is not None
         entregou = bool(row.get("entregues"))
 
         # PADRÃO: usar ENTREGUE (singular) para consistência com o mapa
@@ -182,6 +279,12 @@ class ServicoPedidosImportados:
             "endereco": endereco or "-",
             "data_nota": format_data(row.get("dt_nota")),
             "status": status,
+            # coordenadas numericas (as que o otimizador usa); a string antiga so aparece, como
+            # "coordenadas_legado", quando ela nao pode ser convertida em latitude/longitude
+            "latitude": lat,
+            "longitude": lng,
+            "coordenadas": f"{lat:.6f},{lng:.6f}" if tem_coords else None,
+            "coordenadas_legado": None if tem_coords else (row.get("coordenadas") or None),
             "_orig": row,
         }
 
@@ -190,13 +293,7 @@ class ServicoPedidosImportados:
     # -----------------------------------------------------
     def contar_pedidos(self, filtros: Optional[Dict[str, Any]] = None) -> int:
         where_sql, params = self._build_filtros_sql(filtros)
-        query = f"""
-            SELECT COUNT(*) AS total
-            FROM PEDIDO p
-            LEFT JOIN CLIENTE c ON c.id_cliente = p.id_cliente
-            LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
-            {where_sql};
-        """
+        query = SELECT_CONTAGEM_PEDIDOS.format(where_sql=where_sql)
 
         rows = self._execute_select(query, tuple(params))
         return int(rows[0]["total"]) if rows else 0
@@ -213,25 +310,7 @@ class ServicoPedidosImportados:
         itens_por_pagina = filtros.get("itens_por_pagina", self.por_pagina)
         offset = (pagina - 1) * itens_por_pagina
 
-        query = f"""
-            SELECT
-                p.n_nota,
-                p.dt_nota,
-                p.id_cliente,
-                c.nome_cliente,
-                ec.cidade,
-                ec.bairro,
-                ec.endereco,
-                ec.numero,
-                ec.coordenadas,
-                EXISTS (SELECT 1 FROM ENTREGA e WHERE e.pedido_n_nota = p.n_nota) AS entregues
-            FROM PEDIDO p
-            LEFT JOIN CLIENTE c ON c.id_cliente = p.id_cliente
-            LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
-            {where_sql}
-            ORDER BY p.dt_nota DESC NULLS LAST, p.n_nota DESC
-            LIMIT %s OFFSET %s;
-        """
+        query = SELECT_LISTAGEM_PEDIDOS.format(where_sql=where_sql)
 
         params = (params or []) + [itens_por_pagina, offset]
         rows = self._execute_select(query, tuple(params))
@@ -263,6 +342,8 @@ class ServicoPedidosImportados:
                 ec.endereco,
                 ec.numero,
                 ec.coordenadas,
+                ec.latitude,
+                ec.longitude,
                 EXISTS (SELECT 1 FROM ENTREGA e WHERE e.pedido_n_nota = p.n_nota) AS entregues
             FROM PEDIDO p
             LEFT JOIN CLIENTE c ON c.id_cliente = p.id_cliente
@@ -302,13 +383,7 @@ class ServicoPedidosImportados:
         # Usa o MESMO builder correto
         where_sql, params = self._build_filtros_sql(filtros)
 
-        sql = f"""
-            SELECT COUNT(*) AS total
-            FROM PEDIDO p
-            LEFT JOIN CLIENTE c ON c.id_cliente = p.id_cliente
-            LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
-            {where_sql};
-        """
+        sql = SELECT_CONTAGEM_PEDIDOS.format(where_sql=where_sql)
 
 
         rows = self._execute_select(sql, tuple(params))
@@ -320,14 +395,13 @@ class ServicoPedidosImportados:
         cliente_id: Optional[int] = None,
     ) -> List[Dict[str, Any]]:
         try:
-            limite = max(1, min(int(limite), 500))
+            limite = max(1, min(int(limite), LIMITE_PEDIDOS_OTIMIZACAO))
         except Exception:
             limite = 50
 
         params = []
         where_parts = [
-            "ec.coordenadas IS NOT NULL",
-            "ec.coordenadas <> ''",
+            "ec.latitude IS NOT NULL",
             "NOT EXISTS (SELECT 1 FROM ENTREGA e WHERE e.pedido_n_nota = p.n_nota)",
         ]
 
@@ -345,7 +419,8 @@ class ServicoPedidosImportados:
                 ec.cidade,
                 ec.bairro,
                 ec.numero,
-                ec.coordenadas
+                ec.latitude,
+                ec.longitude
             FROM PEDIDO p
             LEFT JOIN CLIENTE c ON c.id_cliente = p.id_cliente
             LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
@@ -391,22 +466,21 @@ class ServicoPedidosImportados:
                 params = ()
             sql_rotas += " ORDER BY e.data_entrega DESC NULLS LAST, e.id_entrega DESC"
 
-            rotas_rows = self._execute_select(sql_rotas, params)
-
+            # sem data o historico inteiro pode vir: le em fluxo, sem montar a lista de linhas
             rotas_por_veiculo: Dict[str, List[str]] = {}
             datas_encontradas = set()
-            for row in rotas_rows:
-                veic = (row.get("veiculo_placa") or "").strip()
-                entrega_id = row.get("id_entrega")
-                rota_id = row.get("id_rota")
-                seq_raw = row.get("sequencia_descarga") or ""
+            for row in self._iterar_select(sql_rotas, params, formato="namedtuple"):
+                veic = (row.veiculo_placa or "").strip()
+                entrega_id = row.id_entrega
+                rota_id = row.id_rota
+                seq_raw = row.sequencia_descarga or ""
                 seq = [p.strip() for p in str(seq_raw).split(",") if p.strip()]
                 if not veic or not seq:
                     continue
                 chave = f"{veic}-{rota_id or entrega_id}" if (rota_id or entrega_id) is not None else veic
                 rotas_por_veiculo[chave] = seq
-                if row.get("data_entrega"):
-                    datas_encontradas.add(row.get("data_entrega"))
+                if row.data_entrega:
+                    datas_encontradas.add(row.data_entrega)
 
             if not rotas_por_veiculo:
                 return None
@@ -422,7 +496,7 @@ class ServicoPedidosImportados:
                 placeholders = ",".join(["%s"] * len(notas_unicas))
                 coords_rows = self._execute_select(
                     f"""
-                    SELECT p.n_nota, ec.coordenadas, c.nome_cliente
+                    SELECT p.n_nota, ec.latitude, ec.longitude, c.nome_cliente
                     FROM pedido p
                     LEFT JOIN endereco_cliente ec ON ec.id_endereco = p.id_endereco
                     LEFT JOIN cliente c ON c.id_cliente = p.id_cliente
@@ -432,9 +506,8 @@ class ServicoPedidosImportados:
                 )
                 for row in coords_rows:
                     nota = str(row.get("n_nota"))
-                    coord = self._parse_coordenadas(row.get("coordenadas"))
-                    if coord:
-                        coords_map[nota] = coord
+                    if row.get("latitude") is not None:
+                        coords_map[nota] = (row["latitude"], row["longitude"])
                     nome_cli = row.get("nome_cliente")
                     if nome_cli:
                         clientes_map[nota] = nome_cli
@@ -464,14 +537,71 @@ class ServicoPedidosImportados:
             print("Erro ao recuperar ultima otimizacao salva:", e)
             return None
 
-    def _parse_coordenadas(self, coordenadas: Optional[str]) -> Optional[Tuple[float, float]]:
-        if not coordenadas:
-            return None
-        try:
-            lat_str, lng_str = str(coordenadas).split(",")
-            return float(lat_str.strip()), float(lng_str.strip())
-        except Exception:
+    def _parametros_motor(self, nome_motor: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Parametros do payload aceitos pelo motor escolhido (motores sem entrada aqui usam os padroes)."""
+        if nome_motor == "genetico":
+            return dict(
+                tamanho_populacao=int(params.get("tamanho_populacao", 60)),
+                geracoes=int(params.get("geracoes", 150)),
+                taxa_mutacao=float(params.get("taxa_mutacao", 0.12)),
+                tamanho_torneio=int(params.get("tamanho_torneio", 3)),
+                modo_busca_local=str(params.get("modo_busca_local", "melhor")),
+                ilhas=int(params.get("ilhas", 1)),
+                intervalo_migracao=int(params.get("intervalo_migracao", 5)),
+                migrantes=int(params.get("migrantes", 2)),
+                paciencia=_param_opcional(params, "paciencia", int),
+                melhoria_minima=_param_opcional(params, "melhoria_minima", float),
+                tempo_limite_s=_param_opcional(params, "tempo_limite_s", float),
+                elitismo=int(params.get("elitismo", 2)),
+                usar_busca_entre_rotas=bool(params.get("usar_busca_entre_rotas", False)),
+                vizinhos_k=int(params.get("vizinhos_k", 10)),
+                proporcao_construtiva=float(params.get("proporcao_construtiva", 0.25)),
+            )
+        if nome_motor == "alns":
+            return dict(
+                tempo_limite_s=float(params.get("tempo_limite_s") or 10.0),
+                iteracoes=int(params.get("iteracoes", 20000)),
+                paciencia=_param_opcional(params, "paciencia", int),
+                fracao_destruicao=float(params.get("fracao_destruicao", 0.15)),
+                temperatura_inicial=float(params.get("temperatura_inicial", 0.05)),
+                modo_busca_local=str(params.get("modo_busca_local", "melhor")),
+                vizinhos_k=int(params.get("vizinhos_k", 10)),
+            )
+        return {}
+
+    def _plano_por_veiculo(
+        self, rotas_por_veiculo: Dict[str, List[str]], veiculos: List[Veiculo]
+    ) -> Dict[str, List[str]]:
+        """
+        Ajusta as chaves de um plano anterior para as placas dos veiculos: o plano salvo usa
+        "placa-id_rota" (ver recuperar_ultima_otimizacao_salva); rotas do mesmo veiculo sao concatenadas.
+        """
+        placas = {v.id for v in veiculos}
+        plano: Dict[str, List[str]] = {}
+        for chave, seq in (rotas_por_veiculo or {}).items():
+            placa = str(chave)
+            if placa not in placas and "-" in placa:
+                placa = placa.rsplit("-", 1)[0]
+            plano.setdefault(placa, []).extend(str(n) for n in seq or [])
+        return plano
+
+    def _provedor(self, params: Dict[str, Any]):
+        """Provedor configurado, a menos que parametros["fonte_distancias"] == "haversine"."""
+        if params.get("fonte_distancias") == "haversine":
             return None
+        return self.provedor_distancias
+
+    def _matriz_distancias(self, coordenadas: List[Tuple[float, float]], params: Dict[str, Any]):
+        """
+        Matriz de distancias das coordenadas (deposito no indice 0) e a fonte usada.
+        Com parametros["usar_cache_distancias"] (padrao: ligado para distancias por estrada), reaproveita
+        os pares gravados em DISTANCIA_CACHE e so calcula os que faltam.
+        """
+        provedor = self._provedor(params)
+        return montar_matriz_distancias(coordenadas, provedor, self.banco if self._usa_cache(params) else None)
+
+    def _usa_cache(self, params: Dict[str, Any]) -> bool:
+        return bool(params.get("usar_cache_distancias", self._provedor(params) is not None))
 
     def _buscar_resumo_pedidos_para_otimizacao(self, pedido_ids: List[int]) -> List[Dict[str, Any]]:
         if not pedido_ids:
@@ -481,7 +611,8 @@ class ServicoPedidosImportados:
         query = f"""
             SELECT
                 p.n_nota,
-                ec.coordenadas,
+                ec.latitude,
+                ec.longitude,
                 COALESCE(SUM(pp.quant_pedido * COALESCE(pr.peso, 0)), 0) AS peso_total,
                 COALESCE(MAX(CASE WHEN pr.classificacao = 2 THEN 2 ELSE 1 END), 1) AS tipo_carga
             FROM PEDIDO p
@@ -489,7 +620,7 @@ class ServicoPedidosImportados:
             LEFT JOIN PRODUTO_PEDIDO pp ON pp.pedido_n_nota = p.n_nota
             LEFT JOIN PRODUTO pr ON pr.id_produto = pp.produto_id_produto
             WHERE p.n_nota IN ({placeholders})
-            GROUP BY p.n_nota, ec.coordenadas;
+            GROUP BY p.n_nota, ec.latitude, ec.longitude;
         """
         return self._execute_select(query, tuple(pedido_ids))
 
@@ -663,7 +794,17 @@ class ServicoPedidosImportados:
         pedido_ids: List[int],
         deposito: Optional[Tuple[float, float]] = None,
         parametros_algoritmo: Optional[Dict[str, Any]] = None,
+        ao_progresso=None,
+        plano_anterior: Optional[Dict[str, List[str]]] = None,
     ) -> Dict[str, Any]:
+        """
+        Otimiza as rotas dos pedidos informados. `ao_progresso`, se informado, e repassado ao
+        otimizador e recebe o andamento (geracao e melhor custo, ou clusters concluidos).
+        `plano_anterior` (rotas_por_veiculo da sessao ou de recuperar_ultima_otimizacao_salva) faz a
+        reotimizacao partir dele: notas removidas saem, as novas sao inseridas e a busca para apos
+        PACIENCIA_REOTIMIZACAO sem melhoria (se "paciencia" nao vier nos parametros).
+        parametros_algoritmo["motor"] escolhe o algoritmo (ver motores_otimizacao; padrao "genetico").
+        """
         if not pedido_ids:
             raise ValueError("Nenhum pedido informado para otimizar.")
 
@@ -690,28 +831,31 @@ class ServicoPedidosImportados:
         pedidos_sem_coord = []
         pedidos_sem_compat = []
 
+        # compatibilidade tipo de carga -> veiculos, calculada uma vez e repassada ao otimizador
+        compatibilidade = montar_tabela_compatibilidade(
+            veiculos, (int(p.get("tipo_carga") or 1) for p in pedidos_resumo)
+        )
+        # capacidade maxima entre veiculos compativeis, por tipo de carga
+        cap_max_por_tipo = {
+            tipo: max(veiculos[v].limite_peso for v in indices)
+            for tipo, indices in compatibilidade.items()
+            if indices
+        }
+
         idx_matriz = 1
         for pedido in pedidos_resumo:
-            coords = self._parse_coordenadas(pedido.get("coordenadas"))
-            if not coords:
+            if pedido.get("latitude") is None:
                 pedidos_sem_coord.append(pedido.get("n_nota"))
                 continue
+            coords = (pedido["latitude"], pedido["longitude"])
 
             peso = float(pedido.get("peso_total") or 0.0)
             tipo_carga = int(pedido.get("tipo_carga") or 1)
-            def veiculo_compativel(v):
-                if tipo_carga == 2 and int(v.tipo_carga) != 2:
-                    return False
-                if int(v.tipo_carga) == 2 and tipo_carga != 2:
-                    return False
-                return int(v.tipo_carga) == tipo_carga
-
-            # capacidade maxima entre veiculos compativeis
-            caps_compativeis = [v.limite_peso for v in veiculos if veiculo_compativel(v)]
-            if not caps_compativeis:
+
+            cap_max = cap_max_por_tipo.get(tipo_carga)
+            if cap_max is None:
                 pedidos_sem_compat.append(pedido.get("n_nota"))
                 continue
-            cap_max = max(caps_compativeis)
             if cap_max <= 0:
                 raise ValueError("Limite de peso dos veiculos inválido.")
 
@@ -743,19 +887,51 @@ class ServicoPedidosImportados:
             detalhe = " | ".join(msg_partes) if msg_partes else "Nenhum pedido elegivel."
             raise ValueError(f"Nenhum pedido otimizavel. {detalhe}")
 
-        matriz = gerar_matriz_distancias(coordenadas)
         params = parametros_algoritmo or {}
-
-        resultado = encontrar_melhor_rota_genetico(
-            matriz,
-            entregas,
-            veiculos,
-            deposito=0,
-            tamanho_populacao=int(params.get("tamanho_populacao", 60)),
-            geracoes=int(params.get("geracoes", 150)),
-            taxa_mutacao=float(params.get("taxa_mutacao", 0.12)),
-            tamanho_torneio=int(params.get("tamanho_torneio", 3)),
-        )
+        nome_motor = str(params.get("motor") or MOTOR_PADRAO)
+        motor = obter_motor(nome_motor)
+        parametros_motor = self._parametros_motor(nome_motor, params)
+        if plano_anterior:
+            parametros_motor["plano_anterior"] = self._plano_por_veiculo(plano_anterior, veiculos)
+            if parametros_motor.get("paciencia") is None and nome_motor in PACIENCIA_REOTIMIZACAO:
+                parametros_motor["paciencia"] = PACIENCIA_REOTIMIZACAO[nome_motor]
+        decomposicao = params.get("decomposicao", "auto")
+        if decomposicao == "auto":
+            decomposicao = "setores" if len(entregas) > LIMIAR_DECOMPOSICAO_AUTOMATICA else None
+
+        if decomposicao:
+            # cluster-first: cada cluster monta a propria matriz, sem a matriz completa NxN
+            resultado = encontrar_melhor_rota_por_clusters(
+                coordenadas,
+                entregas,
+                veiculos,
+                deposito=0,
+                modo=decomposicao,
+                tamanho_cluster=int(params.get("tamanho_cluster", 150)),
+                provedor_distancias=self._provedor(params),
+                ao_progresso=ao_progresso,
+                motor=motor,
+                # com o cache em uso, as matrizes dos clusters tambem passam por DISTANCIA_CACHE
+                montar_matriz=(lambda c: self._matriz_distancias(c, params)) if self._usa_cache(params) else None,
+                **parametros_motor,
+            )
+            # fonte das matrizes efetivamente montadas pelos clusters (haversine onde o provedor falhou)
+            fonte_distancias = resultado.pop("fonte_distancias", None) or "haversine"
+        else:
+            matriz, fonte_distancias = self._matriz_distancias(coordenadas, params)
+            # indice espacial montado uma vez: listas de vizinhos para 2-opt, busca entre rotas e construcao
+            indice = IndiceEspacial(coordenadas)
+            resultado = motor(
+                matriz,
+                entregas,
+                veiculos,
+                deposito=0,
+                compatibilidade=compatibilidade,
+                coordenadas=coordenadas,
+                indice_espacial=indice,
+                ao_progresso=ao_progresso,
+                **parametros_motor,
+            )
 
         mapa_indices = {e.id: e.indice_matriz for e in entregas}
 
@@ -768,6 +944,8 @@ class ServicoPedidosImportados:
         resultado.update(
             {
                 "coordenadas_usadas": coordenadas,
+                "fonte_distancias": fonte_distancias,
+                "motor": nome_motor,
                 "pedidos_considerados": [e.id for e in entregas],
                 "pedidos_sem_coordenadas": pedidos_sem_coord,
                 "pedidos_sem_compativeis": pedidos_sem_compat,
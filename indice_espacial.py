@@ -0,0 +1,110 @@
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Coordenada como (lat, lng) ou no texto gravado em ENDERECO_CLIENTE.coordenadas ("lat,lng").
+Coordenada = Union[Tuple[float, float], str]
+
+RAIO_TERRA_KM = 6371.0
+
+
+def converter_coordenada(valor: Coordenada) -> Tuple[float, float]:
+    """
+    Converte (lat, lng) ou o texto "lat,lng" de ENDERECO_CLIENTE.coordenadas para floats.
+    Levanta ValueError para formato ou faixa invalida.
+    """
+    if isinstance(valor, str):
+        partes = valor.split(",")
+        if len(partes) != 2:
+            raise ValueError(f"Coordenada invalida: {valor!r}. Use 'lat,lng'.")
+        valor = (partes[0].strip(), partes[1].strip())
+    lat, lng = float(valor[0]), float(valor[1])
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        raise ValueError(f"Coordenada fora da faixa: ({lat}, {lng}).")
+    return lat, lng
+
+
+class IndiceEspacial:
+    """
+    Grade uniforme sobre as coordenadas projetadas em km (equiretangular em torno do centro dos pontos),
+    para consultar os pontos mais proximos sem comparar todos os pares.
+    Na escala de uma regiao de entregas a projecao ordena os vizinhos como o Haversine; as distancias
+    retornadas sao aproximadas e servem para montar listas de candidatos.
+    """
+
+    def __init__(self, coordenadas: Sequence[Coordenada], pontos_por_celula: float = 2.0):
+        pontos = [converter_coordenada(c) for c in coordenadas]
+        self._n = len(pontos)
+        lat_media = sum(p[0] for p in pontos) / self._n if pontos else 0.0
+        self._lng_ref = sum(p[1] for p in pontos) / self._n if pontos else 0.0
+        self._escala_x = math.radians(1.0) * RAIO_TERRA_KM * math.cos(math.radians(lat_media))
+        self._escala_y = math.radians(1.0) * RAIO_TERRA_KM
+        self._xy = [self._projetar(lat, lng) for lat, lng in pontos]
+
+        if self._xy:
+            xs = [x for x, _ in self._xy]
+            ys = [y for _, y in self._xy]
+            area = (max(xs) - min(xs)) * (max(ys) - min(ys))
+        else:
+            area = 0.0
+        self._lado = math.sqrt(area * pontos_por_celula / self._n) if area > 0 else 1.0
+        self._celulas: Dict[Tuple[int, int], List[int]] = {}
+        for i, (x, y) in enumerate(self._xy):
+            self._celulas.setdefault(self._celula(x, y), []).append(i)
+        if self._celulas:
+            cxs = [c[0] for c in self._celulas]
+            cys = [c[1] for c in self._celulas]
+            self._limites = (min(cxs), max(cxs), min(cys), max(cys))
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _projetar(self, lat: float, lng: float) -> Tuple[float, float]:
+        return (lng - self._lng_ref) * self._escala_x, lat * self._escala_y
+
+    def _celula(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self._lado), math.floor(y / self._lado)
+
+    def _consultar(self, x: float, y: float, k: int, excluir: int = -1) -> List[Tuple[float, int]]:
+        """Os `k` pontos mais proximos de (x, y) como (distancia_km, indice), do mais perto ao mais longe."""
+        if k <= 0 or not self._celulas:
+            return []
+        cx, cy = self._celula(x, y)
+        min_cx, max_cx, min_cy, max_cy = self._limites
+        raio_max = max(cx - min_cx, max_cx - cx, cy - min_cy, max_cy - cy, 0)
+        melhores: List[Tuple[float, int]] = []  # heap de maximo via distancia negativa
+        xy = self._xy
+        for r in range(raio_max + 1):
+            # celulas do anel de raio r (distancia de Chebyshev r da celula da consulta)
+            for gx in range(cx - r, cx + r + 1):
+                passo = 1 if gx in (cx - r, cx + r) else 2 * r
+                for gy in range(cy - r, cy + r + 1, passo):
+                    for i in self._celulas.get((gx, gy), ()):
+                        if i == excluir:
+                            continue
+                        px, py = xy[i]
+                        d = math.hypot(px - x, py - y)
+                        if len(melhores) < k:
+                            heapq.heappush(melhores, (-d, i))
+                        elif d < -melhores[0][0]:
+                            heapq.heapreplace(melhores, (-d, i))
+            # pontos de aneis seguintes estao a pelo menos r * lado da consulta
+            if len(melhores) == k and -melhores[0][0] <= r * self._lado:
+                break
+        return sorted((-d, i) for d, i in melhores)
+
+    def mais_proximos(self, coordenada: Coordenada, k: int) -> List[Tuple[int, float]]:
+        """Os `k` pontos mais proximos de uma coordenada qualquer, como (indice, distancia_km)."""
+        x, y = self._projetar(*converter_coordenada(coordenada))
+        return [(i, d) for d, i in self._consultar(x, y, k)]
+
+    def vizinhos(self, indice: int, k: int) -> List[int]:
+        """Indices dos `k` pontos mais proximos do ponto `indice` (sem ele mesmo), do mais perto ao mais longe."""
+        x, y = self._xy[indice]
+        return [i for _, i in self._consultar(x, y, k, excluir=indice)]
+
+    def listas_vizinhos(self, k: int, indices: Optional[Sequence[int]] = None) -> List[List[int]]:
+        """Lista de candidatos (k vizinhos) de cada ponto de `indices` (todos, se omitido)."""
+        if indices is None:
+            indices = range(self._n)
+        return [self.vizinhos(i, k) for i in indices]
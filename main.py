@@ -5,6 +5,8 @@ from form_importador import ServicoImportacao
 from form_cadastro_veiculos import ServicoVeiculo
 from form_cadastro_usuarios import ServicoUsuario
 from form_pedidos_importados import ServicoPedidosImportados
+from provedor_distancias import ProvedorOSRM
+from servico_jobs_otimizacao import FilaJobsCheia, ServicoJobsOtimizacao
 from jinja2 import TemplateNotFound
 import json
 import re
@@ -23,11 +25,26 @@ DB_HOST = "localhost"
 DB_PORT = "3380"
 #DB_PORT = "5433"
 DB_NAME = "FastRoute"
+# Pool de conexoes: conexoes ociosas mantidas, maximo aberto e tempo ate fechar ociosas excedentes
+DB_POOL_MIN = 1
+DB_POOL_MAX = 10
+DB_POOL_OCIOSO_MAX_S = 300
+# Consultas com duracao acima disso (ms) vao para o log "fastroute.consultas_lentas" (None = desliga)
+DB_LIMIAR_CONSULTA_LENTA_MS = 500
+# Token para coleta de /monitoramento/metricas sem sessao (Authorization: Bearer <token>); None = so admin
+METRICAS_TOKEN = None
+
+# Distancias por estrada: endpoint /table compativel com OSRM (None = linha reta)
+OSRM_URL = None
+#OSRM_URL = "http://localhost:5000"
+OSRM_MAX_LOCAIS = 100  # mesmo valor do --max-table-size do servidor
 
 config_banco = ConfiguracaoBanco(DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT)
 banco_dados = None
 try:
-    banco_dados = BancoDados(config_banco)
+    banco_dados = BancoDados(
+        config_banco, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_OCIOSO_MAX_S, DB_LIMIAR_CONSULTA_LENTA_MS
+    )
 except Exception:
     banco_dados = None  # fallback
 
@@ -35,7 +52,10 @@ servico_autenticacao = ServicoAutenticacao(banco_dados)
 servico_importacao = ServicoImportacao(banco_dados)
 servico_veiculo = ServicoVeiculo(banco_dados)
 servico_usuario = ServicoUsuario(banco_dados)
-servico_pedidos = ServicoPedidosImportados(banco_dados)
+provedor_distancias = ProvedorOSRM(OSRM_URL, max_locais=OSRM_MAX_LOCAIS) if OSRM_URL else None
+servico_pedidos = ServicoPedidosImportados(banco_dados, provedor_distancias=provedor_distancias)
+# otimizacoes em segundo plano (/otimizar_rotas/jobs): execucoes simultaneas e tempo de guarda do resultado
+servico_jobs = ServicoJobsOtimizacao(max_execucoes=2, ttl_s=3600)
 
 
 # Decorators
@@ -602,21 +622,19 @@ def rotas_otimizadas():
         mensagem_alerta=mensagem_alerta,
     )
 
-@app.route("/otimizar_rotas", methods=["POST"])
-@login_obrigatorio
-def otimizar_rotas():
-    payload = request.get_json(silent=True) or {}
+def _ler_pedido_otimizacao(payload):
+    """Extrai (pedido_ids, deposito, parametros) do JSON de otimizacao; levanta ValueError se invalido."""
     pedido_ids = payload.get("pedido_ids") or []
     deposito_payload = payload.get("deposito") or {}
     parametros_algoritmo = payload.get("parametros") or {}
 
     if not isinstance(pedido_ids, list):
-        return jsonify({"erro": "pedido_ids deve ser uma lista de notas/pedidos."}), 400
+        raise ValueError("pedido_ids deve ser uma lista de notas/pedidos.")
 
     try:
         pedido_ids = [int(pid) for pid in pedido_ids]
     except Exception:
-        return jsonify({"erro": "pedido_ids contem valores invalidos."}), 400
+        raise ValueError("pedido_ids contem valores invalidos.")
 
     deposito_tuple = None
     if isinstance(deposito_payload, dict):
@@ -627,40 +645,83 @@ def otimizar_rotas():
     if not deposito_tuple or deposito_tuple[0] is None or deposito_tuple[1] is None:
         deposito_tuple = DEPOSITO_COORD
 
-    try:
-        resultado = servico_pedidos.otimizar_rotas(
-            pedido_ids, deposito_tuple, parametros_algoritmo
-        )
+    return pedido_ids, deposito_tuple, parametros_algoritmo
+
 
-        # guarda resultado na sessao para consulta posterior
+def _ler_plano_anterior(payload):
+    """
+    Plano de partida da reotimizacao, escolhido por payload["partir_de"]: "sessao" (ultima otimizacao
+    desta sessao) ou "salva" (rotas registradas, opcionalmente de payload["data_referencia"]).
+    Sem "partir_de", retorna None (execucao a frio). Levanta ValueError se o plano nao existir.
+    """
+    origem = payload.get("partir_de")
+    if not origem:
+        return None
+    if origem == "sessao":
+        dados = session.get("ultima_otimizacao") or {}
+    elif origem == "salva":
+        dados = servico_pedidos.recuperar_ultima_otimizacao_salva(payload.get("data_referencia")) or {}
+    else:
+        raise ValueError("partir_de deve ser 'sessao' ou 'salva'.")
+    rotas = dados.get("rotas_por_veiculo") if isinstance(dados, dict) else None
+    if not rotas:
+        raise ValueError("Nenhuma otimizacao anterior encontrada para reotimizar.")
+    return rotas
+
+
+def _executar_otimizacao(pedido_ids, deposito_tuple, parametros_algoritmo, ao_progresso=None, plano_anterior=None):
+    """Otimiza e anexa o nome do cliente de cada pedido; usado pela rota sincrona e pelos jobs."""
+    resultado = servico_pedidos.otimizar_rotas(
+        pedido_ids,
+        deposito_tuple,
+        parametros_algoritmo,
+        ao_progresso=ao_progresso,
+        plano_anterior=plano_anterior,
+    )
+    clientes_por_pedido = {}
+    for pid in pedido_ids:
         try:
-            clientes_por_pedido = {}
-            for pid in pedido_ids:
-                try:
-                    pedido_info = servico_pedidos.buscar_pedido_por_id(pid)
-                    if pedido_info:
-                        clientes_por_pedido[str(pid)] = pedido_info.get("nome_cliente") or ""
-                except Exception:
-                    continue
-
-            serializado = {
-                "rotas_por_veiculo": resultado.get("rotas_por_veiculo", {}),
-                "distancia_total_km": float(resultado.get("distancia_total_km", 0.0)),
-                "custo_fitness": float(resultado.get("custo_fitness", 0.0)),
-                "coordenadas_usadas": [
-                    [float(c[0]), float(c[1])] for c in resultado.get("coordenadas_usadas", [])
-                ],
-                "pedidos_considerados": resultado.get("pedidos_considerados", []),
-                "pedidos_sem_coordenadas": resultado.get("pedidos_sem_coordenadas", []),
-                "pedidos_sem_compativeis": resultado.get("pedidos_sem_compativeis", []),
-                "mapa_indices": resultado.get("mapa_indices", {}),
-                "clientes_por_pedido": clientes_por_pedido,
-                "data_referencia": datetime.date.today().isoformat(),
-            }
-            session["ultima_otimizacao"] = serializado
-            resultado["clientes_por_pedido"] = clientes_por_pedido
-        except Exception as e:
-            print("Nao foi possivel armazenar resultado de otimizacao na sessao:", e)
+            pedido_info = servico_pedidos.buscar_pedido_por_id(pid)
+            if pedido_info:
+                clientes_por_pedido[str(pid)] = pedido_info.get("nome_cliente") or ""
+        except Exception:
+            continue
+    resultado["clientes_por_pedido"] = clientes_por_pedido
+    return resultado
+
+
+def _guardar_otimizacao_na_sessao(resultado):
+    """Guarda o resultado na sessao para consulta posterior (rotas otimizadas, salvar/descartar)."""
+    try:
+        serializado = {
+            "rotas_por_veiculo": resultado.get("rotas_por_veiculo", {}),
+            "distancia_total_km": float(resultado.get("distancia_total_km", 0.0)),
+            "custo_fitness": float(resultado.get("custo_fitness", 0.0)),
+            "coordenadas_usadas": [
+                [float(c[0]), float(c[1])] for c in resultado.get("coordenadas_usadas", [])
+            ],
+            "pedidos_considerados": resultado.get("pedidos_considerados", []),
+            "pedidos_sem_coordenadas": resultado.get("pedidos_sem_coordenadas", []),
+            "pedidos_sem_compativeis": resultado.get("pedidos_sem_compativeis", []),
+            "mapa_indices": resultado.get("mapa_indices", {}),
+            "clientes_por_pedido": resultado.get("clientes_por_pedido", {}),
+            "data_referencia": datetime.date.today().isoformat(),
+        }
+        session["ultima_otimizacao"] = serializado
+    except Exception as e:
+        print("Nao foi possivel armazenar resultado de otimizacao na sessao:", e)
+
+
+@app.route("/otimizar_rotas", methods=["POST"])
+@login_obrigatorio
+def otimizar_rotas():
+    try:
+        payload = request.get_json(silent=True) or {}
+        pedido_ids, deposito_tuple, parametros_algoritmo = _ler_pedido_otimizacao(payload)
+        resultado = _executar_otimizacao(
+            pedido_ids, deposito_tuple, parametros_algoritmo, plano_anterior=_ler_plano_anterior(payload)
+        )
+        _guardar_otimizacao_na_sessao(resultado)
         return jsonify(resultado)
     except ValueError as e:
         return jsonify({"erro": str(e)}), 400
@@ -669,6 +730,57 @@ def otimizar_rotas():
         return jsonify({"erro": "Falha interna ao otimizar rotas."}), 500
 
 
+@app.route("/otimizar_rotas/jobs", methods=["POST"])
+@login_obrigatorio
+def criar_job_otimizacao():
+    """Agenda a otimizacao em segundo plano e responde na hora com o id do job (202)."""
+    try:
+        payload = request.get_json(silent=True) or {}
+        pedido_ids, deposito_tuple, parametros_algoritmo = _ler_pedido_otimizacao(payload)
+        if not pedido_ids:
+            raise ValueError("Nenhum pedido informado para otimizar.")
+        # o plano anterior e lido aqui: a sessao nao esta disponivel na thread do job
+        plano_anterior = _ler_plano_anterior(payload)
+        job_id = servico_jobs.submeter(
+            lambda ao_progresso: _executar_otimizacao(
+                pedido_ids, deposito_tuple, parametros_algoritmo, ao_progresso, plano_anterior
+            ),
+            dono=session.get("usuario_id"),
+        )
+        return jsonify({"job_id": job_id, "status": "na_fila"}), 202
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except FilaJobsCheia as e:
+        return jsonify({"erro": str(e)}), 503
+    except Exception as e:
+        print("Erro ao agendar otimizacao:", e)
+        return jsonify({"erro": "Falha interna ao otimizar rotas."}), 500
+
+
+@app.route("/otimizar_rotas/jobs/<job_id>", methods=["GET"])
+@login_obrigatorio
+def status_job_otimizacao(job_id):
+    job = servico_jobs.consultar(job_id, dono=session.get("usuario_id"))
+    if job is None:
+        return jsonify({"erro": "Otimizacao nao encontrada ou expirada."}), 404
+    return jsonify(job)
+
+
+@app.route("/otimizar_rotas/jobs/<job_id>/resultado", methods=["GET"])
+@login_obrigatorio
+def resultado_job_otimizacao(job_id):
+    job = servico_jobs.resultado(job_id, dono=session.get("usuario_id"))
+    if job is None:
+        return jsonify({"erro": "Otimizacao nao encontrada ou expirada."}), 404
+    if job["status"] == "erro":
+        return jsonify({"erro": job["erro"]}), job["codigo_erro"]
+    if job["status"] != "concluido":
+        return jsonify({"erro": "Otimizacao ainda em andamento.", "status": job["status"]}), 409
+    # a sessao so pode ser gravada dentro de uma requisicao, por isso fica aqui e nao no job
+    _guardar_otimizacao_na_sessao(job["resultado"])
+    return jsonify(job["resultado"])
+
+
 @app.route("/salvar_rotas_otimizadas", methods=["POST"])
 @login_obrigatorio
 def salvar_rotas_otimizadas():
@@ -780,49 +892,57 @@ def entregas_mapa():
     Se existir pelo menos uma entrega (entregue=True) para uma coordenada,
     o status daquela coordenada será 'ENTREGUE'. Caso contrário 'COMPLETO'
     (OBS: o JS filtra para mostrar apenas não-entregues).
+    Com lat_min, lat_max, lng_min e lng_max, retorna apenas os pedidos dentro dessa area.
     """
     query = """
         SELECT
             p.n_nota,
-            ec.coordenadas,
+            ec.latitude,
+            ec.longitude,
             EXISTS(SELECT 1 FROM ENTREGA e WHERE e.pedido_n_nota = p.n_nota) AS entregue
         FROM PEDIDO p
-        LEFT JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
-        WHERE ec.coordenadas IS NOT NULL
-        AND ec.coordenadas <> '';
+        JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
+        WHERE ec.latitude IS NOT NULL
     """
+    params = ()
+    limites = [request.args.get(chave) for chave in ("lat_min", "lat_max", "lng_min", "lng_max")]
+    if any(limites):
+        try:
+            lat_min, lat_max, lng_min, lng_max = (float(v) for v in limites)
+        except (TypeError, ValueError):
+            return jsonify({"erro": "Informe lat_min, lat_max, lng_min e lng_max numericos."}), 400
+        # area do mapa: usa o indice GiST de point(longitude, latitude)
+        query += " AND point(ec.longitude, ec.latitude) <@ box(point(%s, %s), point(%s, %s))"
+        params = (lng_min, lat_min, lng_max, lat_max)
 
-    rows = servico_pedidos._execute_select(query)
+    # tabela inteira de pedidos: le em fluxo e em tuplas (n_nota, latitude, longitude, entregue)
+    rows = servico_pedidos._iterar_select(query, params, formato="tupla")
 
     # Agregamos por coordenadas para evitar múltiplos marcadores sobrepostos
     agregados = {}  # chave = coords, valor = dict { lat, lng, n_notas: [..], status }
-    for r in rows:
-        coords = r.get("coordenadas")
-        if not coords:
-            continue
-        try:
-            lat, lng = map(float, coords.split(","))
-        except Exception:
-            continue
-
-        key = f"{lat:.6f},{lng:.6f}"
-        entregado = bool(r.get("entregue"))
-
-        current = agregados.get(key)
-        if not current:
-            agregados[key] = {
-                "lat": lat,
-                "lng": lng,
-                "n_notas": [r.get("n_nota")],
-                # se qualquer um for entregue, marca ENTREGUE
-                "status": "ENTREGUE" if entregado else "COMPLETO"
-            }
-        else:
-            # append nota
-            current["n_notas"].append(r.get("n_nota"))
-            # se algum for entregue, força ENTREGUE
-            if entregado:
-                current["status"] = "ENTREGUE"
+    try:
+        for n_nota, lat, lng, entregue in rows:
+            key = f"{lat:.6f},{lng:.6f}"
+            entregado = bool(entregue)
+
+            current = agregados.get(key)
+            if not current:
+                agregados[key] = {
+                    "lat": lat,
+                    "lng": lng,
+                    "n_notas": [n_nota],
+                    # se qualquer um for entregue, marca ENTREGUE
+                    "status": "ENTREGUE" if entregado else "COMPLETO"
+                }
+            else:
+                # append nota
+                current["n_notas"].append(n_nota)
+                # se algum for entregue, força ENTREGUE
+                if entregado:
+                    current["status"] = "ENTREGUE"
+    except Exception:
+        # fluxo interrompido no meio: nao devolve um mapa parcial como se estivesse completo
+        return jsonify({"erro": "Falha ao carregar as entregas do mapa."}), 500
 
     marcadores = []
     for v in agregados.values():
@@ -877,6 +997,38 @@ def entregas_datas():
     return jsonify(result)
 
 
+# -----------------------------
+# MONITORAMENTO
+# -----------------------------
+@app.route("/monitoramento/pool_banco", methods=["GET"])
+@admin_obrigatorio
+def estatisticas_pool_banco():
+    if banco_dados is None:
+        return jsonify({"erro": "Banco de dados indisponivel."}), 503
+    return jsonify(banco_dados.pool.estatisticas())
+
+
+@app.route("/monitoramento/consultas", methods=["GET"])
+@admin_obrigatorio
+def estatisticas_consultas_banco():
+    if banco_dados is None:
+        return jsonify({"erro": "Banco de dados indisponivel."}), 503
+    return jsonify(banco_dados.metricas.estatisticas())
+
+
+@app.route("/monitoramento/metricas", methods=["GET"])
+def metricas_prometheus():
+    token_ok = METRICAS_TOKEN is not None and request.headers.get("Authorization") == f"Bearer {METRICAS_TOKEN}"
+    if not token_ok:
+        if 'usuario_id' not in session:
+            abort(401)
+        if str(session.get('usuario_cargo')) != '1':
+            abort(403)
+    if banco_dados is None:
+        return "", 503
+    return banco_dados.metricas.formato_prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 # -----------------------------
 # MAIN
 # -----------------------------
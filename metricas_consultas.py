@@ -0,0 +1,154 @@
+import bisect
+import json
+import logging
+import re
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+# limites superiores (ms) das faixas do histograma de duracao por rotulo
+FAIXAS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+log_consultas_lentas = logging.getLogger("fastroute.consultas_lentas")
+
+_LITERAL_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_ESPACOS = re.compile(r"\s+")
+_TAMANHO_MAX_SQL = 2000
+
+
+def rotulo_chamador(profundidade: int = 1) -> str:
+    """
+    "modulo.funcao" de quem chamou a funcao atual (`profundidade` = 1) ou de um nivel acima.
+    Usado como rotulo padrao das consultas.
+    """
+    try:
+        quadro = sys._getframe(profundidade + 1)
+    except ValueError:
+        return "desconhecido"
+    modulo = quadro.f_globals.get("__name__", "?")
+    return f"{modulo}.{quadro.f_code.co_name}"
+
+
+def _mascarar_valor(valor: Any) -> Any:
+    if valor is None or isinstance(valor, bool):
+        return valor
+    if isinstance(valor, (list, tuple, set)):
+        return f"<{type(valor).__name__}:{len(valor)}>"
+    return f"<{type(valor).__name__}>"
+
+
+def mascarar_parametros(params: Any) -> Any:
+    """Troca cada parametro pelo seu tipo (ex.: "<str>", "<list:3>"); None e booleanos ficam visiveis."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {chave: _mascarar_valor(v) for chave, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_mascarar_valor(v) for v in params]
+    return _mascarar_valor(params)
+
+
+def normalizar_sql(sql: Any) -> str:
+    """SQL em uma linha, com literais de texto trocados por '?' (ex.: valores ja embutidos por execute_values)."""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", errors="replace")
+    texto = _ESPACOS.sub(" ", _LITERAL_TEXTO.sub("'?'", str(sql))).strip()
+    if len(texto) > _TAMANHO_MAX_SQL:
+        texto = texto[:_TAMANHO_MAX_SQL] + "..."
+    return texto
+
+
+class MetricasConsultas:
+    """
+    Tempo das consultas por rotulo (quem chamou): contagem, soma, maximo, erros e histograma em FAIXAS_MS.
+    Consultas com duracao >= `limiar_lento_ms` vao para o log "fastroute.consultas_lentas" como JSON,
+    com o SQL normalizado e os parametros mascarados. Seguro entre threads.
+    """
+
+    def __init__(self, limiar_lento_ms: Optional[float] = 500.0):
+        self.limiar_lento_ms = limiar_lento_ms
+        self._por_rotulo: Dict[str, Dict[str, Any]] = {}
+        self._trava = threading.Lock()
+
+    def registrar(self, rotulo: str, duracao_s: float, sql: Any = None, params: Any = None, erro: bool = False) -> None:
+        duracao_ms = duracao_s * 1000.0
+        lenta = self.limiar_lento_ms is not None and duracao_ms >= self.limiar_lento_ms
+        with self._trava:
+            dados = self._por_rotulo.get(rotulo)
+            if dados is None:
+                dados = self._por_rotulo[rotulo] = {
+                    "contagem": 0,
+                    "soma_ms": 0.0,
+                    "max_ms": 0.0,
+                    "erros": 0,
+                    "lentas": 0,
+                    "faixas": [0] * (len(FAIXAS_MS) + 1),  # a ultima e acima da maior faixa
+                }
+            dados["contagem"] += 1
+            dados["soma_ms"] += duracao_ms
+            dados["max_ms"] = max(dados["max_ms"], duracao_ms)
+            dados["erros"] += int(erro)
+            dados["lentas"] += int(lenta)
+            dados["faixas"][bisect.bisect_left(FAIXAS_MS, duracao_ms)] += 1
+        if lenta:
+            log_consultas_lentas.warning(
+                json.dumps(
+                    {
+                        "evento": "consulta_lenta",
+                        "rotulo": rotulo,
+                        "duracao_ms": round(duracao_ms, 1),
+                        "erro": erro,
+                        "sql": normalizar_sql(sql) if sql is not None else None,
+                        "params": mascarar_parametros(params),
+                    },
+                    ensure_ascii=False,
+                    default=str,
+                )
+            )
+
+    def estatisticas(self) -> Dict[str, Dict[str, Any]]:
+        """Por rotulo: contagem, media/max em ms, erros, lentas e o histograma acumulado {"<=5": n, ..., "+inf": n}."""
+        with self._trava:
+            copia = {rotulo: dict(d, faixas=list(d["faixas"])) for rotulo, d in self._por_rotulo.items()}
+        resultado = {}
+        for rotulo, d in sorted(copia.items()):
+            acumulado = 0
+            histograma = {}
+            for limite, quantidade in zip(list(FAIXAS_MS) + ["+inf"], d["faixas"]):
+                acumulado += quantidade
+                histograma[f"<={limite}" if limite != "+inf" else "+inf"] = acumulado
+            resultado[rotulo] = {
+                "contagem": d["contagem"],
+                "media_ms": round(d["soma_ms"] / d["contagem"], 2) if d["contagem"] else 0.0,
+                "max_ms": round(d["max_ms"], 2),
+                "erros": d["erros"],
+                "lentas": d["lentas"],
+                "histograma_ms": histograma,
+            }
+        return resultado
+
+    def formato_prometheus(self) -> str:
+        """Histogramas no formato texto do Prometheus (duracao em segundos, rotulo no label "rotulo")."""
+        with self._trava:
+            copia = {rotulo: dict(d, faixas=list(d["faixas"])) for rotulo, d in self._por_rotulo.items()}
+        rotulos = [(rotulo.replace("\\", "\\\\").replace('"', '\\"'), d) for rotulo, d in sorted(copia.items())]
+        linhas = [
+            "# HELP fastroute_consulta_duracao_segundos Duracao das consultas ao banco por rotulo.",
+            "# TYPE fastroute_consulta_duracao_segundos histogram",
+        ]
+        for nome, d in rotulos:
+            acumulado = 0
+            for limite, quantidade in zip(list(FAIXAS_MS) + [None], d["faixas"]):
+                acumulado += quantidade
+                le = "+Inf" if limite is None else f"{limite / 1000:g}"
+                linhas.append(f'fastroute_consulta_duracao_segundos_bucket{{rotulo="{nome}",le="{le}"}} {acumulado}')
+            linhas.append(f'fastroute_consulta_duracao_segundos_sum{{rotulo="{nome}"}} {d["soma_ms"] / 1000:.6f}')
+            linhas.append(f'fastroute_consulta_duracao_segundos_count{{rotulo="{nome}"}} {d["contagem"]}')
+        for metrica, chave, ajuda in (
+            ("fastroute_consultas_erros_total", "erros", "Consultas que levantaram erro, por rotulo."),
+            ("fastroute_consultas_lentas_total", "lentas", "Consultas acima do limiar de consulta lenta, por rotulo."),
+        ):
+            linhas.append(f"# HELP {metrica} {ajuda}")
+            linhas.append(f"# TYPE {metrica} counter")
+            linhas.extend(f'{metrica}{{rotulo="{nome}"}} {d[chave]}' for nome, d in rotulos)
+        return "\n".join(linhas) + "\n"
@@ -0,0 +1,235 @@
+"""
+Migracoes versionadas do esquema (database/migracoes/NNNN_descricao.sql) e verificacao dos indices.
+
+    python migracoes_banco.py aplicar      # aplica as migracoes pendentes, em ordem
+    python migracoes_banco.py status       # lista aplicadas e pendentes
+    python migracoes_banco.py verificar    # EXPLAIN das consultas frequentes: confirma o uso dos indices
+
+Cada migracao roda em uma transacao propria e fica registrada em migracao_esquema; uma migracao com
+erro e desfeita e interrompe as seguintes. O banco inicial continua sendo criado por criação_banco.sql;
+`aplicar` logo em seguida e obrigatorio (os indices das consultas so existem nas migracoes).
+"""
+import argparse
+import os
+import re
+import sys
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from banco_dados import BancoDados, ConfiguracaoBanco
+from form_pedidos_importados import (
+    SELECT_CONTAGEM_PEDIDOS,
+    SELECT_LISTAGEM_PEDIDOS,
+    ServicoPedidosImportados,
+)
+
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "migracoes")
+_NOME_MIGRACAO = re.compile(r"^(\d{4})_[\w-]+\.sql$")
+
+# Consultas frequentes e os indices que cada uma deve usar. Cada exigencia e o nome de um indice ou uma
+# tupla de alternativas (basta uma aparecer no plano).
+Exigencia = Union[str, Tuple[str, ...]]
+
+# filtros da tela de pedidos (montados por ServicoPedidosImportados._build_filtros_sql) -> indices
+_FILTROS_LISTAGEM: List[Tuple[str, Dict[str, Any], List[Exigencia]]] = [
+    ("filtro nome_cliente", {"nome_cliente": "silva"}, ["idx_cliente_nome_trgm"]),
+    ("filtro cidade", {"cidade": "santa"}, ["idx_endereco_cliente_cidade_trgm"]),
+    ("filtro endereco", {"endereco": "rua das"}, ["idx_endereco_cliente_texto_trgm"]),
+    ("filtro numero_nota", {"numero_nota": "123"}, ["idx_pedido_n_nota_texto_trgm"]),
+    (
+        "filtro data_entrega",
+        {"data_entrega": "2024-01-15"},
+        [("idx_entrega_data_entrega", "idx_entrega_pedido_n_nota")],
+    ),
+    ("filtro excluir_entregues", {"excluir_entregues": True}, ["idx_entrega_pedido_n_nota"]),
+]
+
+_OUTRAS_CONSULTAS: List[Tuple[str, str, Tuple, List[Exigencia]]] = [
+    (
+        "importador: endereco existente",
+        """
+        SELECT id_endereco, coordenadas
+        FROM endereco_cliente
+        WHERE id_cliente = %s
+          AND cidade = %s
+          AND bairro = %s
+          AND endereco = %s
+          AND COALESCE(numero, '') = COALESCE(%s, '')
+          AND COALESCE(complemento, '') = COALESCE(%s, '')
+        LIMIT 1
+        """,
+        (1, "CIDADE", "BAIRRO", "RUA", "10", None),
+        ["idx_endereco_cliente_busca"],
+    ),
+    (
+        "rotas salvas por data",
+        """
+        SELECT e.id_entrega, r.id_rota, e.veiculo_placa, r.sequencia_descarga, e.data_entrega
+        FROM entrega e
+        JOIN rota r ON r.entrega_id_entrega = e.id_entrega
+        WHERE e.veiculo_placa IS NOT NULL
+          AND r.sequencia_descarga IS NOT NULL
+          AND e.data_entrega = %s
+        """,
+        ("2024-01-15",),
+        ["idx_entrega_data_entrega"],
+    ),
+    (
+        "mapa por area (/entregas-mapa)",
+        """
+        SELECT p.n_nota, ec.latitude, ec.longitude
+        FROM PEDIDO p
+        JOIN ENDERECO_CLIENTE ec ON ec.id_endereco = p.id_endereco
+        WHERE ec.latitude IS NOT NULL
+          AND point(ec.longitude, ec.latitude) <@ box(point(%s, %s), point(%s, %s))
+        """,
+        (-53.5, -27.5, -53.3, -27.3),
+        ["idx_endereco_cliente_posicao"],
+    ),
+]
+
+
+def listar_migracoes(pasta: str = PASTA_MIGRACOES) -> List[Tuple[str, str]]:
+    """(versao, caminho) dos arquivos NNNN_descricao.sql da pasta, em ordem de versao."""
+    migracoes = []
+    for nome in sorted(os.listdir(pasta)):
+        encontrado = _NOME_MIGRACAO.match(nome)
+        if encontrado:
+            migracoes.append((encontrado.group(1), os.path.join(pasta, nome)))
+    versoes = [v for v, _ in migracoes]
+    if len(set(versoes)) != len(versoes):
+        raise ValueError(f"Versoes de migracao repetidas em {pasta}.")
+    return migracoes
+
+
+def versoes_aplicadas(banco: BancoDados) -> List[str]:
+    with banco.obter_cursor() as (conn, cursor):
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS migracao_esquema (
+                versao          VARCHAR(4) PRIMARY KEY,
+                arquivo         VARCHAR(200) NOT NULL,
+                aplicada_em     TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            """
+        )
+        cursor.execute("SELECT versao FROM migracao_esquema ORDER BY versao;")
+        versoes = [r[0] for r in cursor.fetchall()]
+        conn.commit()
+    return versoes
+
+
+def aplicar_migracoes(banco: BancoDados, pasta: str = PASTA_MIGRACOES) -> List[str]:
+    """Aplica as migracoes pendentes em ordem e retorna as versoes aplicadas agora."""
+    aplicadas = set(versoes_aplicadas(banco))
+    novas = []
+    for versao, caminho in listar_migracoes(pasta):
+        if versao in aplicadas:
+            continue
+        with open(caminho, encoding="utf-8") as arquivo:
+            sql = arquivo.read()
+        with banco.obter_cursor(f"migracao.{versao}") as (conn, cursor):
+            try:
+                cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO migracao_esquema (versao, arquivo) VALUES (%s, %s);",
+                    (versao, os.path.basename(caminho)),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        novas.append(versao)
+    return novas
+
+
+def _indices_no_plano(no: Dict[str, Any]) -> List[str]:
+    indices = [no["Index Name"]] if "Index Name" in no else []
+    for filho in no.get("Plans", []):
+        indices.extend(_indices_no_plano(filho))
+    return indices
+
+
+def _consultas_verificadas() -> List[Tuple[str, str, Sequence, List[Exigencia]]]:
+    servico = ServicoPedidosImportados(None)
+    consultas = [
+        (
+            "listar_pedidos",
+            SELECT_LISTAGEM_PEDIDOS.format(where_sql=""),
+            (20, 0),  # primeira pagina da tela (itens=20)
+            ["idx_pedido_dt_nota_n_nota", "idx_entrega_pedido_n_nota"],
+        )
+    ]
+    for nome, filtros, exigencias in _FILTROS_LISTAGEM:
+        where_sql, params = servico._build_filtros_sql(filtros)
+        # contagem da paginacao (contar_pedidos): sem ORDER BY/LIMIT, o filtro precisa do proprio indice
+        consultas.append((nome, SELECT_CONTAGEM_PEDIDOS.format(where_sql=where_sql), tuple(params), exigencias))
+    return consultas + _OUTRAS_CONSULTAS
+
+
+def verificar_indices(banco: BancoDados, forcar_indices: bool = True) -> List[Dict[str, Any]]:
+    """
+    Roda EXPLAIN (sem executar) nas consultas frequentes e compara os indices do plano com os esperados.
+    Com `forcar_indices`, desliga seq scan na transacao: em tabelas pequenas (desenvolvimento) o
+    planejador prefere ler a tabela inteira, e o que se quer confirmar e que o indice serve a consulta.
+    """
+    resultado = []
+    with banco.obter_cursor() as (conn, cursor):
+        try:
+            if forcar_indices:
+                cursor.execute("SET LOCAL enable_seqscan = off;")
+            for nome, sql, params, exigencias in _consultas_verificadas():
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                plano = cursor.fetchone()[0]
+                usados = _indices_no_plano(plano[0]["Plan"])
+                faltando = [
+                    e for e in exigencias if not any(i in usados for i in ((e,) if isinstance(e, str) else e))
+                ]
+                resultado.append(
+                    {
+                        "consulta": nome,
+                        "indices_usados": sorted(set(usados)),
+                        "faltando": [e if isinstance(e, str) else " ou ".join(e) for e in faltando],
+                        "ok": not faltando,
+                    }
+                )
+        finally:
+            conn.rollback()
+    return resultado
+
+
+def _banco_dos_argumentos(args) -> BancoDados:
+    configuracao = ConfiguracaoBanco(args.banco, args.usuario, args.senha, args.host, args.porta)
+    return BancoDados(configuracao, pool_minimo=0, pool_maximo=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migracoes do esquema e verificacao de indices.")
+    parser.add_argument("comando", choices=("aplicar", "status", "verificar"))
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--porta", default="3380")
+    parser.add_argument("--banco", default="FastRoute")
+    parser.add_argument("--usuario", default="postgres")
+    parser.add_argument("--senha", default=os.environ.get("PGPASSWORD", "fastrout"))
+    parser.add_argument(
+        "--planos-reais", action="store_true", help="verificar sem desligar seq scan (planos de producao)"
+    )
+    args = parser.parse_args()
+    banco = _banco_dos_argumentos(args)
+
+    if args.comando == "aplicar":
+        novas = aplicar_migracoes(banco)
+        print("Migracoes aplicadas:", ", ".join(novas) if novas else "nenhuma (esquema atualizado)")
+    elif args.comando == "status":
+        aplicadas = set(versoes_aplicadas(banco))
+        for versao, caminho in listar_migracoes():
+            print(f"{versao}  {'aplicada ' if versao in aplicadas else 'pendente '}  {os.path.basename(caminho)}")
+    else:
+        falhas = 0
+        for item in verificar_indices(banco, forcar_indices=not args.planos_reais):
+            usados = ", ".join(item["indices_usados"]) or "-"
+            if item["ok"]:
+                print(f"OK     {item['consulta']}: {usados}")
+            else:
+                falhas += 1
+                print(f"FALHA  {item['consulta']}: usa {usados}; faltando {', '.join(item['faltando'])}")
+        sys.exit(1 if falhas else 0)
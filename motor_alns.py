@@ -0,0 +1,345 @@
+import math
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from form_otimizacao_rota import (
+    AoProgresso,
+    CriterioParada,
+    Cromossomo,
+    Entrega,
+    Instancia,
+    MODOS_BUSCA_LOCAL,
+    MatrizDistancias,
+    TOLERANCIA_PESO,
+    VIZINHOS_ECONOMIA,
+    Veiculo,
+    avaliar_rota,
+    busca_local_2opt,
+    calcular_fitness,
+    criar_solucao_inicial,
+    decodificar,
+    inserir_mais_barato,
+    linhas_matriz,
+    matriz_simetrica,
+    melhor_posicao_insercao,
+    montar_instancia,
+    orientar_rotas,
+    rotas_do_plano_anterior,
+    sementes_construtivas,
+    vizinhos_mais_proximos,
+    vizinhos_por_indice,
+)
+from indice_espacial import IndiceEspacial
+
+# Pontuacao de um par de operadores conforme o resultado da iteracao (Ropke & Pisinger):
+# nova melhor solucao, melhora da solucao corrente, piora aceita pelo recozimento.
+_PONTOS_NOVA_MELHOR = 33.0
+_PONTOS_MELHORA = 9.0
+_PONTOS_ACEITA = 13.0
+# iteracoes por segmento (atualizacao dos pesos) e quanto do peso antigo e substituido a cada segmento
+_SEGMENTO = 100
+_REACAO = 0.1
+# temperatura final relativa a inicial, atingida no fim do prazo/iteracoes
+_RESFRIAMENTO_FINAL = 0.002
+# vies da remocao pelo pior custo: expoente aplicado ao sorteio (maior = mais deterministico)
+_VIES_PIOR = 3.0
+
+OPERADORES_DESTRUICAO = ("aleatoria", "relacionada", "pior_custo")
+OPERADORES_REPARO = ("gulosa", "arrependimento")
+
+
+def _posicoes(rotas: List[List[int]], n_entregas: int) -> List[int]:
+    veiculo_de = [-1] * n_entregas
+    for v, rota in enumerate(rotas):
+        for e in rota:
+            veiculo_de[e] = v
+    return veiculo_de
+
+
+def _destruir_aleatoria(rotas: List[List[int]], q: int, inst: Instancia) -> List[int]:
+    return random.sample(range(len(inst.entregas)), q)
+
+
+def _destruir_relacionada(rotas: List[List[int]], q: int, inst: Instancia) -> List[int]:
+    """Uma entrega sorteada e as mais proximas dela (busca em largura pelas listas de vizinhos)."""
+    n = len(inst.entregas)
+    inicio = random.randrange(n)
+    escolhidas = {inicio}
+    fila = [inicio]
+    while fila and len(escolhidas) < q:
+        e = fila.pop(0)
+        for o in inst.vizinhos[e]:
+            if o not in escolhidas:
+                escolhidas.add(o)
+                fila.append(o)
+                if len(escolhidas) >= q:
+                    break
+    while len(escolhidas) < q:
+        escolhidas.add(random.randrange(n))
+    return list(escolhidas)
+
+
+def _destruir_pior_custo(rotas: List[List[int]], q: int, inst: Instancia) -> List[int]:
+    """Entregas com maior economia de distancia ao serem retiradas, com sorteio enviesado para as piores."""
+    matriz, pontos, deposito = inst.matriz, inst.pontos, inst.deposito
+    economias: List[Tuple[float, int]] = []
+    for rota in rotas:
+        caminho = [deposito] + [pontos[e] for e in rota] + [deposito]
+        for k, e in enumerate(rota):
+            a, b, c = caminho[k], caminho[k + 1], caminho[k + 2]
+            economias.append((matriz[a][b] + matriz[b][c] - matriz[a][c], e))
+    economias.sort(reverse=True)
+    escolhidas = []
+    while len(escolhidas) < q and economias:
+        k = int(len(economias) * random.random() ** _VIES_PIOR)
+        escolhidas.append(economias.pop(k)[1])
+    return escolhidas
+
+
+def _reparar_gulosa(rotas: List[List[int]], cargas: List[float], retiradas: List[int], inst: Instancia) -> set:
+    """Insercao mais barata das entregas retiradas, em ordem aleatoria. Retorna os veiculos alterados."""
+    random.shuffle(retiradas)
+    return {inserir_mais_barato(rotas, cargas, e, inst) for e in retiradas}
+
+
+def _reparar_arrependimento(
+    rotas: List[List[int]], cargas: List[float], retiradas: List[int], inst: Instancia
+) -> set:
+    """
+    Insercao por arrependimento (regret-2): insere primeiro a entrega com maior diferenca entre a melhor
+    e a segunda melhor opcao de veiculo. So o veiculo que recebeu a entrega tem as opcoes recalculadas.
+    Retorna os veiculos alterados.
+    """
+    opcoes: Dict[int, Dict[int, Tuple[float, int]]] = {
+        e: {v: melhor_posicao_insercao(rotas[v], e, inst) for v in inst.compativeis[e]} for e in retiradas
+    }
+    pendentes = set(retiradas)
+    alterados = set()
+    while pendentes:
+        escolha = None
+        maior_arrependimento = -1.0
+        for e in pendentes:
+            peso = inst.pesos[e]
+            custos = sorted(
+                (custo, v, pos)
+                for v, (custo, pos) in opcoes[e].items()
+                if cargas[v] + peso <= inst.limites[v] + TOLERANCIA_PESO
+            )
+            if not custos:
+                # nao cabe em nenhum veiculo: fica para a insercao com penalidade
+                arrependimento = math.inf
+                melhor = None
+            else:
+                arrependimento = custos[1][0] - custos[0][0] if len(custos) > 1 else math.inf
+                melhor = custos[0]
+            if escolha is None or arrependimento > maior_arrependimento:
+                escolha, maior_arrependimento, opcao = e, arrependimento, melhor
+        pendentes.discard(escolha)
+        if opcao is None:
+            v = inserir_mais_barato(rotas, cargas, escolha, inst)
+        else:
+            _, v, pos = opcao
+            rotas[v].insert(pos, escolha)
+            cargas[v] += inst.pesos[escolha]
+        alterados.add(v)
+        for e in pendentes:
+            if v in opcoes[e]:
+                opcoes[e][v] = melhor_posicao_insercao(rotas[v], e, inst)
+    return alterados
+
+
+_DESTRUICAO = {
+    "aleatoria": _destruir_aleatoria,
+    "relacionada": _destruir_relacionada,
+    "pior_custo": _destruir_pior_custo,
+}
+_REPARO = {
+    "gulosa": _reparar_gulosa,
+    "arrependimento": _reparar_arrependimento,
+}
+
+
+def _custo_total(custos_rota: List[float], cargas: List[float], inst: Instancia, penalidade_peso: float = 10_000.0) -> float:
+    """Distancia das rotas mais a penalidade de excesso de carga (a de tipo nao ocorre: so ha insercao compativel)."""
+    excesso = sum(
+        max(0.0, carga - limite - TOLERANCIA_PESO) for carga, limite in zip(cargas, inst.limites)
+    )
+    return sum(custos_rota) + excesso * penalidade_peso
+
+
+def encontrar_melhor_rota_alns(
+    matriz_distancias: MatrizDistancias,
+    entregas: List[Entrega],
+    veiculos: List[Veiculo],
+    deposito: int = 0,
+    tempo_limite_s: Optional[float] = 10.0,
+    iteracoes: int = 20000,
+    paciencia: Optional[int] = None,
+    fracao_destruicao: float = 0.15,
+    temperatura_inicial: float = 0.05,
+    modo_busca_local: str = "melhor",
+    compatibilidade: Optional[Dict[int, List[int]]] = None,
+    vizinhos_k: int = 10,
+    coordenadas: Optional[Sequence[Tuple[float, float]]] = None,
+    indice_espacial: Optional[IndiceEspacial] = None,
+    ao_progresso: Optional[AoProgresso] = None,
+    plano_anterior: Optional[Dict[str, Sequence[str]]] = None,
+    linhas_densas: bool = False,
+) -> Dict[str, object]:
+    """
+    Busca adaptativa em vizinhanca grande (ALNS) com aceitacao por recozimento simulado.
+    Parte do Clarke-Wright (ou do `plano_anterior`, como em `encontrar_melhor_rota_genetico`) e, a cada
+    iteracao, retira ate `fracao_destruicao` das entregas por um operador de OPERADORES_DESTRUICAO e as
+    reinsere por um de OPERADORES_REPARO, sorteados por pesos que se adaptam ao desempenho de cada um.
+    O reparo so insere em veiculos compativeis com o tipo de carga e com carga disponivel; as rotas
+    alteradas passam pelo 2-opt (`modo_busca_local`).
+    `temperatura_inicial` e a piora relativa aceita com 50% de chance no inicio; a temperatura cai ate
+    o fim de `tempo_limite_s` segundos ou de `iteracoes` (o que vier primeiro). `paciencia` encerra apos
+    essa quantidade de iteracoes sem melhorar a melhor solucao.
+    `ao_progresso` recebe {"iteracao", "iteracoes", "melhor_custo"} a cada segmento de iteracoes.
+    `linhas_densas` como em `encontrar_melhor_rota_genetico`.
+
+    Retorna o formato de `encontrar_melhor_rota_genetico`, com "geracoes_executadas" contando iteracoes.
+    """
+    if modo_busca_local not in MODOS_BUSCA_LOCAL:
+        raise ValueError(f"modo_busca_local invalido: {modo_busca_local}. Use um de {MODOS_BUSCA_LOCAL}.")
+    if tempo_limite_s is not None and tempo_limite_s <= 0:
+        raise ValueError("tempo_limite_s deve ser maior que zero.")
+    if iteracoes < 1:
+        raise ValueError("iteracoes deve ser maior ou igual a 1.")
+    if paciencia is not None and paciencia < 1:
+        raise ValueError("paciencia deve ser maior ou igual a 1.")
+    if not 0 < fracao_destruicao <= 1:
+        raise ValueError("fracao_destruicao deve estar entre 0 e 1.")
+    if temperatura_inicial < 0:
+        raise ValueError("temperatura_inicial nao pode ser negativa.")
+
+    if not entregas:
+        return {
+            "rotas_por_veiculo": {v.id: [] for v in veiculos},
+            "distancia_total_km": 0.0,
+            "custo_fitness": 0.0,
+            "criterio_parada": "geracoes",
+            "geracoes_executadas": 0,
+        }
+
+    inicio = time.time()
+    parada = CriterioParada(
+        paciencia=paciencia, prazo=inicio + tempo_limite_s if tempo_limite_s is not None else None
+    )
+    matriz_busca = matriz_simetrica(matriz_distancias)
+    pontos = [int(e.indice_matriz) for e in entregas]
+    if indice_espacial is None and coordenadas is not None:
+        indice_espacial = IndiceEspacial(coordenadas)
+    k_consulta = max(vizinhos_k, VIZINHOS_ECONOMIA)
+    if indice_espacial is not None:
+        candidatos = vizinhos_por_indice(indice_espacial, pontos, k_consulta)
+    else:
+        candidatos = vizinhos_mais_proximos(matriz_busca, pontos, k_consulta)
+    inst = montar_instancia(
+        linhas_matriz(matriz_busca, linhas_densas),
+        entregas,
+        veiculos,
+        deposito,
+        compatibilidade,
+        [v[:vizinhos_k] for v in candidatos],
+    )
+
+    if plano_anterior:
+        rotas, resumo_plano = rotas_do_plano_anterior(inst, plano_anterior)
+    else:
+        resumo_plano = None
+        sementes = sementes_construtivas(inst, matriz_busca, 1, candidatos, coordenadas)
+        rotas = sementes[0] if sementes else criar_solucao_inicial(inst).rotas
+    rotas = [busca_local_2opt(rota, inst, modo_busca_local)[0] for rota in rotas]
+    cargas = [sum(inst.pesos[e] for e in rota) for rota in rotas]
+    custos_rota = [avaliar_rota(rota, inst) for rota in rotas]
+    custo = _custo_total(custos_rota, cargas, inst)
+    melhor_rotas, melhor_custo = [r[:] for r in rotas], custo
+
+    n = len(entregas)
+    q_max = max(1, min(n, round(n * fracao_destruicao)))
+    q_min = min(q_max, max(1, round(q_max * 0.3)))
+    temperatura_0 = temperatura_inicial * custo / math.log(2) if custo > 0 else 0.0
+    nomes_destruicao, nomes_reparo = list(_DESTRUICAO), list(_REPARO)
+    pesos_destruicao = [1.0] * len(nomes_destruicao)
+    pesos_reparo = [1.0] * len(nomes_reparo)
+    pontos_destruicao = [0.0] * len(nomes_destruicao)
+    pontos_reparo = [0.0] * len(nomes_reparo)
+    usos_destruicao = [0] * len(nomes_destruicao)
+    usos_reparo = [0] * len(nomes_reparo)
+    parada.atualizar(melhor_custo, 0)
+
+    criterio = None
+    executadas = 0
+    while executadas < iteracoes:
+        # fracao percorrida do orcamento (prazo ou iteracoes) define a temperatura
+        progresso = executadas / iteracoes
+        if tempo_limite_s is not None:
+            progresso = max(progresso, (time.time() - inicio) / tempo_limite_s)
+        temperatura = temperatura_0 * _RESFRIAMENTO_FINAL ** min(progresso, 1.0)
+
+        d = random.choices(range(len(nomes_destruicao)), weights=pesos_destruicao)[0]
+        r = random.choices(range(len(nomes_reparo)), weights=pesos_reparo)[0]
+        q = random.randint(q_min, q_max)
+        retiradas = _DESTRUICAO[nomes_destruicao[d]](rotas, q, inst)
+        fora = set(retiradas)
+        veiculo_de = _posicoes(rotas, n)
+        alterados = {veiculo_de[e] for e in retiradas}
+        novas = [[e for e in rota if e not in fora] if v in alterados else rota[:] for v, rota in enumerate(rotas)]
+        novas_cargas = cargas[:]
+        for e in retiradas:
+            novas_cargas[veiculo_de[e]] -= inst.pesos[e]
+        alterados |= _REPARO[nomes_reparo[r]](novas, novas_cargas, retiradas, inst)
+
+        novos_custos = custos_rota[:]
+        for v in alterados:
+            novas[v], novos_custos[v] = busca_local_2opt(novas[v], inst, modo_busca_local)
+        novo_custo = _custo_total(novos_custos, novas_cargas, inst)
+
+        pontos_iteracao = 0.0
+        if novo_custo < melhor_custo - 1e-9:
+            pontos_iteracao = _PONTOS_NOVA_MELHOR
+            melhor_rotas, melhor_custo = [rota[:] for rota in novas], novo_custo
+        elif novo_custo < custo - 1e-9:
+            pontos_iteracao = _PONTOS_MELHORA
+        elif temperatura > 0 and random.random() < math.exp(-(novo_custo - custo) / temperatura):
+            pontos_iteracao = _PONTOS_ACEITA
+        if pontos_iteracao > 0 or novo_custo <= custo:
+            rotas, cargas, custos_rota, custo = novas, novas_cargas, novos_custos, novo_custo
+
+        pontos_destruicao[d] += pontos_iteracao
+        pontos_reparo[r] += pontos_iteracao
+        usos_destruicao[d] += 1
+        usos_reparo[r] += 1
+        executadas += 1
+
+        criterio = parada.atualizar(melhor_custo)
+        if executadas % _SEGMENTO == 0:
+            for pesos, pontos_op, usos in (
+                (pesos_destruicao, pontos_destruicao, usos_destruicao),
+                (pesos_reparo, pontos_reparo, usos_reparo),
+            ):
+                for k in range(len(pesos)):
+                    if usos[k]:
+                        pesos[k] = max(0.05, (1 - _REACAO) * pesos[k] + _REACAO * pontos_op[k] / usos[k])
+                    pontos_op[k] = 0.0
+                    usos[k] = 0
+            if ao_progresso is not None:
+                ao_progresso({"iteracao": executadas, "iteracoes": iteracoes, "melhor_custo": float(melhor_custo)})
+        if criterio is not None:
+            break
+
+    melhor = Cromossomo(melhor_rotas, inst)
+    distancia_total = orientar_rotas(melhor.rotas, inst, matriz_distancias, matriz_busca)
+    resultado = {
+        "rotas_por_veiculo": decodificar(melhor, inst),
+        "distancia_total_km": distancia_total,
+        "custo_fitness": calcular_fitness(melhor, inst),
+        "criterio_parada": criterio or "geracoes",
+        "geracoes_executadas": executadas,
+    }
+    if resumo_plano is not None:
+        resultado["plano_anterior"] = resumo_plano
+    return resultado
@@ -0,0 +1,31 @@
+from typing import Dict, Tuple
+
+from form_otimizacao_rota import MotorOtimizacao, encontrar_melhor_rota_genetico
+from motor_alns import encontrar_melhor_rota_alns
+
+MOTOR_PADRAO = "genetico"
+
+# Motores disponiveis para parametros["motor"]. Todos recebem (matriz_distancias, entregas, veiculos,
+# deposito, **parametros), aceitam os argumentos nomeados compatibilidade, coordenadas, indice_espacial,
+# ao_progresso e plano_anterior, e retornam o formato de `encontrar_melhor_rota_genetico`.
+_MOTORES: Dict[str, MotorOtimizacao] = {
+    "genetico": encontrar_melhor_rota_genetico,
+    "alns": encontrar_melhor_rota_alns,
+}
+
+
+def registrar_motor(nome: str, motor: MotorOtimizacao) -> None:
+    """Registra (ou substitui) um motor; deve ser uma funcao de modulo para rodar nos processos dos clusters."""
+    _MOTORES[nome] = motor
+
+
+def motores_disponiveis() -> Tuple[str, ...]:
+    return tuple(_MOTORES)
+
+
+def obter_motor(nome: str) -> MotorOtimizacao:
+    """Funcao do motor `nome`; levanta ValueError se nao estiver registrado."""
+    motor = _MOTORES.get(nome)
+    if motor is None:
+        raise ValueError(f"motor invalido: {nome}. Use um de {motores_disponiveis()}.")
+    return motor
@@ -0,0 +1,181 @@
+import json
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from banco_dados import BancoDados
+from cache_distancias import CacheDistancias
+from form_otimizacao_rota import (
+    MatrizCondensada,
+    MatrizDistancias,
+    gerar_distancias_numpy,
+    gerar_matriz_condensada,
+)
+
+Coordenadas = Sequence[Tuple[float, float]]
+
+# metrica usada como custo pelo otimizador: km ou minutos de viagem
+METRICAS = ("distancia", "duracao")
+
+
+class ErroProvedorDistancias(Exception):
+    pass
+
+
+class ProvedorHaversine:
+    """Distancia em linha reta; a duracao e estimada por uma velocidade media fixa."""
+
+    def __init__(self, metrica: str = "distancia", velocidade_media_kmh: float = 40.0):
+        if metrica not in METRICAS:
+            raise ValueError(f"metrica invalida: {metrica}. Use uma de {METRICAS}.")
+        self.metrica = metrica
+        self.velocidade_media_kmh = velocidade_media_kmh
+
+    @property
+    def fonte(self) -> str:
+        return "haversine" if self.metrica == "distancia" else "haversine:duracao"
+
+    def matrizes(self, origens: Coordenadas, destinos: Coordenadas) -> Tuple[np.ndarray, np.ndarray]:
+        """(distancias em km, duracoes em minutos) de cada origem para cada destino."""
+        km = gerar_distancias_numpy(origens, destinos)
+        return km, km / self.velocidade_media_kmh * 60.0
+
+    def distancias(self, origens: Coordenadas, destinos: Coordenadas) -> np.ndarray:
+        km, minutos = self.matrizes(origens, destinos)
+        return km if self.metrica == "distancia" else minutos
+
+    def matriz(self, coordenadas: Coordenadas) -> MatrizCondensada:
+        """Matriz simetrica no formato condensado (float32, so o triangulo superior)."""
+        km = gerar_matriz_condensada(coordenadas)
+        if self.metrica == "distancia":
+            return km
+        return MatrizCondensada(km.n, km.dados / self.velocidade_media_kmh * 60.0)
+
+
+class ProvedorOSRM:
+    """
+    Matrizes de distancia/duracao por estrada via endpoint `/table` compativel com OSRM
+    (ex.: servidor OSRM local ou `servidor_osrm_local.py` em testes).
+    Matrizes grandes sao divididas em blocos de origens x destinos com no maximo `max_locais`
+    coordenadas por requisicao (o `--max-table-size` do servidor), enviados em `requisicoes_paralelas`.
+    Pares sem rota (null na resposta) recebem a estimativa em linha reta.
+    Falhas de rede ou respostas com code != "Ok" levantam ErroProvedorDistancias.
+    """
+
+    def __init__(
+        self,
+        url_base: str,
+        perfil: str = "driving",
+        metrica: str = "distancia",
+        max_locais: int = 100,
+        timeout_s: float = 15.0,
+        requisicoes_paralelas: int = 4,
+    ):
+        if metrica not in METRICAS:
+            raise ValueError(f"metrica invalida: {metrica}. Use uma de {METRICAS}.")
+        if max_locais < 2:
+            raise ValueError("max_locais deve ser maior ou igual a 2.")
+        self.url_base = url_base.rstrip("/")
+        self.perfil = perfil
+        self.metrica = metrica
+        self.max_locais = max_locais
+        self.timeout_s = timeout_s
+        self.requisicoes_paralelas = max(1, requisicoes_paralelas)
+        self._reserva = ProvedorHaversine(metrica)
+
+    @property
+    def fonte(self) -> str:
+        return f"osrm:{self.perfil}" if self.metrica == "distancia" else f"osrm:{self.perfil}:duracao"
+
+    def _requisitar_bloco(self, origens: Coordenadas, destinos: Coordenadas) -> Tuple[np.ndarray, np.ndarray]:
+        locais = ";".join(f"{lng:.6f},{lat:.6f}" for lat, lng in list(origens) + list(destinos))
+        fontes = ";".join(str(i) for i in range(len(origens)))
+        alvos = ";".join(str(len(origens) + j) for j in range(len(destinos)))
+        url = (
+            f"{self.url_base}/table/v1/{self.perfil}/{locais}"
+            f"?sources={fontes}&destinations={alvos}&annotations=distance,duration"
+        )
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout_s) as resposta:
+                dados = json.loads(resposta.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                dados = json.loads(e.read().decode("utf-8"))
+            except Exception:
+                raise ErroProvedorDistancias(f"HTTP {e.code} em /table") from e
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise ErroProvedorDistancias(f"falha ao consultar /table: {e}") from e
+
+        if dados.get("code") != "Ok":
+            raise ErroProvedorDistancias(f"/table respondeu {dados.get('code')}: {dados.get('message', '')}")
+        try:
+            metros = np.array(dados["distances"], dtype=np.float64)  # null vira nan
+            segundos = np.array(dados["durations"], dtype=np.float64)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ErroProvedorDistancias(f"resposta de /table sem distances/durations: {e}") from e
+        forma = (len(origens), len(destinos))
+        if metros.shape != forma or segundos.shape != forma:
+            raise ErroProvedorDistancias(f"/table retornou matriz {metros.shape}, esperado {forma}")
+        return metros / 1000.0, segundos / 60.0
+
+    def matrizes(self, origens: Coordenadas, destinos: Coordenadas) -> Tuple[np.ndarray, np.ndarray]:
+        """(distancias em km, duracoes em minutos) de cada origem para cada destino."""
+        origens, destinos = list(origens), list(destinos)
+        km = np.empty((len(origens), len(destinos)))
+        minutos = np.empty_like(km)
+        if not origens or not destinos:
+            return km, minutos
+
+        lado = self.max_locais // 2
+        blocos = [
+            (slice(i, i + lado), slice(j, j + lado))
+            for i in range(0, len(origens), lado)
+            for j in range(0, len(destinos), lado)
+        ]
+        with ThreadPoolExecutor(max_workers=min(self.requisicoes_paralelas, len(blocos))) as pool:
+            respostas = pool.map(lambda b: self._requisitar_bloco(origens[b[0]], destinos[b[1]]), blocos)
+            for (linhas, colunas), (km_bloco, min_bloco) in zip(blocos, respostas):
+                km[linhas, colunas] = km_bloco
+                minutos[linhas, colunas] = min_bloco
+
+        sem_rota = np.isnan(km) | np.isnan(minutos)
+        if sem_rota.any():
+            km_reta, min_reta = self._reserva.matrizes(origens, destinos)
+            km[sem_rota] = km_reta[sem_rota]
+            minutos[sem_rota] = min_reta[sem_rota]
+        return km, minutos
+
+    def distancias(self, origens: Coordenadas, destinos: Coordenadas) -> np.ndarray:
+        km, minutos = self.matrizes(origens, destinos)
+        return km if self.metrica == "distancia" else minutos
+
+    def matriz(self, coordenadas: Coordenadas) -> np.ndarray:
+        m = self.distancias(coordenadas, coordenadas)
+        np.fill_diagonal(m, 0.0)
+        return np.ascontiguousarray(m)
+
+
+def montar_matriz_distancias(
+    coordenadas: Coordenadas,
+    provedor: Optional[object] = None,
+    banco: Optional[BancoDados] = None,
+) -> Tuple[MatrizDistancias, str]:
+    """
+    Matriz NxN pelo `provedor` (haversine se omitido), passando pelo cache persistente quando `banco`
+    e informado. Se o provedor falhar, usa a matriz em linha reta (sem gravar no cache).
+    Retorna a matriz e a fonte efetivamente usada.
+    """
+    provedor = provedor or ProvedorHaversine()
+    try:
+        if banco is not None:
+            matriz = CacheDistancias(banco, provedor.fonte).montar_matriz(coordenadas, provedor.distancias)
+        else:
+            matriz = provedor.matriz(coordenadas)
+        return matriz, provedor.fonte
+    except ErroProvedorDistancias as e:
+        print("Provedor de distancias indisponivel, usando haversine:", e)
+        reserva = ProvedorHaversine(getattr(provedor, "metrica", "distancia"))
+        return reserva.matriz(coordenadas), reserva.fonte
@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+STATUS_JOB = ("na_fila", "executando", "concluido", "erro")
+
+# Tarefa de otimizacao: recebe o callback de progresso e retorna o resultado (dict serializavel).
+TarefaOtimizacao = Callable[[Callable[[Dict[str, Any]], None]], Dict[str, Any]]
+
+
+class FilaJobsCheia(Exception):
+    pass
+
+
+class ServicoJobsOtimizacao:
+    """
+    Executa otimizacoes de rota em segundo plano, fora da requisicao HTTP.
+    Cada job recebe um id, roda em um pool de `max_execucoes` threads (o algoritmo pode abrir o proprio
+    pool de processos) e guarda status, progresso e resultado em memoria. Jobs terminados sao
+    descartados apos `ttl_s` segundos; com `max_pendentes` jobs na fila ou executando, novos jobs sao
+    recusados com FilaJobsCheia.
+    """
+
+    def __init__(self, max_execucoes: int = 2, ttl_s: float = 3600.0, max_pendentes: int = 20):
+        self.ttl_s = ttl_s
+        self.max_pendentes = max_pendentes
+        self._pool = ThreadPoolExecutor(max_workers=max_execucoes, thread_name_prefix="otimizacao")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._trava = threading.Lock()
+
+    def submeter(self, tarefa: TarefaOtimizacao, dono: Optional[Any] = None) -> str:
+        """Agenda a `tarefa` e retorna o id do job. `dono` (ex.: id do usuario) restringe as consultas."""
+        agora = time.time()
+        with self._trava:
+            self._limpar_expirados(agora)
+            pendentes = sum(1 for j in self._jobs.values() if j["status"] in ("na_fila", "executando"))
+            if pendentes >= self.max_pendentes:
+                raise FilaJobsCheia("Muitas otimizacoes em andamento. Tente novamente em instantes.")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "dono": dono,
+                "status": "na_fila",
+                "criado_em": agora,
+                "iniciado_em": None,
+                "concluido_em": None,
+                "progresso": {},
+                "resultado": None,
+                "erro": None,
+                "codigo_erro": None,
+            }
+        self._pool.submit(self._executar, job_id, tarefa)
+        return job_id
+
+    def _executar(self, job_id: str, tarefa: TarefaOtimizacao) -> None:
+        with self._trava:
+            job = self._jobs[job_id]
+            job["status"] = "executando"
+            job["iniciado_em"] = time.time()
+
+        def ao_progresso(progresso: Dict[str, Any]) -> None:
+            with self._trava:
+                job["progresso"] = dict(progresso)
+
+        try:
+            resultado = tarefa(ao_progresso)
+        except ValueError as e:
+            erro, codigo = str(e), 400
+        except Exception as e:
+            print("Erro ao executar otimizacao em segundo plano:", e)
+            erro, codigo = "Falha interna ao otimizar rotas.", 500
+        else:
+            erro, codigo = None, None
+
+        with self._trava:
+            job["concluido_em"] = time.time()
+            if erro is None:
+                job["status"] = "concluido"
+                job["resultado"] = resultado
+            else:
+                job["status"] = "erro"
+                job["erro"] = erro
+                job["codigo_erro"] = codigo
+
+    def _limpar_expirados(self, agora: float) -> None:
+        expirados = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job["concluido_em"] is not None and agora - job["concluido_em"] > self.ttl_s
+        ]
+        for job_id in expirados:
+            del self._jobs[job_id]
+
+    def _buscar(self, job_id: str, dono: Optional[Any]) -> Optional[Dict[str, Any]]:
+        self._limpar_expirados(time.time())
+        job = self._jobs.get(job_id)
+        if job is None or (job["dono"] is not None and job["dono"] != dono):
+            return None
+        return job
+
+    def consultar(self, job_id: str, dono: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """Status e progresso do job (sem o resultado); None se nao existir ou for de outro dono."""
+        with self._trava:
+            job = self._buscar(job_id, dono)
+            if job is None:
+                return None
+            inicio = job["iniciado_em"]
+            fim = job["concluido_em"] or time.time()
+            return {
+                "job_id": job["id"],
+                "status": job["status"],
+                "progresso": dict(job["progresso"]),
+                "tempo_decorrido_s": round(fim - inicio, 1) if inicio is not None else 0.0,
+                "erro": job["erro"],
+            }
+
+    def resultado(self, job_id: str, dono: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """Job completo, com "resultado" (se concluido) e "codigo_erro" (se falhou); None se nao existir."""
+        with self._trava:
+            job = self._buscar(job_id, dono)
+            return dict(job) if job is not None else None
@@ -0,0 +1,93 @@
+"""
+Servidor substituto do endpoint `/table` do OSRM para desenvolvimento e testes, sem mapa de ruas:
+distancia = linha reta x FATOR_CIRCUITO e duracao a VELOCIDADE_KMH.
+
+    python servidor_osrm_local.py --porta 5001 --max-locais 100
+
+e configure OSRM_URL = "http://localhost:5001" em main.py.
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from form_otimizacao_rota import gerar_distancias_numpy
+
+FATOR_CIRCUITO = 1.3
+VELOCIDADE_KMH = 50.0
+
+
+def responder_tabela(caminho: str, max_locais: int, sem_rota: Iterable[Tuple[float, float]] = ()):
+    """
+    Retorna (status HTTP, corpo JSON) para /table/v1/{perfil}/{lng,lat;...}?sources&destinations.
+    Pares com um dos pontos (lat, lng) de `sem_rota` saem null, como um local fora da malha de ruas.
+    """
+    url = urlsplit(caminho)
+    partes = url.path.strip("/").split("/")
+    if len(partes) != 4 or partes[0] != "table":
+        return 400, {"code": "InvalidUrl", "message": "Use /table/v1/{perfil}/{coordenadas}"}
+    try:
+        locais = [tuple(float(v) for v in par.split(",")) for par in unquote(partes[3]).split(";")]
+        pontos = [(lat, lng) for lng, lat in locais]
+    except ValueError:
+        return 400, {"code": "InvalidQuery", "message": "Coordenadas invalidas"}
+    if len(pontos) > max_locais:
+        return 400, {"code": "TooBig", "message": "Too many table coordinates"}
+
+    query = parse_qs(url.query)
+
+    def indices(chave):
+        valor = query.get(chave, ["all"])[0]
+        return list(range(len(pontos))) if valor == "all" else [int(i) for i in valor.split(";")]
+
+    try:
+        fontes, destinos = indices("sources"), indices("destinations")
+        km = gerar_distancias_numpy([pontos[i] for i in fontes], [pontos[j] for j in destinos]) * FATOR_CIRCUITO
+    except (ValueError, IndexError):
+        return 400, {"code": "InvalidOptions", "message": "sources/destinations invalidos"}
+    distancias = (km * 1000.0).round(1).tolist()
+    duracoes = (km / VELOCIDADE_KMH * 3600.0).round(1).tolist()
+    isolados = {(round(lat, 6), round(lng, 6)) for lat, lng in sem_rota}
+    if isolados:
+        for a, i in enumerate(fontes):
+            for b, j in enumerate(destinos):
+                if i != j and ({pontos[i], pontos[j]} & isolados):
+                    distancias[a][b] = duracoes[a][b] = None
+    return 200, {"code": "Ok", "distances": distancias, "durations": duracoes}
+
+
+def criar_servidor(
+    host: str = "127.0.0.1",
+    porta: int = 5001,
+    max_locais: int = 100,
+    sem_rota: Iterable[Tuple[float, float]] = (),
+) -> ThreadingHTTPServer:
+    """Servidor /table (porta 0: porta livre, ver `server_address`); `sem_rota` como em responder_tabela."""
+    sem_rota = list(sem_rota)
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, corpo = responder_tabela(self.path, max_locais, sem_rota)
+            dados = json.dumps(corpo).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((host, porta), Manipulador)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Substituto local do /table do OSRM.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=5001)
+    parser.add_argument("--max-locais", type=int, default=100)
+    args = parser.parse_args()
+    servidor = criar_servidor(args.host, args.porta, args.max_locais)
+    print(f"Servidor /table em http://{args.host}:{args.porta}")
+    servidor.serve_forever()
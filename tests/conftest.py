@@ -0,0 +1,5 @@
+import os
+import sys
+
+# os modulos do projeto ficam na raiz do repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
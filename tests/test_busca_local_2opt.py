@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+import pytest
+
+import form_otimizacao_rota as otimizacao
+from form_otimizacao_rota import Entrega, Veiculo
+
+
+def _custo_caminho(caminho, matriz):
+    return sum(matriz[a][b] for a, b in zip(caminho, caminho[1:]))
+
+
+def _instancia(semente, n_paradas, com_vizinhos, simetrica_aleatoria):
+    rng = np.random.default_rng(semente)
+    if simetrica_aleatoria:
+        # simetrica, mas sem desigualdade triangular
+        matriz = rng.uniform(1, 100, size=(n_paradas + 1, n_paradas + 1))
+        matriz = (matriz + matriz.T) / 2
+        np.fill_diagonal(matriz, 0.0)
+    else:
+        pontos = [(-27.37 + a, -53.40 + b) for a, b in rng.uniform(-0.3, 0.3, size=(n_paradas + 1, 2))]
+        matriz = otimizacao.gerar_matriz_distancias_numpy(pontos)
+    entregas = [Entrega(id=str(i), peso=1.0, tipo_carga=1, indice_matriz=i) for i in range(1, n_paradas + 1)]
+    pontos_entregas = [e.indice_matriz for e in entregas]
+    vizinhos = otimizacao.vizinhos_mais_proximos(matriz, pontos_entregas, 8) if com_vizinhos else None
+    inst = otimizacao.montar_instancia(
+        otimizacao.linhas_matriz(matriz), entregas, [Veiculo("V", 1e9, 1)], 0, None, vizinhos
+    )
+    return inst, matriz
+
+
+@pytest.mark.parametrize("modo", otimizacao.MODOS_BUSCA_LOCAL)
+@pytest.mark.parametrize(
+    "n_paradas, com_vizinhos",
+    [(12, False), (35, False), (60, True), (90, True)],
+)
+@pytest.mark.parametrize("simetrica_aleatoria", [False, True])
+def test_delta_de_cada_movimento_aceito_igual_ao_recalculo_da_rota(
+    monkeypatch, modo, n_paradas, com_vizinhos, simetrica_aleatoria
+):
+    inverter = otimizacao._inverter_trecho
+    for semente in range(5):
+        inst, matriz = _instancia(semente, n_paradas, com_vizinhos, simetrica_aleatoria)
+        movimentos = []
+
+        def inverter_conferindo(caminho, rota, i, j):
+            antes = _custo_caminho(caminho, matriz)
+            a, b, c, d = caminho[i], caminho[i + 1], caminho[j], caminho[j + 1]
+            delta = matriz[a][c] + matriz[b][d] - matriz[a][b] - matriz[c][d]
+            inverter(caminho, rota, i, j)
+            assert caminho[1:-1] == [inst.pontos[e] for e in rota]
+            movimentos.append((delta, _custo_caminho(caminho, matriz) - antes))
+
+        monkeypatch.setattr(otimizacao, "_inverter_trecho", inverter_conferindo)
+        rota_inicial = random.Random(semente).sample(range(n_paradas), n_paradas)
+        rota, custo = otimizacao.busca_local_2opt(rota_inicial, inst, modo)
+
+        assert movimentos, "nenhum movimento aceito"
+        for delta, variacao in movimentos:
+            assert delta < 0
+            assert variacao == pytest.approx(delta, abs=1e-7)
+        assert sorted(rota) == list(range(n_paradas))
+        caminho_final = [0] + [inst.pontos[e] for e in rota] + [0]
+        assert custo == pytest.approx(_custo_caminho(caminho_final, matriz), abs=1e-7)
+        caminho_inicial = [0] + [inst.pontos[e] for e in rota_inicial] + [0]
+        assert custo == pytest.approx(_custo_caminho(caminho_inicial, matriz) + sum(d for d, _ in movimentos), abs=1e-6)
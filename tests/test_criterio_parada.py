@@ -0,0 +1,20 @@
+import random
+
+import pytest
+
+from form_otimizacao_rota import Entrega, Veiculo, encontrar_melhor_rota_genetico, gerar_matriz_distancias_numpy
+
+
+@pytest.mark.parametrize("ilhas", [1, 2])
+def test_paciencia_conta_desde_a_populacao_inicial_com_e_sem_ilhas(ilhas):
+    # otimo ja na populacao inicial: nenhuma geracao melhora, entao para apos `paciencia` geracoes
+    coordenadas = [(-27.37, -53.40), (-27.30, -53.30), (-27.40, -53.50)]
+    matriz = gerar_matriz_distancias_numpy(coordenadas)
+    entregas = [Entrega("1", 1, 1, 1), Entrega("2", 1, 1, 2)]
+    veiculos = [Veiculo("A", 10, 1)]
+    random.seed(0)
+    resultado = encontrar_melhor_rota_genetico(
+        matriz, entregas, veiculos, ilhas=ilhas, paciencia=5, intervalo_migracao=5, geracoes=100, tamanho_populacao=8
+    )
+    assert resultado["criterio_parada"] == "sem_melhoria"
+    assert resultado["geracoes_executadas"] == 5
@@ -0,0 +1,188 @@
+import random
+
+import numpy as np
+import pytest
+
+import provedor_distancias
+from cache_distancias import CacheDistancias
+from form_otimizacao_rota import (
+    Entrega,
+    Veiculo,
+    encontrar_melhor_rota_genetico,
+    encontrar_melhor_rota_por_clusters,
+    gerar_distancias_numpy,
+    gerar_matriz_distancias_numpy,
+)
+from form_pedidos_importados import ServicoPedidosImportados
+
+DEPOSITO = (-27.37, -53.40)
+
+
+def _instancia_apertada(semente, n_entregas=600, n_veiculos=10, folga=1.12):
+    """Frota com capacidade total = demanda x `folga`, acima do limiar de decomposicao automatica."""
+    rng = random.Random(semente)
+    coordenadas = [DEPOSITO] + [
+        (DEPOSITO[0] + rng.uniform(-0.5, 0.5), DEPOSITO[1] + rng.uniform(-0.5, 0.5)) for _ in range(n_entregas)
+    ]
+    entregas = [Entrega(id=str(i), peso=rng.uniform(5, 50), tipo_carga=1, indice_matriz=i) for i in range(1, n_entregas + 1)]
+    total = sum(e.peso for e in entregas)
+    veiculos = [Veiculo(f"V{k}", total * folga / n_veiculos, 1) for k in range(n_veiculos)]
+    return coordenadas, entregas, veiculos
+
+
+def _conferir_solucao(resultado, entregas, veiculos):
+    atendidas = [e for rota in resultado["rotas_por_veiculo"].values() for e in rota]
+    assert sorted(atendidas) == sorted(e.id for e in entregas)
+    peso = {e.id: e.peso for e in entregas}
+    limite = {v.id: v.limite_peso for v in veiculos}
+    for placa, rota in resultado["rotas_por_veiculo"].items():
+        assert sum(peso[e] for e in rota) <= limite[placa] + 1e-6
+
+
+@pytest.mark.parametrize("modo", ["setores", "kmeans"])
+@pytest.mark.parametrize("semente", [0, 1])
+def test_clusters_resolvem_frota_apertada(modo, semente):
+    random.seed(semente)
+    coordenadas, entregas, veiculos = _instancia_apertada(semente)
+    resultado = encontrar_melhor_rota_por_clusters(
+        coordenadas, entregas, veiculos, modo=modo, processos=1, geracoes=3, tamanho_populacao=8
+    )
+    assert len(resultado["clusters"]) > 1
+    _conferir_solucao(resultado, entregas, veiculos)
+
+
+def _motor_com_minimo_de_veiculos(matriz, entregas, veiculos, minimo_veiculos=1, **parametros):
+    if len(veiculos) < minimo_veiculos:
+        raise ValueError("Nenhum veiculo suporta a entrega (peso ou tipo de carga).")
+    return encontrar_melhor_rota_genetico(matriz, entregas, veiculos, **parametros)
+
+
+@pytest.mark.parametrize("minimo_veiculos, clusters_finais", [(3, 2), (10, 1)])
+def test_cluster_inviavel_e_fundido_ou_resolvido_sem_decomposicao(minimo_veiculos, clusters_finais):
+    random.seed(0)
+    coordenadas, entregas, veiculos = _instancia_apertada(0)
+    resultado = encontrar_melhor_rota_por_clusters(
+        coordenadas,
+        entregas,
+        veiculos,
+        processos=1,
+        motor=_motor_com_minimo_de_veiculos,
+        minimo_veiculos=minimo_veiculos,
+        geracoes=3,
+        tamanho_populacao=8,
+    )
+    assert len(resultado["clusters"]) == clusters_finais
+    _conferir_solucao(resultado, entregas, veiculos)
+
+
+def test_cluster_inviavel_sem_solucao_levanta_value_error():
+    random.seed(0)
+    coordenadas, entregas, veiculos = _instancia_apertada(0)
+    with pytest.raises(ValueError):
+        encontrar_melhor_rota_por_clusters(
+            coordenadas,
+            entregas,
+            veiculos,
+            processos=1,
+            motor=_motor_com_minimo_de_veiculos,
+            minimo_veiculos=len(veiculos) + 1,
+            geracoes=3,
+            tamanho_populacao=8,
+        )
+
+
+class _ProvedorInstavel:
+    """Provedor por estrada que falha nas chamadas de numero em `falhas` (1 = primeira)."""
+
+    fonte = "osrm:driving"
+
+    def __init__(self, falhas):
+        self.chamadas = 0
+        self.falhas = set(falhas)
+
+    def matriz(self, coordenadas):
+        self.chamadas += 1
+        if self.chamadas in self.falhas:
+            raise OSError("servidor indisponivel")
+        return gerar_matriz_distancias_numpy(coordenadas) * 1.3
+
+
+@pytest.mark.parametrize(
+    "falhas, fonte_esperada",
+    [((), "osrm:driving"), ((2,), "haversine+osrm:driving"), ((1, 2, 3, 4), "haversine")],
+)
+def test_fonte_distancias_reflete_matrizes_usadas_nos_clusters(falhas, fonte_esperada):
+    random.seed(0)
+    coordenadas, entregas, veiculos = _instancia_apertada(0)
+    resultado = encontrar_melhor_rota_por_clusters(
+        coordenadas,
+        entregas,
+        veiculos,
+        processos=1,
+        provedor_distancias=_ProvedorInstavel(falhas),
+        geracoes=2,
+        tamanho_populacao=6,
+    )
+    assert resultado["fonte_distancias"] == fonte_esperada
+
+
+class _CacheEmMemoria(CacheDistancias):
+    """DISTANCIA_CACHE num dict compartilhado, no lugar da tabela."""
+
+    pares = {}
+
+    def buscar(self, pontos):
+        matriz = np.full((len(pontos), len(pontos)), np.nan)
+        for i, o in enumerate(pontos):
+            for j, d in enumerate(pontos):
+                matriz[i, j] = self.pares.get((self.fonte, o, d), np.nan)
+        return matriz
+
+    def gravar(self, pares):
+        for o, d, km in pares:
+            self.pares[(self.fonte, o, d)] = km
+        return True
+
+
+class _ProvedorContado:
+    fonte = "osrm:driving"
+    metrica = "distancia"
+
+    def __init__(self):
+        self.chamadas = 0
+
+    def distancias(self, origens, destinos):
+        self.chamadas += 1
+        return gerar_distancias_numpy(origens, destinos) * 1.3
+
+    def matriz(self, coordenadas):
+        return self.distancias(coordenadas, coordenadas)
+
+
+def test_clusters_reaproveitam_cache_persistente_na_segunda_execucao(monkeypatch):
+    monkeypatch.setattr(provedor_distancias, "CacheDistancias", _CacheEmMemoria)
+    monkeypatch.setattr(_CacheEmMemoria, "pares", {})
+    provedor = _ProvedorContado()
+    servico = ServicoPedidosImportados(object(), provedor_distancias=provedor)
+    coordenadas, entregas, veiculos = _instancia_apertada(0)
+
+    chamadas = []
+    for _ in range(2):
+        random.seed(0)
+        antes = provedor.chamadas
+        resultado = encontrar_melhor_rota_por_clusters(
+            coordenadas,
+            entregas,
+            veiculos,
+            processos=1,
+            provedor_distancias=provedor,
+            montar_matriz=lambda c: servico._matriz_distancias(c, {}),
+            geracoes=2,
+            tamanho_populacao=6,
+        )
+        chamadas.append(provedor.chamadas - antes)
+        assert resultado["fonte_distancias"] == "osrm:driving"
+        _conferir_solucao(resultado, entregas, veiculos)
+
+    assert chamadas[0] > 0
+    assert chamadas[1] == 0
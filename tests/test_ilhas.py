@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+import form_otimizacao_rota as otimizacao
+from form_otimizacao_rota import Entrega, Veiculo, encontrar_melhor_rota_genetico
+
+
+def test_pools_de_processos_usam_spawn():
+    assert otimizacao._CONTEXTO_PROCESSOS.get_start_method() == "spawn"
+
+
+@pytest.mark.parametrize("condensada", [False, True])
+def test_ilhas_em_processos_spawn_retornam_solucao_valida(condensada):
+    rng = random.Random(0)
+    coordenadas = [(-27.37, -53.40)] + [(-27.37 + rng.uniform(-0.3, 0.3), -53.40 + rng.uniform(-0.3, 0.3)) for _ in range(40)]
+    gerar = otimizacao.gerar_matriz_condensada if condensada else otimizacao.gerar_matriz_distancias_numpy
+    entregas = [Entrega(str(i), rng.uniform(5, 20), 1, i) for i in range(1, 41)]
+    veiculos = [Veiculo(f"V{k}", 200, 1) for k in range(4)]
+
+    random.seed(0)
+    resultado = encontrar_melhor_rota_genetico(
+        gerar(coordenadas), entregas, veiculos, ilhas=2, geracoes=6, intervalo_migracao=3, tamanho_populacao=16
+    )
+
+    atendidas = [e for rota in resultado["rotas_por_veiculo"].values() for e in rota]
+    assert sorted(atendidas) == sorted(e.id for e in entregas)
+    assert resultado["geracoes_executadas"] == 6
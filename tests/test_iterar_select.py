@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+from form_pedidos_importados import ServicoPedidosImportados
+
+
+class _CursorServidorFalso:
+    description = [("n_nota",), ("latitude",)]
+
+    def __init__(self, linhas, falhar_apos):
+        self.linhas = linhas
+        self.falhar_apos = falhar_apos
+
+    def execute(self, sql, params=None):
+        pass
+
+    def __iter__(self):
+        for k, linha in enumerate(self.linhas):
+            if k == self.falhar_apos:
+                raise psycopg2.OperationalError("server closed the connection unexpectedly")
+            yield linha
+
+
+class _BancoFalso:
+    def __init__(self, linhas, falhar_apos=None):
+        self.cursor = _CursorServidorFalso(linhas, falhar_apos)
+
+    @contextmanager
+    def obter_cursor_servidor(self, itersize=2000, rotulo=None):
+        yield None, self.cursor
+
+
+LINHAS = [(1, -27.1), (2, -27.2), (3, -27.3)]
+
+
+def test_fluxo_completo_entrega_todas_as_linhas():
+    servico = ServicoPedidosImportados(_BancoFalso(LINHAS))
+    assert list(servico._iterar_select("SELECT 1", formato="tupla")) == LINHAS
+    assert list(servico._iterar_select("SELECT 1"))[0] == {"n_nota": 1, "latitude": -27.1}
+
+
+def test_falha_no_meio_do_fluxo_e_relancada():
+    servico = ServicoPedidosImportados(_BancoFalso(LINHAS, falhar_apos=2))
+    lidas = []
+    with pytest.raises(psycopg2.OperationalError):
+        for linha in servico._iterar_select("SELECT 1", formato="tupla"):
+            lidas.append(linha)
+    assert lidas == LINHAS[:2]
@@ -0,0 +1,24 @@
+from form_pedidos_importados import ServicoPedidosImportados
+
+
+def _linha(**campos):
+    linha = {"n_nota": 10, "nome_cliente": "Cliente", "cidade": "Cidade", "entregues": False}
+    linha.update(campos)
+    return linha
+
+
+def test_coordenadas_exibidas_vem_das_colunas_numericas():
+    pedido = ServicoPedidosImportados(None)._map_pedido(
+        _linha(latitude=-27.1, longitude=-53.2, coordenadas="-27.9, -53.9")
+    )
+    assert pedido["status"] == "COMPLETO"
+    assert (pedido["latitude"], pedido["longitude"]) == (-27.1, -53.2)
+    assert pedido["coordenadas"] == "-27.100000,-53.200000"
+    assert pedido["coordenadas_legado"] is None
+
+
+def test_string_antiga_so_como_legado_quando_nao_ha_colunas_numericas():
+    pedido = ServicoPedidosImportados(None)._map_pedido(_linha(latitude=None, longitude=None, coordenadas="abc"))
+    assert pedido["status"] == "INCOMPLETO"
+    assert pedido["coordenadas"] is None
+    assert pedido["coordenadas_legado"] == "abc"
@@ -0,0 +1,44 @@
+import pickle
+import random
+
+import numpy as np
+
+import form_otimizacao_rota as otimizacao
+
+
+def _coordenadas(n, semente=0):
+    rng = random.Random(semente)
+    return [(-27.37 + rng.uniform(-0.5, 0.5), -53.40 + rng.uniform(-0.5, 0.5)) for _ in range(n)]
+
+
+def test_linhas_condensadas_leem_o_mesmo_valor_das_linhas_densas():
+    matriz = otimizacao.gerar_matriz_condensada(_coordenadas(60))
+    densas = otimizacao.linhas_matriz(matriz, linhas_densas=True)
+    condensadas = otimizacao.linhas_matriz(matriz)
+
+    assert isinstance(condensadas[0], otimizacao._LinhaCondensada)
+    for i in range(matriz.n):
+        assert [condensadas[i][j] for j in range(matriz.n)] == list(densas[i])
+    assert np.shares_memory(np.frombuffer(condensadas[0].dados, dtype=np.float32), matriz.dados)
+
+
+def test_indexacao_da_matriz_condensada_nao_copia_a_linha():
+    coordenadas = _coordenadas(40)
+    matriz = otimizacao.gerar_matriz_condensada(coordenadas)
+    densa = otimizacao.gerar_matriz_distancias_numpy(coordenadas)
+
+    linha = matriz[7]
+    assert isinstance(linha, otimizacao._LinhaCondensada)
+    assert np.shares_memory(np.frombuffer(linha.dados, dtype=np.float32), matriz.dados)
+    for i in (0, 7, 39):
+        np.testing.assert_allclose([matriz[i][j] for j in range(40)], densa[i], rtol=1e-6)
+        np.testing.assert_allclose(np.asarray(matriz[i]), densa[i], rtol=1e-6)
+
+
+def test_matriz_condensada_sobrevive_ao_pickle():
+    matriz = otimizacao.gerar_matriz_condensada(_coordenadas(30))
+    matriz[3]
+    copia = pickle.loads(pickle.dumps(matriz))
+    assert copia.n == matriz.n
+    np.testing.assert_array_equal(copia.dados, matriz.dados)
+    assert copia[3][20] == matriz[3][20]
@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from form_otimizacao_rota import Entrega, Veiculo, gerar_matriz_condensada, gerar_matriz_distancias_numpy
+from motores_otimizacao import obter_motor
+
+DEPOSITO = (-27.37, -53.40)
+
+
+def _instancia(semente, n_entregas=80):
+    """Cargas normais (tipo 1) e agrotoxicos (tipo 2), com frota de cada tipo e ~20% de folga."""
+    rng = random.Random(semente)
+    coordenadas = [DEPOSITO] + [
+        (DEPOSITO[0] + rng.uniform(-0.3, 0.3), DEPOSITO[1] + rng.uniform(-0.3, 0.3)) for _ in range(n_entregas)
+    ]
+    entregas = [
+        Entrega(id=str(i), peso=rng.uniform(5, 40), tipo_carga=2 if i % 5 == 0 else 1, indice_matriz=i)
+        for i in range(1, n_entregas + 1)
+    ]
+    veiculos = []
+    for tipo, quantidade in ((1, 4), (2, 2)):
+        demanda = sum(e.peso for e in entregas if e.tipo_carga == tipo)
+        veiculos += [Veiculo(f"T{tipo}-{k}", demanda * 1.2 / quantidade, tipo) for k in range(quantidade)]
+    return coordenadas, entregas, veiculos
+
+
+@pytest.mark.parametrize("condensada", [False, True])
+@pytest.mark.parametrize("semente", [0, 1])
+def test_alns_atende_cada_entrega_uma_vez_dentro_da_capacidade(semente, condensada):
+    random.seed(semente)
+    coordenadas, entregas, veiculos = _instancia(semente)
+    gerar = gerar_matriz_condensada if condensada else gerar_matriz_distancias_numpy
+    resultado = obter_motor("alns")(
+        gerar(coordenadas), entregas, veiculos, deposito=0, coordenadas=coordenadas, tempo_limite_s=2, iteracoes=400
+    )
+
+    atendidas = [e for rota in resultado["rotas_por_veiculo"].values() for e in rota]
+    assert sorted(atendidas) == sorted(e.id for e in entregas)
+    por_id = {e.id: e for e in entregas}
+    for veiculo in veiculos:
+        rota = resultado["rotas_por_veiculo"].get(veiculo.id, [])
+        assert sum(por_id[e].peso for e in rota) <= veiculo.limite_peso + 1e-6
+        assert all(por_id[e].tipo_carga == veiculo.tipo_carga for e in rota)
+    assert resultado["custo_fitness"] == pytest.approx(resultado["distancia_total_km"])
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+from psycopg2 import extensions
+
+from banco_dados import BancoDados, ConfiguracaoBanco, PoolConexoes, PoolEsgotado
+
+
+class _CursorFalso:
+    def __init__(self, conexao, **opcoes):
+        self.conexao = conexao
+        self.opcoes = opcoes
+
+    def execute(self, sql, params=None):
+        self.conexao.comandos.append(sql)
+        if self.conexao.quebrada:
+            raise OSError("conexao perdida")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        self.close()
+
+
+class _ConexaoFalsa:
+    def __init__(self, numero):
+        self.numero = numero
+        self.closed = 0
+        self.quebrada = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.comandos = []
+        self.cursores = []
+        self.rollbacks = 0
+
+    def cursor(self, **opcoes):
+        cursor = _CursorFalso(self, **opcoes)
+        self.cursores.append(cursor)
+        return cursor
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class _Fabrica:
+    def __init__(self):
+        self.criadas = []
+
+    def __call__(self):
+        conexao = _ConexaoFalsa(len(self.criadas) + 1)
+        self.criadas.append(conexao)
+        return conexao
+
+
+def _pool(**opcoes):
+    fabrica = _Fabrica()
+    opcoes.setdefault("espera_max_s", 0.05)
+    return PoolConexoes(fabrica, **opcoes), fabrica
+
+
+def test_tamanho_invalido_levanta_value_error():
+    with pytest.raises(ValueError):
+        PoolConexoes(_Fabrica(), minimo=3, maximo=2)
+
+
+def test_aquecer_abre_o_minimo_e_obter_respeita_o_maximo():
+    pool, fabrica = _pool(minimo=2, maximo=3)
+    pool.aquecer()
+    assert len(fabrica.criadas) == 2
+    assert pool.estatisticas()["ociosas"] == 2
+
+    emprestadas = [pool.obter() for _ in range(3)]
+    assert len(fabrica.criadas) == 3
+    with pytest.raises(PoolEsgotado):
+        pool.obter()
+    estatisticas = pool.estatisticas()
+    assert estatisticas["esgotamentos"] == 1
+    assert estatisticas["em_uso"] == 3
+
+    # uma devolucao libera quem esta esperando
+    pool.espera_max_s = 2.0
+    obtidas = []
+    espera = threading.Thread(target=lambda: obtidas.append(pool.obter()))
+    espera.start()
+    time.sleep(0.05)
+    pool.devolver(emprestadas[0])
+    espera.join(1.0)
+    assert obtidas == [emprestadas[0]]
+    assert pool.estatisticas()["esperas"] == 1
+
+
+def test_ociosas_alem_do_minimo_expiram_ao_obter():
+    pool, fabrica = _pool(minimo=1, maximo=5, ocioso_max_s=0.02)
+    emprestadas = [pool.obter() for _ in range(3)]
+    for conexao in emprestadas:
+        pool.devolver(conexao)
+    time.sleep(0.05)
+
+    conexao = pool.obter()
+    # a mais recente (ultima devolvida) e reaproveitada; as outras duas expiraram e foram fechadas
+    assert conexao is emprestadas[-1]
+    assert [c.closed for c in emprestadas[:2]] == [1, 1]
+    estatisticas = pool.estatisticas()
+    assert estatisticas["expiradas"] == 2
+    assert estatisticas["abertas"] == 1
+
+
+def test_ociosa_com_falha_no_select_1_e_descartada():
+    pool, fabrica = _pool(minimo=0, maximo=2, verificar_apos_s=0)
+    quebrada = pool.obter()
+    pool.devolver(quebrada)
+    quebrada.quebrada = True
+
+    conexao = pool.obter()
+    assert quebrada.comandos == ["SELECT 1;"]
+    assert quebrada.closed
+    assert conexao is fabrica.criadas[1]
+    assert pool.estatisticas()["descartadas"] == 1
+
+
+def test_ociosa_verificada_recente_nao_roda_select_1():
+    pool, _ = _pool(minimo=0, maximo=1, verificar_apos_s=60)
+    conexao = pool.obter()
+    pool.devolver(conexao)
+    assert pool.obter() is conexao
+    assert conexao.comandos == []
+
+
+def test_ociosa_fechada_e_descartada_sem_consulta():
+    pool, fabrica = _pool(minimo=0, maximo=1)
+    fechada = pool.obter()
+    pool.devolver(fechada)
+    fechada.closed = 1
+
+    assert pool.obter() is fabrica.criadas[1]
+    assert fechada.comandos == []
+
+
+def test_devolver_desfaz_transacao_aberta_e_descarta_estado_desconhecido():
+    pool, _ = _pool(minimo=0, maximo=2)
+    em_transacao, perdida = pool.obter(), pool.obter()
+    em_transacao.status = extensions.TRANSACTION_STATUS_INTRANS
+    perdida.status = extensions.TRANSACTION_STATUS_UNKNOWN
+
+    pool.devolver(em_transacao)
+    pool.devolver(perdida)
+    assert em_transacao.rollbacks == 1 and not em_transacao.closed
+    assert perdida.closed
+    estatisticas = pool.estatisticas()
+    assert estatisticas["ociosas"] == 1
+    assert estatisticas["descartadas"] == 1
+
+
+class _BancoFalso(BancoDados):
+    def __init__(self):
+        self.fabrica = _Fabrica()
+        super().__init__(ConfiguracaoBanco("teste", "teste", "", "localhost", "5432"), pool_minimo=0, pool_maximo=1)
+
+    def conectar(self):
+        return self.fabrica()
+
+
+def test_cursor_servidor_abre_um_unico_cursor_nomeado():
+    banco = _BancoFalso()
+    with banco.obter_cursor_servidor(itersize=500, rotulo="teste") as (conexao, cursor):
+        assert cursor.itersize == 500
+    assert len(conexao.cursores) == 1
+    assert conexao.cursores[0].opcoes["name"].startswith("fluxo_")
+    assert banco.pool.estatisticas()["ociosas"] == 1
@@ -0,0 +1,88 @@
+import random
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+import servidor_osrm_local
+from form_otimizacao_rota import gerar_distancias_numpy, gerar_matriz_distancias_numpy
+from provedor_distancias import ErroProvedorDistancias, ProvedorOSRM, montar_matriz_distancias
+from servidor_osrm_local import FATOR_CIRCUITO, criar_servidor
+
+MAX_LOCAIS = 10
+
+
+def _pontos(n, semente=0):
+    rng = random.Random(semente)
+    return [(round(-27.37 + rng.uniform(-0.3, 0.3), 6), round(-53.40 + rng.uniform(-0.3, 0.3), 6)) for _ in range(n)]
+
+
+@pytest.fixture
+def servidor_osrm(monkeypatch):
+    """Sobe o substituto do /table numa porta livre; retorna (url, servidor, locais por requisicao)."""
+    requisicoes = []
+    responder = servidor_osrm_local.responder_tabela
+
+    def responder_contando(caminho, max_locais, sem_rota=()):
+        requisicoes.append(caminho.split("/")[4].split("?")[0].count(";") + 1)
+        return responder(caminho, max_locais, sem_rota)
+
+    monkeypatch.setattr(servidor_osrm_local, "responder_tabela", responder_contando)
+    servidores = []
+
+    def iniciar(sem_rota=()):
+        servidor = criar_servidor("127.0.0.1", 0, MAX_LOCAIS, sem_rota)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        servidores.append(servidor)
+        host, porta = servidor.server_address[:2]
+        return f"http://{host}:{porta}", requisicoes
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def test_matriz_em_blocos_igual_linha_reta_vezes_fator(servidor_osrm):
+    url, requisicoes = servidor_osrm()
+    pontos = _pontos(23)
+    matriz = ProvedorOSRM(url, max_locais=MAX_LOCAIS).matriz(pontos)
+
+    # blocos de max_locais/2 origens x max_locais/2 destinos: ceil(23/5)^2 requisicoes
+    assert len(requisicoes) == 25
+    assert max(requisicoes) <= MAX_LOCAIS
+    esperado = gerar_matriz_distancias_numpy(pontos) * FATOR_CIRCUITO
+    np.testing.assert_allclose(matriz, esperado, atol=1e-3)
+    assert not np.diag(matriz).any()
+
+
+def test_pares_sem_rota_recebem_linha_reta(servidor_osrm):
+    pontos = _pontos(12)
+    isolado = pontos[7]
+    url, _ = servidor_osrm(sem_rota=[isolado])
+    matriz = ProvedorOSRM(url, max_locais=MAX_LOCAIS).matriz(pontos)
+
+    reta = gerar_matriz_distancias_numpy(pontos)
+    esperado = reta * FATOR_CIRCUITO
+    esperado[7, :] = reta[7, :]
+    esperado[:, 7] = reta[:, 7]
+    np.testing.assert_allclose(matriz, esperado, atol=1e-3)
+
+
+def test_conexao_recusada_usa_haversine():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        porta = s.getsockname()[1]
+    provedor = ProvedorOSRM(f"http://127.0.0.1:{porta}", max_locais=MAX_LOCAIS, timeout_s=2)
+    pontos = _pontos(6)
+
+    with pytest.raises(ErroProvedorDistancias):
+        provedor.matriz(pontos)
+    matriz, fonte = montar_matriz_distancias(pontos, provedor)
+    assert fonte == "haversine"
+    np.testing.assert_allclose(
+        np.asarray([[matriz[i][j] for j in range(6)] for i in range(6)]),
+        gerar_distancias_numpy(pontos, pontos),
+        atol=1e-3,
+    )
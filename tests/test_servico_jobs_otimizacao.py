@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+from servico_jobs_otimizacao import FilaJobsCheia, ServicoJobsOtimizacao
+
+
+def _aguardar_status(servico, job_id, status, dono=None, prazo_s=2.0):
+    limite = time.time() + prazo_s
+    while time.time() < limite:
+        job = servico.consultar(job_id, dono)
+        if job is not None and job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} nao chegou a {status}: {servico.consultar(job_id, dono)}")
+
+
+def _tarefa_bloqueada(liberar, progresso=None):
+    def tarefa(ao_progresso):
+        if progresso is not None:
+            ao_progresso(progresso)
+        liberar.wait(2.0)
+        return {"rotas": 1}
+
+    return tarefa
+
+
+def test_estados_na_fila_executando_concluido():
+    servico = ServicoJobsOtimizacao(max_execucoes=1)
+    liberar = threading.Event()
+    primeiro = servico.submeter(_tarefa_bloqueada(liberar, {"geracao": 3}))
+    segundo = servico.submeter(lambda ao_progresso: {"rotas": 2})
+
+    job = _aguardar_status(servico, primeiro, "executando")
+    assert servico.consultar(segundo)["status"] == "na_fila"
+    assert job["erro"] is None
+    limite = time.time() + 2.0
+    while not servico.consultar(primeiro)["progresso"] and time.time() < limite:
+        time.sleep(0.01)
+    assert servico.consultar(primeiro)["progresso"] == {"geracao": 3}
+
+    liberar.set()
+    _aguardar_status(servico, primeiro, "concluido")
+    _aguardar_status(servico, segundo, "concluido")
+    assert servico.resultado(primeiro)["resultado"] == {"rotas": 1}
+    assert servico.resultado(segundo)["resultado"] == {"rotas": 2}
+
+
+@pytest.mark.parametrize(
+    "erro, mensagem, codigo",
+    [
+        (ValueError("Nenhum pedido otimizavel."), "Nenhum pedido otimizavel.", 400),
+        (RuntimeError("falha no pool"), "Falha interna ao otimizar rotas.", 500),
+    ],
+)
+def test_falha_da_tarefa_vira_status_erro(erro, mensagem, codigo):
+    servico = ServicoJobsOtimizacao(max_execucoes=1)
+
+    def tarefa(ao_progresso):
+        raise erro
+
+    job_id = servico.submeter(tarefa)
+    job = _aguardar_status(servico, job_id, "erro")
+    assert job["erro"] == mensagem
+    completo = servico.resultado(job_id)
+    assert completo["codigo_erro"] == codigo
+    assert completo["resultado"] is None
+
+
+def test_max_pendentes_recusa_novos_jobs_ate_liberar_a_fila():
+    servico = ServicoJobsOtimizacao(max_execucoes=1, max_pendentes=2)
+    liberar = threading.Event()
+    jobs = [servico.submeter(_tarefa_bloqueada(liberar)) for _ in range(2)]
+    with pytest.raises(FilaJobsCheia):
+        servico.submeter(_tarefa_bloqueada(liberar))
+
+    liberar.set()
+    for job_id in jobs:
+        _aguardar_status(servico, job_id, "concluido")
+    assert servico.submeter(lambda ao_progresso: {})
+
+
+def test_job_so_e_lido_pelo_dono():
+    servico = ServicoJobsOtimizacao()
+    job_id = servico.submeter(lambda ao_progresso: {"rotas": 1}, dono=7)
+    _aguardar_status(servico, job_id, "concluido", dono=7)
+
+    assert servico.consultar(job_id, dono=8) is None
+    assert servico.consultar(job_id) is None
+    assert servico.resultado(job_id, dono=8) is None
+    assert servico.resultado(job_id, dono=7)["resultado"] == {"rotas": 1}
+    assert servico.consultar("inexistente", dono=7) is None
+
+
+def test_jobs_concluidos_expiram_apos_ttl():
+    servico = ServicoJobsOtimizacao(ttl_s=0.05)
+    liberar = threading.Event()
+    concluido = servico.submeter(lambda ao_progresso: {})
+    em_execucao = servico.submeter(_tarefa_bloqueada(liberar))
+    _aguardar_status(servico, concluido, "concluido")
+    _aguardar_status(servico, em_execucao, "executando")
+
+    time.sleep(0.1)
+    assert servico.consultar(concluido) is None
+    assert servico.resultado(concluido) is None
+    # o TTL conta a partir da conclusao: jobs em andamento nao expiram
+    assert servico.consultar(em_execucao)["status"] == "executando"
+    liberar.set()